@@ -0,0 +1,121 @@
+"""Plain dict representations of the API resources
+
+Clients pick the fields of every resource type JSON:API style, like
+``?fields[posts]=text,author&fields[users]=username``. Only the
+columns behind the picked fields are read, and related authors and
+groups are loaded by one ``in_bulk`` query per type for a whole page,
+instead of a join repeated on every row.
+"""
+from django.contrib.auth import get_user_model
+
+from posts.models import Group
+
+
+User = get_user_model()
+
+# Fields of each resource type with the model columns they are read from
+FIELDSETS = {
+    'posts': {
+        'id': 'id',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'author': 'author_id',
+        'group': 'group_id',
+        'image': 'image',
+        'comments_count': 'comments_count',
+    },
+    'comments': {
+        'id': 'id',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'author': 'author_id',
+        'parent': 'parent_id',
+    },
+    'users': {
+        'username': 'username',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+    },
+    'groups': {
+        'slug': 'slug',
+        'title': 'title',
+        'description': 'description',
+    },
+}
+
+
+class InvalidFields(Exception):
+    """Raised when requested fields are unknown"""
+
+
+def parse_fieldsets(params):
+    """Returns the requested fields of each type, all by default"""
+    fieldsets = {kind: tuple(fields) for kind, fields in FIELDSETS.items()}
+    for kind in FIELDSETS:
+        value = params.get(f'fields[{kind}]')
+        if value is None:
+            continue
+        fields = tuple(filter(None, value.split(',')))
+        unknown = set(fields) - set(FIELDSETS[kind])
+        if unknown:
+            raise InvalidFields(
+                f'Unknown fields of {kind}: {", ".join(sorted(unknown))}'
+            )
+        fieldsets[kind] = fields
+    return fieldsets
+
+
+def columns(kind, fields, *required):
+    """Returns columns to load for the fields"""
+    return list(dict.fromkeys(
+        [FIELDSETS[kind][field] for field in fields] + list(required)
+    ))
+
+
+def load_related(model, kind, ids, fieldsets):
+    """Returns serialized objects of the ids in one query"""
+    fields = fieldsets[kind]
+    objects = model.objects.only(*columns(kind, fields, 'pk')).in_bulk(
+        list(filter(None, ids))
+    )
+    return {
+        pk: {field: getattr(obj, field) for field in fields}
+        for pk, obj in objects.items()
+    }
+
+
+def serialize_user(user, fieldsets):
+    return {field: getattr(user, field) for field in fieldsets['users']}
+
+
+def serialize_group(group, fieldsets):
+    return {field: getattr(group, field) for field in fieldsets['groups']}
+
+
+def serialize_rows(rows, kind, fieldsets, request):
+    """Serializes posts or comments with their authors and groups"""
+    fields = fieldsets[kind]
+    users = groups = {}
+    if 'author' in fields:
+        users = load_related(User, 'users',
+                             {row.author_id for row in rows}, fieldsets)
+    if 'group' in fields:
+        groups = load_related(Group, 'groups',
+                              {row.group_id for row in rows}, fieldsets)
+    data = []
+    for row in rows:
+        item = {}
+        for field in fields:
+            if field == 'author':
+                item[field] = users.get(row.author_id)
+            elif field == 'group':
+                item[field] = groups.get(row.group_id)
+            elif field == 'parent':
+                item[field] = row.parent_id
+            elif field == 'image':
+                item[field] = (request.build_absolute_uri(row.image.url)
+                               if row.image else None)
+            else:
+                item[field] = getattr(row, field)
+        data.append(item)
+    return data
@@ -0,0 +1,109 @@
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post
+
+
+User = get_user_model()
+
+
+class ApiViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.posts = [
+            Post.objects.create(text=f'Пост {i}', author=cls.author,
+                                group=cls.group if i % 2 else None)
+            for i in range(12)
+        ]
+        Comment.objects.create(post=cls.posts[0], author=cls.reader,
+                               text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_index_pages_by_cursor(self):
+        """Index returns posts newest first with cursor links"""
+        response = self.guest_client.get(reverse('api:index'))
+        data = response.json()
+        self.assertEqual([post['id'] for post in data['results']],
+                         [post.pk for post in self.posts[::-1][:10]])
+        self.assertIsNone(data['previous'])
+        self.assertEqual(data['results'][0]['author'], {
+            'username': 'author', 'first_name': 'Лев',
+            'last_name': 'Толстой',
+        })
+        self.assertEqual(data['results'][0]['group']['slug'], 'group')
+        self.assertIsNone(data['results'][1]['group'])
+        data = self.guest_client.get(data['next']).json()
+        self.assertEqual([post['id'] for post in data['results']],
+                         [self.posts[1].pk, self.posts[0].pk])
+        self.assertIsNone(data['next'])
+
+    def test_sparse_fieldsets_load_only_needed_rows(self):
+        """Fields are picked per type, related rows load in batches"""
+        with self.assertNumQueries(2):
+            response = self.guest_client.get(reverse('api:index'), {
+                'fields[posts]': 'text,author',
+                'fields[users]': 'username',
+                'limit': 3,
+            })
+        self.assertEqual(response.json()['results'][0], {
+            'text': 'Пост 11', 'author': {'username': 'author'},
+        })
+        response = self.guest_client.get(
+            reverse('api:index'), {'fields[posts]': 'text,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['detail'])
+
+    def test_etag(self):
+        """Unchanged feed is answered with 304 without queries"""
+        url = reverse('api:group_posts', args=['group'])
+        response = self.guest_client.get(url)
+        self.assertEqual(response.json()['group']['title'], 'Группа')
+        self.assertEqual(len(response.json()['results']), 6)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(text='Новый', author=self.author,
+                            group=self.group)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_profile_and_follow(self):
+        """Profile has author stats, follow feed needs a user"""
+        data = self.reader_client.get(
+            reverse('api:profile', args=['author'])).json()
+        self.assertEqual(data['stats']['posts_count'], 12)
+        self.assertTrue(data['following'])
+        response = self.guest_client.get(reverse('api:follow_index'))
+        self.assertEqual(response.status_code, 401)
+        data = self.reader_client.get(reverse('api:follow_index')).json()
+        self.assertEqual(data['results'][0]['id'], self.posts[-1].pk)
+
+    def test_post_detail(self):
+        """Post comes with the first page of its comments"""
+        data = self.guest_client.get(
+            reverse('api:post_detail', args=[self.posts[0].pk])).json()
+        self.assertEqual(data['post']['text'], 'Пост 0')
+        self.assertEqual(data['post']['comments_count'], 1)
+        self.assertEqual(data['comments']['results'][0]['author'],
+                         {'username': 'reader', 'first_name': '',
+                          'last_name': ''})
+        self.assertIsNone(data['comments']['results'][0]['parent'])
+        response = self.guest_client.get(
+            reverse('api:post_detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'detail': 'Not found'})
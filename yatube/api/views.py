@@ -0,0 +1,163 @@
+"""Read-only JSON mirror of the feeds
+
+Every response carries an ETag made of the feed version, the user
+and the URL, so a conditional request is answered with 304 before
+any query runs. Lists are paginated by the cursors of the HTML feeds.
+"""
+import hashlib
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from posts import counters, timeline
+from posts.cache import get_feed_version
+from posts.models import Comment, Group, Post
+from posts.paginator import CursorPaginator
+from .serializers import (
+    InvalidFields, columns, parse_fieldsets, serialize_group, serialize_rows,
+    serialize_user,
+)
+
+
+User = get_user_model()
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+
+
+def error(status, detail):
+    return JsonResponse({'detail': detail}, status=status)
+
+
+def api_view(view):
+    """Adds conditional GET and JSON errors to the view"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            response = error(405, 'Method not allowed')
+            response['Allow'] = 'GET, HEAD'
+            return response
+        tag = hashlib.sha1(
+            f'{get_feed_version()}:{request.user.pk}:'
+            f'{request.get_full_path()}'.encode()
+        ).hexdigest()
+        etag = f'"{tag}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            try:
+                response = view(request, *args, **kwargs)
+            except Http404:
+                response = error(404, 'Not found')
+            except InvalidFields as exception:
+                response = error(400, str(exception))
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+        patch_vary_headers(response, ('Cookie',))
+        return response
+    return wrapper
+
+
+def json_response(data):
+    return JsonResponse(data, json_dumps_params={'ensure_ascii': False})
+
+
+def page_link(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return request.build_absolute_uri(f'?{params.urlencode()}')
+
+
+def get_limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_LIMIT:
+        raise InvalidFields(f'limit must be from 1 to {MAX_LIMIT}')
+    return limit
+
+
+def paginate(request, queryset, kind, fieldsets, keys=('pub_date', 'pk')):
+    """Returns a cursor page of the queryset with links"""
+    queryset = queryset.only(*columns(kind, fieldsets[kind], 'pub_date'))
+    paginator = CursorPaginator(queryset, get_limit(request), keys)
+    page = paginator.get_page(request.GET.get('cursor'))
+    return {
+        'results': serialize_rows(list(page), kind, fieldsets, request),
+        'next': page_link(request, page.next_cursor),
+        'previous': page_link(request, page.previous_cursor),
+    }
+
+
+@api_view
+def index(request):
+    fieldsets = parse_fieldsets(request.GET)
+    return json_response(
+        paginate(request, Post.objects.all(), 'posts', fieldsets)
+    )
+
+
+@api_view
+def group_posts(request, slug):
+    fieldsets = parse_fieldsets(request.GET)
+    group = get_object_or_404(
+        Group.objects.only(*columns('groups', fieldsets['groups'], 'pk')),
+        slug=slug,
+    )
+    data = {'group': serialize_group(group, fieldsets)}
+    data.update(paginate(request, Post.objects.filter(group=group),
+                         'posts', fieldsets))
+    return json_response(data)
+
+
+@api_view
+def profile(request, username):
+    fieldsets = parse_fieldsets(request.GET)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    stats = counters.get_author_stats(author)
+    data = {
+        'author': serialize_user(author, fieldsets),
+        'stats': {
+            'posts_count': stats.posts_count,
+            'followers_count': stats.followers_count,
+            'following_count': stats.following_count,
+        },
+    }
+    if request.user.is_authenticated:
+        data['following'] = author.following.filter(
+            user=request.user).exists()
+    data.update(paginate(request, Post.objects.filter(author=author),
+                         'posts', fieldsets))
+    return json_response(data)
+
+
+@api_view
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return error(401, 'Authentication required')
+    fieldsets = parse_fieldsets(request.GET)
+    posts = timeline.inbox_posts(request.user).select_related(None)
+    return json_response(paginate(request, posts, 'posts', fieldsets,
+                                  keys=timeline.FEED_KEYS))
+
+
+@api_view
+def post_detail(request, post_id):
+    fieldsets = parse_fieldsets(request.GET)
+    post = get_object_or_404(
+        Post.objects.only(*columns('posts', fieldsets['posts'], 'pk')),
+        pk=post_id,
+    )
+    data = {
+        'post': serialize_rows([post], 'posts', fieldsets, request)[0],
+        'comments': paginate(request, Comment.objects.filter(post=post),
+                             'comments', fieldsets),
+    }
+    return json_response(data)
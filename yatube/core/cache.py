@@ -0,0 +1,244 @@
+"""Two-tier cache backend
+
+A bounded in-process LRU sits in front of a shared cache backend, which
+is named by LOCATION. Values computed with ``get_or_set`` are stored
+with their soft expiry and computation time, which gives:
+
+* single-flight recomputation: one caller per process holds a lease,
+  the others wait for its result or keep serving the stale value;
+* probabilistic early expiry: a hot key is recomputed a bit before it
+  expires, the closer to expiry and the slower to compute the likelier;
+* stale-while-revalidate: for STALE_TIMEOUT seconds after expiry the old
+  value is served while it is recomputed in the background.
+
+Hit, miss and eviction counters are kept per process and are returned
+by ``stats()``.
+
+Single flight across processes is only as good as ``add`` and ``incr``
+of the shared backend. Memcached and Redis make them atomic, but the
+``FileBasedCache`` stand-in of the settings checks and writes the file
+in two steps. Two processes may then both take the lease and compute
+the same value, and concurrent increments may be lost. With that
+backend, recomputation is only deduplicated within each process; use
+an atomic backend where it matters across workers.
+"""
+import math
+import random
+import threading
+from collections import Counter, OrderedDict, namedtuple
+from time import sleep, time
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.db import connections
+
+
+Entry = namedtuple('Entry', ('value', 'expires', 'delta'))
+
+_MISSING = object()
+
+# Django creates a backend per thread, process-wide state lives here
+_local_caches = {}
+_locks = {}
+_flights = {}
+_stats = {}
+
+
+class TwoTierCache(BaseCache):
+    """Bounded in-process LRU over a shared cache backend"""
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = location
+        self.local_max_entries = options.get('LOCAL_MAX_ENTRIES', 1000)
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 2)
+        self.stale_timeout = options.get('STALE_TIMEOUT', 60)
+        self.lock_timeout = options.get('LOCK_TIMEOUT', 10)
+        self.beta = options.get('BETA', 1.0)
+        name = params.get('NAME', location)
+        self._local = _local_caches.setdefault(name, OrderedDict())
+        self._lock = _locks.setdefault(name, threading.Lock())
+        self._flights = _flights.setdefault(name, {})
+        self._stats = _stats.setdefault(name, Counter())
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def stats(self):
+        """Returns counters of this process"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['local_entries'] = len(self._local)
+        return stats
+
+    def _timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def _local_get(self, key):
+        with self._lock:
+            item = self._local.get(key, _MISSING)
+            if item is _MISSING:
+                return _MISSING
+            value, expires = item
+            if expires <= time():
+                del self._local[key]
+                return _MISSING
+            self._local.move_to_end(key)
+            return value
+
+    def _local_set(self, key, value):
+        with self._lock:
+            self._local[key] = (value, time() + self.local_timeout)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_max_entries:
+                self._local.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def _local_delete(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+
+    def _get_raw(self, key, version):
+        local_key = self.make_key(key, version)
+        value = self._local_get(local_key)
+        if value is not _MISSING:
+            self._stats['local_hits'] += 1
+            return value
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._stats['misses'] += 1
+            return _MISSING
+        self._stats['shared_hits'] += 1
+        self._local_set(local_key, value)
+        return value
+
+    def get(self, key, default=None, version=None):
+        value = self._get_raw(key, version)
+        if isinstance(value, Entry):
+            value = value.value if value.expires > time() else _MISSING
+        return default if value is _MISSING else value
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        self._local_delete(self.make_key(key, version))
+        return added
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._local_set(self.make_key(key, version), value)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._local_delete(self.make_key(key, version))
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._local_delete(self.make_key(key, version))
+        self.shared.delete(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._local_delete(self.make_key(key, version))
+        return self.shared.incr(key, delta, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self.shared.clear()
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        """Returns cached value or computes it once for all callers"""
+        timeout = self._timeout(timeout)
+        entry = self._get_raw(key, version)
+        now = time()
+        if isinstance(entry, Entry):
+            if not self._expires_early(entry, now):
+                return entry.value
+            if not self._acquire(key, version):
+                if entry.expires <= now:
+                    self._stats['stale_served'] += 1
+                return entry.value
+            if entry.expires <= now:
+                self._stats['stale_served'] += 1
+                threading.Thread(
+                    target=self._revalidate,
+                    args=(key, default, timeout, version),
+                    daemon=True,
+                ).start()
+                return entry.value
+            self._stats['early_refreshes'] += 1
+        elif not self._acquire(key, version):
+            return self._wait(key, default, timeout, version)
+        try:
+            return self._compute(key, default, timeout, version)
+        finally:
+            self._release(key, version)
+
+    def _expires_early(self, entry, now):
+        # XFetch: the random gap grows with the computation time
+        gap = entry.delta * self.beta * -math.log(1 - random.random())
+        return now + gap >= entry.expires
+
+    def _compute(self, key, default, timeout, version):
+        started = time()
+        value = default() if callable(default) else default
+        delta = time() - started
+        self._stats['computations'] += 1
+        if timeout is None:
+            expires, shared_timeout = math.inf, None
+        else:
+            expires = time() + timeout
+            shared_timeout = timeout + self.stale_timeout
+        self.set(key, Entry(value, expires, delta), shared_timeout, version)
+        return value
+
+    def _revalidate(self, key, default, timeout, version):
+        try:
+            self._compute(key, default, timeout, version)
+        finally:
+            self._release(key, version)
+            connections.close_all()
+
+    def _lease_key(self, key):
+        return f'lease:{key}'
+
+    def _acquire(self, key, version):
+        """Takes the computation lease of the process and the cluster"""
+        local_key = self.make_key(key, version)
+        with self._lock:
+            if local_key in self._flights:
+                return False
+            self._flights[local_key] = threading.Event()
+        if self.shared.add(self._lease_key(key), 1, self.lock_timeout,
+                           version=version):
+            return True
+        with self._lock:
+            self._flights.pop(local_key).set()
+        return False
+
+    def _release(self, key, version):
+        self.shared.delete(self._lease_key(key), version=version)
+        with self._lock:
+            flight = self._flights.pop(self.make_key(key, version), None)
+        if flight is not None:
+            flight.set()
+
+    def _wait(self, key, default, timeout, version):
+        """Waits for the value computed by the lease holder"""
+        self._stats['waits'] += 1
+        local_key = self.make_key(key, version)
+        deadline = time() + self.lock_timeout
+        while time() < deadline:
+            with self._lock:
+                flight = self._flights.get(local_key)
+            if flight is not None:
+                flight.wait(deadline - time())
+            else:
+                sleep(0.05)
+            self._local_delete(local_key)
+            entry = self.shared.get(key, _MISSING, version=version)
+            if isinstance(entry, Entry):
+                return entry.value
+            if flight is not None:
+                # The lease holder of this process has failed
+                break
+        return self._compute(key, default, timeout, version)
@@ -0,0 +1,99 @@
+"""Content-addressed file storage
+
+Uploads are hashed while they are streamed to a temporary file next to
+their final place and are then renamed to a sharded path made of their
+SHA-256, like ``posts/3f/a2/3fa2...e1.jpg``. A file which is already
+stored is not written twice, so all its uploads share one name, and
+everything keyed by that name, thumbnails included, is made once.
+
+The stored file may be deleted as unreferenced between the upload
+finding it and the upload's reference being counted. The upload is
+therefore kept aside next to the file, and ``restore`` puts it back
+once the reference is committed.
+"""
+import glob
+import hashlib
+import os
+import posixpath
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+HASHED_NAME = re.compile(
+    r'(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}(?:\.\w+)?$'
+)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming files by their content hash"""
+    def get_available_name(self, name, max_length=None):
+        # The name is replaced by the content hash in _save
+        return name
+
+    def is_hashed_name(self, name):
+        """Tells if the name was given to a file by this storage"""
+        return bool(HASHED_NAME.search(name))
+
+    def hashed_name(self, name, hexdigest):
+        """Returns sharded name of the content in the directory of name"""
+        directory, basename = posixpath.split(name)
+        extension = os.path.splitext(basename)[1].lower()
+        return posixpath.join(
+            directory, hexdigest[:2], hexdigest[2:4], hexdigest + extension
+        )
+
+    def _save(self, name, content):
+        directory = self.path(posixpath.dirname(name))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = os.path.join(directory, f'.{uuid.uuid4().hex}.part')
+        digest = hashlib.sha256()
+        try:
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL
+                         | getattr(os, 'O_BINARY', 0), 0o666)
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    file.write(chunk)
+            name = self.hashed_name(name, digest.hexdigest())
+            path = self.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            if os.path.exists(path):
+                os.replace(temp_path, self.kept_path(path))
+            else:
+                os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return name
+
+    def kept_path(self, path):
+        """Returns a new path for an upload kept aside next to path"""
+        directory, basename = os.path.split(path)
+        return os.path.join(directory,
+                            f'.{basename}.{uuid.uuid4().hex}.kept')
+
+    def restore(self, name):
+        """Puts back the file from a kept upload if it was deleted
+
+        Called once the reference of the upload is committed. Drops all
+        uploads kept for the name, those of rolled back saves included.
+        """
+        path = self.path(name)
+        directory, basename = os.path.split(path)
+        pattern = os.path.join(glob.escape(directory),
+                               f'.{glob.escape(basename)}.*.kept')
+        for kept in glob.glob(pattern):
+            try:
+                if os.path.exists(path):
+                    os.remove(kept)
+                else:
+                    os.replace(kept, path)
+            except FileNotFoundError:
+                # Taken by a concurrent restore
+                pass
@@ -1,6 +1,15 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, SimpleTestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
 from http import HTTPStatus
+from time import sleep, time
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from .cache import Entry, TwoTierCache
+from .storage import ContentAddressedStorage
 
 
 User = get_user_model()
@@ -23,3 +32,138 @@ class URLTests(TestCase):
         response = self.guest_client.get(address, follow=True)
         self.assertTemplateUsed(response, template)
         self.assertEqual(response.status_code, status)
+
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'two-tier-tests',
+    },
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.name = self.id()
+        self.cache = TwoTierCache('shared', {
+            'NAME': self.name,
+            'OPTIONS': {'LOCAL_MAX_ENTRIES': 2, 'STALE_TIMEOUT': 60},
+        })
+        self.cache.clear()
+
+    def test_local_tier_is_bounded_lru(self):
+        """Local tier evicts least recently used keys"""
+        for key in ('a', 'b', 'c'):
+            self.cache.set(key, key)
+        self.assertEqual(self.cache.get('c'), 'c')
+        self.assertEqual(self.cache.get('a'), 'a')
+        stats = self.cache.stats()
+        self.assertEqual(stats['evictions'], 2)
+        self.assertEqual(stats['local_hits'], 1)
+        self.assertEqual(stats['shared_hits'], 1)
+        self.assertEqual(self.cache.get('missing', 'default'), 'default')
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_writes_invalidate_local_tier(self):
+        """incr and delete are visible through the local tier"""
+        self.cache.set('counter', 1)
+        self.cache.get('counter')
+        self.assertEqual(self.cache.incr('counter'), 2)
+        self.assertEqual(self.cache.get('counter'), 2)
+        self.cache.delete('counter')
+        self.assertIsNone(self.cache.get('counter'))
+
+    def test_single_flight(self):
+        """Concurrent misses compute the value once"""
+        calls = []
+        started = threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.set()
+            sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                self.cache.get_or_set('key', compute, 60)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 5)
+
+    def test_stale_while_revalidate(self):
+        """Expired value is served while it is recomputed"""
+        self.cache.set('key', Entry('old', time() - 1, 0), 60)
+        refreshed = threading.Event()
+
+        def compute():
+            refreshed.set()
+            return 'new'
+
+        self.assertEqual(self.cache.get_or_set('key', compute, 60), 'old')
+        self.assertTrue(refreshed.wait(1))
+        for _ in range(20):
+            if self.cache.get('key') == 'new':
+                break
+            sleep(0.05)
+        self.assertEqual(self.cache.get('key'), 'new')
+        self.assertEqual(self.cache.stats()['stale_served'], 1)
+
+    def test_early_expiry(self):
+        """Slow value close to expiry is recomputed before it expires"""
+        self.cache.set('key', Entry('old', time() + 1, 1000), 60)
+        self.assertEqual(self.cache.get_or_set('key', 'new', 60), 'new')
+        self.assertEqual(self.cache.stats()['early_refreshes'], 1)
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def test_name_is_sharded_content_hash(self):
+        """File is stored under the sharded hash of its content"""
+        digest = hashlib.sha256(b'content').hexdigest()
+        name = self.storage.save('posts/Photo.JPG', ContentFile(b'content'))
+        self.assertEqual(
+            name, f'posts/{digest[:2]}/{digest[2:4]}/{digest}.jpg')
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b'content')
+
+    def test_same_content_is_stored_once(self):
+        """Uploads of the same content share one file"""
+        first = self.storage.save('posts/a.gif', ContentFile(b'same'))
+        second = self.storage.save('posts/b.gif', ContentFile(b'same'))
+        other = self.storage.save('posts/c.gif', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.storage.restore(first)
+        files = [
+            file for _, _, files in os.walk(self.location) for file in files
+        ]
+        self.assertEqual(len(files), 2)
+
+    def test_deleted_file_is_restored_from_kept_upload(self):
+        """Upload which found the file puts it back if it was deleted"""
+        name = self.storage.save('posts/a.gif', ContentFile(b'same'))
+        self.storage.save('posts/b.gif', ContentFile(b'same'))
+        self.storage.delete(name)
+        self.storage.restore(name)
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b'same')
+        self.storage.restore(name)
+        self.assertEqual(
+            os.listdir(os.path.dirname(self.storage.path(name))),
+            [os.path.basename(name)],
+        )
@@ -0,0 +1,12 @@
+from django.contrib import admin
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'status', 'priority', 'attempts',
+                    'available_at', 'created')
+    list_filter = ('status', 'name')
+    search_fields = ('dedupe_key',)
+
+
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class JobsConfig(AppConfig):
+    name = 'jobs'
+
+    def ready(self):
+        # Tasks are registered by the tasks modules of the apps
+        autodiscover_modules('tasks')
@@ -0,0 +1,113 @@
+import multiprocessing
+import signal
+from concurrent.futures import (
+    FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait,
+)
+from time import sleep
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs import queue
+
+
+def run_in_thread(pk, lease):
+    try:
+        return queue.run_claimed(pk, lease)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode', choices=('thread', 'process'), default='thread',
+            help='Run jobs in a thread pool or in a process pool',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Number of jobs run at once',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds to wait when the queue is empty',
+        )
+        parser.add_argument(
+            '--visibility-timeout', type=int,
+            default=settings.JOBS_VISIBILITY_TIMEOUT,
+            help='Seconds after which a job of a lost worker is rerun',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit when no job is available',
+        )
+
+    def make_pool(self, options):
+        if options['mode'] == 'thread':
+            return ThreadPoolExecutor(options['concurrency'],
+                                      thread_name_prefix='jobs')
+        # Spawned workers set Django up on their own instead of sharing
+        # connections of the forked parent
+        return ProcessPoolExecutor(
+            options['concurrency'],
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        )
+
+    def succeeded(self, future):
+        try:
+            return future.result()
+        except Exception as error:
+            self.stderr.write(f'Worker failed: {error!r}')
+            return False
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        previous_handler = signal.signal(signal.SIGTERM, self.stop)
+        pool = self.make_pool(options)
+        run = (run_in_thread if options['mode'] == 'thread'
+               else queue.run_claimed)
+        running = set()
+        succeeded = failed = 0
+        try:
+            while not self.stopping:
+                finished = {future for future in running if future.done()}
+                done = sum(map(self.succeeded, finished))
+                succeeded += done
+                failed += len(finished) - done
+                running -= finished
+                free = options['concurrency'] - len(running)
+                claimed = []
+                if free:
+                    claimed = queue.claim(free,
+                                          options['visibility_timeout'])
+                for pk, lease in claimed:
+                    running.add(pool.submit(run, pk, lease))
+                if claimed:
+                    continue
+                if running:
+                    wait(running, options['poll_interval'],
+                         return_when=FIRST_COMPLETED)
+                elif options['once']:
+                    break
+                else:
+                    sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.shutdown(wait=True)
+            signal.signal(signal.SIGTERM, previous_handler)
+        done = sum(map(self.succeeded, running))
+        succeeded += done
+        failed += len(running) - done
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {succeeded} jobs succeeded, {failed} failed'
+        ))
+
+    def stop(self, signum, frame):
+        """Stops claiming jobs and lets the running ones finish"""
+        self.stopping = True
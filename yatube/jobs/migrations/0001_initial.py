@@ -0,0 +1,44 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:14
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Задача')),
+                ('payload', models.TextField(verbose_name='Аргументы')),
+                ('priority', models.SmallIntegerField(default=0, verbose_name='Приоритет')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('running', 'Выполняется'), ('failed', 'Не выполнена')], default='queued', max_length=10, verbose_name='Состояние')),
+                ('dedupe_key', models.CharField(blank=True, max_length=200, null=True, verbose_name='Ключ дедупликации')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попытки')),
+                ('max_attempts', models.PositiveSmallIntegerField(verbose_name='Максимум попыток')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Доступна с')),
+                ('lease', models.CharField(blank=True, max_length=32, verbose_name='Аренда')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Фоновая задача',
+                'verbose_name_plural': 'Фоновые задачи',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(condition=models.Q(status__in=['queued', 'running']), fields=['-priority', 'available_at'], name='job_claim_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(status='queued'), fields=('dedupe_key',), name='unique_queued_job'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """Describes a call of a task waiting for a worker"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Не выполнена'),
+    )
+    name = models.CharField(max_length=100, verbose_name='Задача')
+    payload = models.TextField(verbose_name='Аргументы')
+    priority = models.SmallIntegerField(default=0,
+                                        verbose_name='Приоритет')
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=QUEUED, verbose_name='Состояние')
+    dedupe_key = models.CharField(
+        max_length=200, blank=True, null=True,
+        verbose_name='Ключ дедупликации'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0, verbose_name='Попытки'
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name='Максимум попыток'
+    )
+    # Queued jobs wait for it to retry, running ones are given to
+    # another worker after it as their worker is considered lost
+    available_at = models.DateTimeField(default=timezone.now,
+                                        verbose_name='Доступна с')
+    lease = models.CharField(max_length=32, blank=True,
+                             verbose_name='Аренда')
+    last_error = models.TextField(blank=True,
+                                  verbose_name='Последняя ошибка')
+    created = models.DateTimeField(auto_now_add=True,
+                                   verbose_name='Дата создания')
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedupe_key'], condition=Q(status='queued'),
+                name='unique_queued_job',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['-priority', 'available_at'],
+                         condition=Q(status__in=['queued', 'running']),
+                         name='job_claim_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.name} #{self.pk}'
@@ -0,0 +1,174 @@
+"""Persistent queue of background jobs
+
+Tasks are functions registered with ``@task`` in the ``tasks`` modules
+of the apps. A view or a signal receiver enqueues a call, which is a
+``Job`` row written in the same transaction as the data it is about,
+and the run_worker command executes it later.
+
+Workers claim jobs by a compare-and-set update which gives a job a
+lease for the visibility timeout. A worker which dies or hangs loses
+the lease when the timeout passes and the job is claimed again, so
+every job runs at least once and tasks should be idempotent. Failed
+jobs are retried with exponential backoff until they run out of
+attempts. A queued job with a dedupe key is not queued twice.
+"""
+import json
+import logging
+import random
+import traceback
+import uuid
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+Task = namedtuple('Task', ('func', 'priority', 'max_attempts'))
+
+TASKS = {}
+
+
+def task(name=None, priority=0, max_attempts=None):
+    """Registers the function as a task
+
+    The function gets ``enqueue`` which takes the arguments of
+    ``enqueue`` but the task name.
+    """
+    def register(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        TASKS[task_name] = Task(func, priority, max_attempts)
+        func.task_name = task_name
+
+        def enqueue_task(*args, **kwargs):
+            return enqueue(task_name, *args, **kwargs)
+        func.enqueue = enqueue_task
+        return func
+    return register
+
+
+def enqueue(name, args=(), kwargs=None, priority=None, dedupe_key=None,
+            delay=0, max_attempts=None):
+    """Queues a call of the task, returns its job
+
+    A job with the dedupe key which is still queued is returned
+    instead of a new one, moved up to run no later than this call
+    asks. Arguments must be serializable to JSON.
+    """
+    registered = TASKS[name]
+    job = Job(
+        name=name,
+        payload=json.dumps({'args': list(args), 'kwargs': kwargs or {}}),
+        priority=registered.priority if priority is None else priority,
+        dedupe_key=dedupe_key,
+        max_attempts=(max_attempts or registered.max_attempts
+                      or settings.JOBS_MAX_ATTEMPTS),
+        available_at=timezone.now() + timedelta(seconds=delay),
+    )
+    if dedupe_key is None:
+        job.save()
+        return job
+    while True:
+        try:
+            with transaction.atomic():
+                job.save()
+            return job
+        except IntegrityError:
+            pass
+        queued = Job.objects.filter(dedupe_key=dedupe_key,
+                                    status=Job.QUEUED)
+        queued.filter(available_at__gt=job.available_at).update(
+            available_at=job.available_at
+        )
+        try:
+            return queued.get()
+        except Job.DoesNotExist:
+            # A worker has claimed the queued job since the insert
+            # failed, so the new one is no longer a duplicate
+            continue
+
+
+def claim(limit, visibility_timeout=None):
+    """Leases up to limit available jobs, returns their (pk, lease)
+
+    Jobs are taken by priority, then by the time they became available.
+    """
+    if visibility_timeout is None:
+        visibility_timeout = settings.JOBS_VISIBILITY_TIMEOUT
+    now = timezone.now()
+    candidates = (
+        Job.objects.filter(status__in=[Job.QUEUED, Job.RUNNING],
+                           available_at__lte=now)
+        .order_by('-priority', 'available_at', 'pk')
+        .values_list('pk', 'available_at')[:limit]
+    )
+    claimed = []
+    for pk, available_at in candidates:
+        lease = uuid.uuid4().hex
+        # Another worker may have taken the job since it was read
+        taken = Job.objects.filter(
+            pk=pk, available_at=available_at,
+            status__in=[Job.QUEUED, Job.RUNNING],
+        ).update(
+            status=Job.RUNNING,
+            lease=lease,
+            attempts=F('attempts') + 1,
+            available_at=now + timedelta(seconds=visibility_timeout),
+        )
+        if taken:
+            claimed.append((pk, lease))
+    return claimed
+
+
+def retry_delay(attempts):
+    """Returns seconds before the next attempt, with jitter"""
+    delay = min(settings.JOBS_RETRY_DELAY * 2 ** (attempts - 1),
+                settings.JOBS_MAX_RETRY_DELAY)
+    return random.uniform(delay / 2, delay)
+
+
+def run_claimed(pk, lease):
+    """Runs the leased job, returns True if it succeeded
+
+    The job is deleted when it succeeds and is queued again or marked
+    failed when it raises. Nothing is written if the lease was lost.
+    """
+    job = Job.objects.filter(pk=pk, lease=lease).first()
+    if job is None:
+        return False
+    registered = TASKS.get(job.name)
+    try:
+        if registered is None:
+            raise LookupError(f'Unknown task {job.name}')
+        payload = json.loads(job.payload)
+        registered.func(*payload['args'], **payload['kwargs'])
+    except Exception:
+        logger.exception('Job %s failed', job)
+        fail(job, traceback.format_exc(),
+             permanent=registered is None)
+        return False
+    Job.objects.filter(pk=pk, lease=lease).delete()
+    return True
+
+
+def fail(job, error, permanent=False):
+    leased = Job.objects.filter(pk=job.pk, lease=job.lease)
+    if permanent or job.attempts >= job.max_attempts:
+        leased.update(status=Job.FAILED, lease='', last_error=error)
+        return
+    available_at = timezone.now() + timedelta(
+        seconds=retry_delay(job.attempts)
+    )
+    try:
+        with transaction.atomic():
+            leased.update(status=Job.QUEUED, lease='', last_error=error,
+                          available_at=available_at)
+    except IntegrityError:
+        # The same job was queued again meanwhile and will do the work
+        leased.delete()
@@ -0,0 +1,150 @@
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.core.management import call_command
+from django.db.models import QuerySet
+from django.utils import timezone
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from .. import queue
+from ..models import Job
+
+
+calls = []
+
+
+@queue.task('tests.record')
+def record(value):
+    calls.append(value)
+
+
+@queue.task('tests.explode', max_attempts=2)
+def explode():
+    raise ValueError('Boom')
+
+
+@queue.task('tests.urgent', priority=10)
+def urgent():
+    pass
+
+
+def make_available(job):
+    Job.objects.filter(pk=job.pk).update(available_at=timezone.now())
+
+
+class QueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_jobs_are_claimed_by_priority(self):
+        """Higher priority first, then older jobs first"""
+        first = record.enqueue(['first'])
+        second = record.enqueue(['second'])
+        top = urgent.enqueue()
+        record.enqueue(['later'], delay=60)
+        claimed = queue.claim(10)
+        self.assertEqual([pk for pk, _ in claimed],
+                         [top.pk, first.pk, second.pk])
+        self.assertEqual(queue.claim(10), [])
+
+    def test_job_runs_and_is_deleted(self):
+        """Succeeded job is removed from the queue"""
+        record.enqueue(['value'])
+        [(pk, lease)] = queue.claim(1)
+        self.assertTrue(queue.run_claimed(pk, lease))
+        self.assertEqual(calls, ['value'])
+        self.assertFalse(Job.objects.exists())
+
+    def test_dedupe_key(self):
+        """Queued job with the key is not queued twice"""
+        job = record.enqueue(['a'], dedupe_key='key')
+        self.assertEqual(record.enqueue(['b'], dedupe_key='key'), job)
+        queue.claim(1)
+        # A running job does not stop a new one
+        self.assertNotEqual(record.enqueue(['c'], dedupe_key='key'), job)
+        self.assertEqual(Job.objects.count(), 2)
+
+    def test_dedupe_key_of_job_claimed_meanwhile(self):
+        """A job claimed between the insert and the lookup is not returned"""
+        job = record.enqueue(['a'], dedupe_key='key')
+        get = QuerySet.get
+        claimed = []
+
+        def claim_first(queryset, *args, **kwargs):
+            if not claimed:
+                claimed.extend(queue.claim(1))
+            return get(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'get', autospec=True,
+                               side_effect=claim_first):
+            new = record.enqueue(['b'], dedupe_key='key')
+        self.assertEqual([pk for pk, _ in claimed], [job.pk])
+        self.assertNotEqual(new, job)
+        self.assertEqual(new.status, Job.QUEUED)
+
+    def test_dedupe_key_moves_job_up(self):
+        """A queued job runs no later than the sooner call asks"""
+        job = record.enqueue(['a'], dedupe_key='key', delay=60)
+        self.assertEqual(record.enqueue(['b'], dedupe_key='key', delay=120),
+                         job)
+        self.assertEqual(queue.claim(1), [])
+        record.enqueue(['c'], dedupe_key='key')
+        self.assertEqual([pk for pk, _ in queue.claim(1)], [job.pk])
+
+    @override_settings(JOBS_RETRY_DELAY=10)
+    def test_failed_job_is_retried_with_backoff(self):
+        """Failure queues job again later until attempts run out"""
+        job = explode.enqueue()
+        [(pk, lease)] = queue.claim(1)
+        self.assertFalse(queue.run_claimed(pk, lease))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertIn('Boom', job.last_error)
+        delay = (job.available_at - timezone.now()).total_seconds()
+        self.assertTrue(4 < delay <= 10)
+        self.assertEqual(queue.claim(1), [])
+        make_available(job)
+        [(pk, lease)] = queue.claim(1)
+        queue.run_claimed(pk, lease)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_lost_lease(self):
+        """Job of a lost worker is claimed again after the timeout"""
+        record.enqueue(['value'])
+        [(pk, stale_lease)] = queue.claim(1, visibility_timeout=60)
+        self.assertEqual(queue.claim(1), [])
+        later = timezone.now() + timedelta(seconds=61)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            [(same_pk, lease)] = queue.claim(1)
+        self.assertEqual(same_pk, pk)
+        self.assertFalse(queue.run_claimed(pk, stale_lease))
+        self.assertTrue(queue.run_claimed(pk, lease))
+        self.assertEqual(calls, ['value'])
+
+    def test_unknown_task_fails_at_once(self):
+        """Job of a removed task is not retried"""
+        job = Job.objects.create(name='tests.missing', max_attempts=5,
+                                 payload='{"args": [], "kwargs": {}}')
+        [(pk, lease)] = queue.claim(1)
+        queue.run_claimed(pk, lease)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+
+class WorkerCommandTests(TransactionTestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_thread_worker_drains_queue(self):
+        """Worker runs all available jobs and exits with --once"""
+        for i in range(5):
+            record.enqueue([i])
+        explode.enqueue(max_attempts=1)
+        out = StringIO()
+        call_command('run_worker', once=True, concurrency=2,
+                     poll_interval=0.01, stdout=out)
+        self.assertIn('Done: 5 jobs succeeded, 1 failed', out.getvalue())
+        self.assertEqual(sorted(calls), list(range(5)))
+        self.assertEqual(list(Job.objects.values_list('status', flat=True)),
+                         [Job.FAILED])
@@ -0,0 +1,12 @@
+from django.contrib import admin
+from .models import Notification
+
+
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'recipient', 'kind', 'post', 'count', 'unread',
+                    'updated')
+    list_filter = ('kind', 'unread')
+    raw_id_fields = ('recipient', 'post', 'last_actor')
+
+
+admin.site.register(Notification, NotificationAdmin)
@@ -0,0 +1,8 @@
+from .digests import get_unread_count
+
+
+def unread_notifications(request):
+    """Adds number of unread notifications of the user"""
+    if not request.user.is_authenticated:
+        return {}
+    return {'unread_notifications': get_unread_count(request.user)}
@@ -0,0 +1,157 @@
+"""Notifications of comments and follows, coalesced into digests
+
+A comment or a follow costs one appended ``Event`` row and an increment
+of the unread counter of the recipient in cache. The digest job runs a
+while after the first event of a burst and folds all events into one
+``Notification`` per recipient, kind and post, like "12 new comments
+on your post", adding to the unread digest if there is one. Each
+recipient then gets one email about all the digests changed by the run.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.urls import reverse
+from django.utils import timezone
+
+from jobs.queue import enqueue
+
+from .models import Event, Notification, User
+
+
+DIGEST_TASK = 'notifications.build_digests'
+DIGEST_SCHEDULED_KEY = 'notifications:digest_scheduled'
+
+
+def unread_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def count_unread(user_id):
+    """Counts unread events of the user in the database"""
+    digested = Notification.objects.filter(
+        recipient_id=user_id, unread=True
+    ).aggregate(total=Sum('count'))['total'] or 0
+    return digested + Event.objects.filter(recipient_id=user_id).count()
+
+
+def get_unread_count(user):
+    """Returns number of unread events of the user, cached"""
+    count = cache.get(unread_key(user.pk))
+    if count is None:
+        count = count_unread(user.pk)
+        cache.add(unread_key(user.pk), count, None)
+    return count
+
+
+def schedule_digests():
+    """Queues the digest job unless one is already due"""
+    delay = settings.NOTIFICATIONS_DIGEST_DELAY
+    # The cache flag spares most events the insert into the job queue
+    if cache.add(DIGEST_SCHEDULED_KEY, True, delay):
+        enqueue(DIGEST_TASK, dedupe_key=DIGEST_TASK, delay=delay)
+
+
+def record(recipient_id, kind, actor_id, post_id=None):
+    """Appends the event for the recipient"""
+    Event.objects.create(recipient_id=recipient_id, kind=kind,
+                         actor_id=actor_id, post_id=post_id)
+    try:
+        cache.incr(unread_key(recipient_id))
+    except ValueError:
+        # Not cached, it is counted from the database when read
+        pass
+    schedule_digests()
+
+
+def mark_read(user):
+    Notification.objects.filter(recipient=user, unread=True).update(
+        unread=False
+    )
+    cache.delete(unread_key(user.pk))
+
+
+def digest_events(events):
+    """Folds the events into notifications, returns the changed ones"""
+    groups = list(
+        events.values('recipient_id', 'kind', 'post_id')
+        .annotate(count=Count('pk'), last_event=Max('pk'))
+        .order_by()
+    )
+    if not groups:
+        return []
+    actors = dict(Event.objects.filter(
+        pk__in=[group['last_event'] for group in groups]
+    ).values_list('pk', 'actor_id'))
+    unread = {
+        (item.recipient_id, item.kind, item.post_id): item
+        for item in Notification.objects.filter(
+            unread=True,
+            recipient_id__in={group['recipient_id'] for group in groups},
+        )
+    }
+    now = timezone.now()
+    changed, created = [], []
+    for group in groups:
+        key = (group['recipient_id'], group['kind'], group['post_id'])
+        notification = unread.get(key)
+        if notification is None:
+            notification = Notification(
+                recipient_id=group['recipient_id'], kind=group['kind'],
+                post_id=group['post_id'],
+            )
+            created.append(notification)
+        else:
+            changed.append(notification)
+        notification.count += group['count']
+        notification.last_actor_id = actors[group['last_event']]
+        notification.updated = now
+    Notification.objects.bulk_update(changed,
+                                     ['count', 'last_actor', 'updated'])
+    Notification.objects.bulk_create(created)
+    events.delete()
+    return changed + created
+
+
+def send_digest_emails(notifications):
+    """Sends one email per recipient about the changed digests"""
+    by_recipient = {}
+    for notification in notifications:
+        by_recipient.setdefault(notification.recipient_id,
+                                []).append(notification)
+    recipients = User.objects.filter(pk__in=by_recipient).exclude(email='')
+    link = settings.SITE_URL + reverse('notifications:index')
+    messages = [
+        EmailMessage(
+            'Новые уведомления на Yatube',
+            '\n'.join(
+                [str(item) for item in by_recipient[user.pk]]
+                + ['', f'Все уведомления: {link}']
+            ),
+            to=[user.email],
+        )
+        for user in recipients.only('pk', 'email')
+    ]
+    if messages:
+        get_connection().send_messages(messages)
+
+
+def build_digests(batch_size=1000):
+    """Digests all pending events, returns their number"""
+    digested = 0
+    changed = {}
+    while True:
+        with transaction.atomic():
+            last = list(Event.objects.order_by('pk')
+                        .values_list('pk', flat=True)[:batch_size])
+            if not last:
+                break
+            events = Event.objects.filter(pk__lte=last[-1])
+            for notification in digest_events(events):
+                changed[(notification.recipient_id, notification.kind,
+                         notification.post_id)] = notification
+        digested += len(last)
+    if changed:
+        send_digest_emails(changed.values())
+    return digested
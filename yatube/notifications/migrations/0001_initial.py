@@ -0,0 +1,54 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('posts', '0029_tags_mentions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('comment', 'Комментарий'), ('follow', 'Подписка')], max_length=10, verbose_name='Тип')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Количество событий')),
+                ('unread', models.BooleanField(default=True, verbose_name='Не прочитано')),
+                ('updated', models.DateTimeField(verbose_name='Дата обновления')),
+                ('last_actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Последний автор')),
+                ('post', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Post', verbose_name='Пост')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL, verbose_name='Получатель')),
+            ],
+            options={
+                'verbose_name': 'Уведомление',
+                'verbose_name_plural': 'Уведомления',
+            },
+        ),
+        migrations.CreateModel(
+            name='Event',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('comment', 'Комментарий'), ('follow', 'Подписка')], max_length=10, verbose_name='Тип')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('post', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Post', verbose_name='Пост')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_events', to=settings.AUTH_USER_MODEL, verbose_name='Получатель')),
+            ],
+            options={
+                'verbose_name': 'Событие',
+                'verbose_name_plural': 'События',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', '-updated', '-id'], name='notification_recipient_idx'),
+        ),
+    ]
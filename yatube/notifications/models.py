@@ -0,0 +1,88 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+
+from posts.models import Post
+
+
+User = get_user_model()
+
+
+def plural(number, forms):
+    """Picks the Russian form of the word for the number"""
+    if number % 10 == 1 and number % 100 != 11:
+        return forms[0]
+    if 2 <= number % 10 <= 4 and not 12 <= number % 100 <= 14:
+        return forms[1]
+    return forms[2]
+
+
+class Event(models.Model):
+    """Describes something that happened to the user
+
+    Events are only inserted, the digest job folds them into
+    notifications and deletes them.
+    """
+    COMMENT = 'comment'
+    FOLLOW = 'follow'
+    KINDS = (
+        (COMMENT, 'Комментарий'),
+        (FOLLOW, 'Подписка'),
+    )
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE,
+                                  related_name='notification_events',
+                                  verbose_name='Получатель')
+    kind = models.CharField(max_length=10, choices=KINDS,
+                            verbose_name='Тип')
+    actor = models.ForeignKey(User, on_delete=models.CASCADE,
+                              related_name='+', verbose_name='Автор')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, null=True,
+                             blank=True, related_name='+',
+                             verbose_name='Пост')
+    created = models.DateTimeField(auto_now_add=True,
+                                   verbose_name='Дата создания')
+
+    class Meta:
+        verbose_name = 'Событие'
+        verbose_name_plural = 'События'
+
+    def __str__(self) -> str:
+        return f'{self.kind} → {self.recipient_id}'
+
+
+class Notification(models.Model):
+    """Describes a digest of events of one kind about one post"""
+    FORMS = {
+        Event.COMMENT: ('новый комментарий', 'новых комментария',
+                        'новых комментариев'),
+        Event.FOLLOW: ('новый подписчик', 'новых подписчика',
+                       'новых подписчиков'),
+    }
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE,
+                                  related_name='notifications',
+                                  verbose_name='Получатель')
+    kind = models.CharField(max_length=10, choices=Event.KINDS,
+                            verbose_name='Тип')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, null=True,
+                             blank=True, related_name='+',
+                             verbose_name='Пост')
+    count = models.PositiveIntegerField(default=0,
+                                        verbose_name='Количество событий')
+    last_actor = models.ForeignKey(User, on_delete=models.SET_NULL,
+                                   null=True, blank=True, related_name='+',
+                                   verbose_name='Последний автор')
+    unread = models.BooleanField(default=True, verbose_name='Не прочитано')
+    updated = models.DateTimeField(verbose_name='Дата обновления')
+
+    class Meta:
+        verbose_name = 'Уведомление'
+        verbose_name_plural = 'Уведомления'
+        indexes = [
+            models.Index(fields=['recipient', '-updated', '-id'],
+                         name='notification_recipient_idx'),
+        ]
+
+    def __str__(self) -> str:
+        text = f'{self.count} {plural(self.count, self.FORMS[self.kind])}'
+        if self.kind == Event.COMMENT:
+            return f'{text} к вашей записи'
+        return text
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from posts.models import Comment, Follow
+from . import digests
+from .models import Event
+
+
+@receiver(post_save, sender=Comment)
+def notify_post_author(sender, instance, created, **kwargs):
+    if created and instance.author_id != instance.post.author_id:
+        digests.record(instance.post.author_id, Event.COMMENT,
+                       instance.author_id, instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+def notify_followed_author(sender, instance, created, **kwargs):
+    if created:
+        digests.record(instance.author_id, Event.FOLLOW, instance.user_id)
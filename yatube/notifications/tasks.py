@@ -0,0 +1,8 @@
+from jobs.queue import task
+
+from . import digests
+
+
+@task(digests.DIGEST_TASK)
+def build_digests():
+    digests.build_digests()
@@ -0,0 +1,137 @@
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from jobs.models import Job
+from posts.models import Comment, Follow, Post
+from .. import digests
+from ..models import Event, Notification
+
+
+User = get_user_model()
+
+
+class NotificationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author',
+                                              'author@yatube.ru')
+        cls.readers = [
+            User.objects.create_user(f'reader{number}')
+            for number in range(3)
+        ]
+        cls.post = Post.objects.create(text='Текст', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.readers[0])
+
+    def comment(self, reader, count=1):
+        for _ in range(count):
+            Comment.objects.create(post=self.post, author=reader,
+                                   text='Комментарий')
+
+    def test_comment_form_and_follow_append_events(self):
+        """add_comment and profile_follow notify the author"""
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Комментарий'},
+        )
+        self.reader_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'})
+        )
+        self.assertEqual(
+            sorted(Event.objects.values_list('kind', 'actor', 'post')),
+            [(Event.COMMENT, self.readers[0].pk, self.post.pk),
+             (Event.FOLLOW, self.readers[0].pk, None)],
+        )
+
+    def test_own_comment_is_not_notified(self):
+        self.comment(self.author)
+        self.assertFalse(Event.objects.exists())
+
+    def test_burst_schedules_one_digest_job(self):
+        """Only the first event of a burst queues the job"""
+        self.comment(self.readers[0], 5)
+        job = Job.objects.get()
+        self.assertEqual(job.name, digests.DIGEST_TASK)
+        self.assertGreater(job.available_at, job.created)
+
+    def test_burst_is_coalesced_into_digest(self):
+        """Twelve comments become one notification"""
+        for reader in self.readers:
+            self.comment(reader, 4)
+        Follow.objects.create(user=self.readers[0], author=self.author)
+        Follow.objects.create(user=self.readers[1], author=self.author)
+        self.assertEqual(digests.build_digests(batch_size=5), 14)
+        comments = Notification.objects.get(kind=Event.COMMENT)
+        self.assertEqual(str(comments),
+                         '12 новых комментариев к вашей записи')
+        self.assertEqual(comments.post, self.post)
+        self.assertEqual(comments.last_actor, self.readers[2])
+        follows = Notification.objects.get(kind=Event.FOLLOW)
+        self.assertEqual(str(follows), '2 новых подписчика')
+        self.assertFalse(Event.objects.exists())
+
+    def test_unread_digest_keeps_growing(self):
+        """Later bursts add to the digest until it is read"""
+        self.comment(self.readers[0])
+        digests.build_digests()
+        self.comment(self.readers[1], 2)
+        digests.build_digests()
+        self.assertEqual(str(Notification.objects.get()),
+                         '3 новых комментария к вашей записи')
+        digests.mark_read(self.author)
+        self.comment(self.readers[2])
+        digests.build_digests()
+        self.assertEqual(
+            [str(item) for item in Notification.objects.order_by('pk')],
+            ['3 новых комментария к вашей записи',
+             '1 новый комментарий к вашей записи'],
+        )
+
+    def test_digest_email_is_sent_once_per_run(self):
+        self.comment(self.readers[0], 3)
+        Follow.objects.create(user=self.readers[0], author=self.author)
+        digests.build_digests(batch_size=2)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['author@yatube.ru'])
+        self.assertIn('3 новых комментария к вашей записи',
+                      mail.outbox[0].body)
+        self.assertIn('1 новый подписчик', mail.outbox[0].body)
+
+    def test_unread_counter_is_cached(self):
+        """The counter is read once, then kept up to date in cache"""
+        with self.assertNumQueries(2):
+            self.assertEqual(digests.get_unread_count(self.author), 0)
+        self.comment(self.readers[0], 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(digests.get_unread_count(self.author), 2)
+        digests.build_digests()
+        self.assertEqual(digests.get_unread_count(self.author), 2)
+        cache.clear()
+        self.assertEqual(digests.get_unread_count(self.author), 2)
+
+    def test_page_shows_and_reads_notifications(self):
+        self.comment(self.readers[0], 2)
+        digests.build_digests()
+        response = self.author_client.get(reverse('posts:index'))
+        self.assertEqual(response.context['unread_notifications'], 2)
+        response = self.author_client.get(reverse('notifications:index'))
+        notification = response.context['page_obj'][0]
+        self.assertTrue(notification.unread)
+        self.assertContains(response, '2 новых комментария')
+        self.assertEqual(digests.get_unread_count(self.author), 0)
+        self.assertFalse(Notification.objects.filter(unread=True).exists())
+
+    def test_page_requires_login(self):
+        response = Client().get(reverse('notifications:index'))
+        self.assertRedirects(
+            response,
+            f"{reverse('users:login')}?next="
+            f"{reverse('notifications:index')}",
+        )
@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+
+app_name = 'notifications'
+
+urlpatterns = [
+    path('', views.index, name='index'),
+]
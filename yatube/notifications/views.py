@@ -0,0 +1,23 @@
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import render
+
+from posts.paginator import CursorPaginator
+from . import digests
+
+
+NOTIFICATIONS_PER_PAGE = 20
+
+
+@login_required
+def index(request):
+    """Shows digests of the user and marks them read"""
+    notifications = request.user.notifications.select_related(
+        'post', 'last_actor'
+    )
+    paginator = CursorPaginator(notifications, NOTIFICATIONS_PER_PAGE,
+                                keys=('updated', 'pk'))
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    # The page is already fetched, so it still shows what was unread
+    digests.mark_read(request.user)
+    return render(request, 'notifications/index.html',
+                  {'page_obj': page_obj})
@@ -0,0 +1,12 @@
+from django.contrib import admin
+from .models import OutgoingEmail
+
+
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'subject', 'recipients', 'status', 'attempts',
+                    'created')
+    list_filter = ('status',)
+    search_fields = ('recipients',)
+
+
+admin.site.register(OutgoingEmail, OutgoingEmailAdmin)
@@ -0,0 +1,9 @@
+from django.core.mail.backends.base import BaseEmailBackend
+
+from .mail import queue_messages
+
+
+class OutboxBackend(BaseEmailBackend):
+    """Puts emails into the outbox instead of sending them"""
+    def send_messages(self, email_messages):
+        return queue_messages(email_messages)
@@ -0,0 +1,206 @@
+"""Outbox of emails sent off the request path
+
+``OutboxBackend`` is the ``EMAIL_BACKEND`` of the site: ``send_mail``,
+the password reset and any notification only insert rows into the
+outbox and queue a job to send them. The sender drains the outbox in
+batches over one connection of ``OUTBOX_EMAIL_BACKEND``, which is kept
+open between messages, paced to ``OUTBOX_RATE_LIMIT`` messages a
+second. Failed emails are retried with backoff, the ones refused by
+the server are not; the sender is queued again for the earliest retry.
+"""
+import base64
+import json
+import smtplib
+import uuid
+from datetime import timedelta
+from time import monotonic, sleep
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F, Min
+from django.utils import timezone
+
+from jobs.queue import enqueue, retry_delay
+
+from .models import OutgoingEmail
+
+
+SEND_TASK = 'outbox.send_outbox'
+
+# Errors after which the connection has to be opened again
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError,
+                     TimeoutError)
+# Errors which are not cured by retries
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused,)
+
+
+def serialize(message):
+    """Returns JSON with the fields of the EmailMessage"""
+    attachments = []
+    for attachment in message.attachments:
+        if not isinstance(attachment, tuple):
+            raise ValueError('Only file attachments can be queued')
+        filename, content, mimetype = attachment
+        if isinstance(content, str):
+            content = content.encode()
+        attachments.append(
+            [filename, base64.b64encode(content).decode(), mimetype]
+        )
+    return json.dumps({
+        'subject': message.subject,
+        'body': message.body,
+        'from_email': message.from_email,
+        'to': message.to,
+        'cc': message.cc,
+        'bcc': message.bcc,
+        'reply_to': message.reply_to,
+        'headers': message.extra_headers,
+        'alternatives': getattr(message, 'alternatives', []),
+        'attachments': attachments,
+    })
+
+
+def deserialize(data):
+    """Builds the EmailMessage back from serialize output"""
+    fields = json.loads(data)
+    attachments = [
+        (filename, base64.b64decode(content), mimetype)
+        for filename, content, mimetype in fields.pop('attachments')
+    ]
+    alternatives = [tuple(item) for item in fields.pop('alternatives')]
+    return EmailMultiAlternatives(
+        attachments=attachments, alternatives=alternatives, **fields
+    )
+
+
+def queue_messages(messages):
+    """Puts the messages into the outbox, returns their number"""
+    emails = OutgoingEmail.objects.bulk_create(
+        OutgoingEmail(
+            subject=message.subject,
+            recipients=', '.join(message.recipients()),
+            message=serialize(message),
+        )
+        for message in messages if message.recipients()
+    )
+    if emails:
+        enqueue(SEND_TASK, dedupe_key=SEND_TASK)
+    return len(emails)
+
+
+def claim(limit, visibility_timeout):
+    """Leases up to limit emails which are due, oldest first"""
+    now = timezone.now()
+    lease = uuid.uuid4().hex
+    due = (
+        OutgoingEmail.objects.filter(status=OutgoingEmail.QUEUED,
+                                     available_at__lte=now)
+        .order_by('available_at', 'pk')
+        .values_list('pk', flat=True)[:limit]
+    )
+    # Emails leased by another sender meanwhile are no longer due
+    OutgoingEmail.objects.filter(
+        pk__in=list(due), status=OutgoingEmail.QUEUED,
+        available_at__lte=now,
+    ).update(
+        lease=lease, attempts=F('attempts') + 1,
+        available_at=now + timedelta(seconds=visibility_timeout),
+    )
+    return list(
+        OutgoingEmail.objects.filter(lease=lease).order_by('pk')
+    )
+
+
+def fail(email, error):
+    leased = OutgoingEmail.objects.filter(pk=email.pk, lease=email.lease)
+    if (isinstance(error, PERMANENT_ERRORS)
+            or email.attempts >= settings.OUTBOX_MAX_ATTEMPTS):
+        leased.update(status=OutgoingEmail.FAILED, lease='',
+                      last_error=repr(error))
+        return
+    leased.update(
+        lease='', last_error=repr(error),
+        available_at=timezone.now() + timedelta(
+            seconds=retry_delay(email.attempts)),
+    )
+
+
+class Throttle:
+    """Paces calls of wait to the rate a second"""
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_at = 0
+
+    def wait(self):
+        now = monotonic()
+        if self.next_at > now:
+            sleep(self.next_at - now)
+            now = self.next_at
+        self.next_at = now + self.interval
+
+
+def send_batch(connection, emails, throttle):
+    """Sends the leased emails over the open connection
+
+    Returns numbers of sent and failed emails and whether the
+    connection is still open. When it can not be opened again, the rest
+    of the batch fails with the error to be retried later.
+    """
+    sent = failed = 0
+    for index, email in enumerate(emails):
+        throttle.wait()
+        try:
+            if not connection.send_messages([deserialize(email.message)]):
+                raise smtplib.SMTPException('Message was not sent')
+        except Exception as error:
+            fail(email, error)
+            failed += 1
+            if isinstance(error, CONNECTION_ERRORS):
+                try:
+                    connection.close()
+                    connection.open()
+                except Exception as open_error:
+                    for rest in emails[index + 1:]:
+                        fail(rest, open_error)
+                    return sent, len(emails) - sent, False
+            continue
+        OutgoingEmail.objects.filter(pk=email.pk, lease=email.lease).delete()
+        sent += 1
+    return sent, failed, True
+
+
+def schedule_retry():
+    """Queues the sender for the earliest email left in the outbox"""
+    next_at = OutgoingEmail.objects.filter(
+        status=OutgoingEmail.QUEUED
+    ).aggregate(next_at=Min('available_at'))['next_at']
+    if next_at is not None:
+        delay = max((next_at - timezone.now()).total_seconds(), 0)
+        enqueue(SEND_TASK, dedupe_key=SEND_TASK, delay=delay)
+
+
+def drain(batch_size=None, rate=None, visibility_timeout=None):
+    """Sends all due emails over one connection
+
+    Returns numbers of sent and failed emails.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    rate = settings.OUTBOX_RATE_LIMIT if rate is None else rate
+    visibility_timeout = (visibility_timeout
+                          or settings.OUTBOX_VISIBILITY_TIMEOUT)
+    throttle = Throttle(rate)
+    sent = failed = 0
+    emails = claim(batch_size, visibility_timeout)
+    if emails:
+        with get_connection(settings.OUTBOX_EMAIL_BACKEND) as connection:
+            while emails:
+                batch_sent, batch_failed, connected = send_batch(
+                    connection, emails, throttle
+                )
+                sent += batch_sent
+                failed += batch_failed
+                if not connected:
+                    break
+                emails = claim(batch_size, visibility_timeout)
+    schedule_retry()
+    return sent, failed
@@ -0,0 +1,39 @@
+from time import sleep
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from outbox import mail
+
+
+class Command(BaseCommand):
+    help = 'Sends queued emails in batches over one connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE,
+            help='Number of emails leased at once',
+        )
+        parser.add_argument(
+            '--rate', type=float, default=settings.OUTBOX_RATE_LIMIT,
+            help='Max emails sent a second, 0 for no limit',
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep polling the outbox instead of exiting',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=5.0,
+            help='Seconds between polls of the empty outbox',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = mail.drain(options['batch_size'],
+                                      options['rate'])
+            if sent or failed:
+                self.stdout.write(f'{sent} emails sent, {failed} failed')
+            if not options['loop']:
+                break
+            sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -0,0 +1,38 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:16
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutgoingEmail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.TextField(verbose_name='Тема')),
+                ('recipients', models.TextField(verbose_name='Получатели')),
+                ('message', models.TextField(verbose_name='Письмо')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('failed', 'Не отправлено')], default='queued', max_length=10, verbose_name='Состояние')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попытки')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Доступно с')),
+                ('lease', models.CharField(blank=True, max_length=32, verbose_name='Аренда')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Исходящее письмо',
+                'verbose_name_plural': 'Исходящие письма',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='outgoingemail',
+            index=models.Index(fields=['status', 'available_at'], name='outgoing_email_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import models
+from django.utils import timezone
+
+
+class OutgoingEmail(models.Model):
+    """Describes an email waiting to be sent"""
+    QUEUED = 'queued'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (FAILED, 'Не отправлено'),
+    )
+    subject = models.TextField(verbose_name='Тема')
+    recipients = models.TextField(verbose_name='Получатели')
+    # Fields of the EmailMessage to build it again for sending
+    message = models.TextField(verbose_name='Письмо')
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=QUEUED, verbose_name='Состояние')
+    attempts = models.PositiveSmallIntegerField(default=0,
+                                                verbose_name='Попытки')
+    # Emails being sent are hidden until it, so a lost sender does not
+    # hold them forever
+    available_at = models.DateTimeField(default=timezone.now,
+                                        verbose_name='Доступно с')
+    lease = models.CharField(max_length=32, blank=True,
+                             verbose_name='Аренда')
+    last_error = models.TextField(blank=True,
+                                  verbose_name='Последняя ошибка')
+    created = models.DateTimeField(auto_now_add=True,
+                                   verbose_name='Дата создания')
+
+    class Meta:
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Исходящие письма'
+        indexes = [
+            models.Index(fields=['status', 'available_at'],
+                         name='outgoing_email_queue_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.subject} → {self.recipients}'
@@ -0,0 +1,8 @@
+from jobs.queue import task
+
+from . import mail
+
+
+@task(mail.SEND_TASK)
+def send_outbox():
+    mail.drain()
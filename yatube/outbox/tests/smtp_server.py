@@ -0,0 +1,84 @@
+"""Minimal SMTP server standing in for the mail relay in tests"""
+import socketserver
+import threading
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.sender, self.recipients = None, []
+        self.reply('220 localhost ESMTP')
+        for line in self.rfile:
+            command = line.decode().rstrip('\r\n')
+            verb = command[:4].upper()
+            if verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            handler = getattr(self, f'smtp_{verb.lower()}', None)
+            if handler is None:
+                self.reply('502 Command not implemented')
+            else:
+                handler(command[4:].strip())
+
+    def smtp_ehlo(self, argument):
+        self.reply('250 localhost')
+
+    smtp_helo = smtp_ehlo
+
+    def smtp_noop(self, argument):
+        self.reply('250 OK')
+
+    def smtp_rset(self, argument):
+        self.sender, self.recipients = None, []
+        self.reply('250 OK')
+
+    def smtp_mail(self, argument):
+        self.sender, self.recipients = argument[5:].strip('<>'), []
+        self.reply('250 OK')
+
+    def smtp_rcpt(self, argument):
+        recipient = argument[3:].strip('<>')
+        if recipient in self.server.refused:
+            self.reply('550 No such user')
+            return
+        self.recipients.append(recipient)
+        self.reply('250 OK')
+
+    def smtp_data(self, argument):
+        self.reply('354 End data with <CR><LF>.<CR><LF>')
+        data = []
+        for line in self.rfile:
+            if line in (b'.\r\n', b'.\n'):
+                break
+            data.append(line.decode())
+        self.server.messages.append(
+            (self.sender, self.recipients, ''.join(data))
+        )
+        self.reply('250 OK')
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    """Accepts every message but for the refused recipients"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.connections = 0
+        self.messages = []
+        self.refused = set()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,180 @@
+from django.core import mail as django_mail
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from jobs.models import Job
+from .. import mail
+from ..models import OutgoingEmail
+from .smtp_server import SMTPServer
+
+
+User = get_user_model()
+
+OUTBOX = 'outbox.backends.OutboxBackend'
+SMTP = 'django.core.mail.backends.smtp.EmailBackend'
+LOCMEM = 'django.core.mail.backends.locmem.EmailBackend'
+
+
+def queue_emails(count, **kwargs):
+    with override_settings(EMAIL_BACKEND=OUTBOX):
+        for number in range(count):
+            django_mail.send_mail(f'Письмо {number}', 'Текст',
+                                  'noreply@yatube.ru',
+                                  [f'user{number}@yatube.ru'], **kwargs)
+
+
+def make_available():
+    OutgoingEmail.objects.update(available_at=timezone.now())
+
+
+class Clock:
+    """Time which passes only in sleep"""
+    def __init__(self):
+        self.now = 0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@override_settings(OUTBOX_EMAIL_BACKEND=LOCMEM)
+class OutboxTests(TestCase):
+    @override_settings(EMAIL_BACKEND=OUTBOX)
+    def test_password_reset_is_queued(self):
+        """The reset email waits in the outbox with a job to send it"""
+        User.objects.create_user('leo', 'leo@yatube.ru', 'secret')
+        self.client.post(reverse('users:password_reset_form'),
+                         {'email': 'leo@yatube.ru'})
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.recipients, 'leo@yatube.ru')
+        self.assertEqual(email.status, OutgoingEmail.QUEUED)
+        self.assertTrue(
+            Job.objects.filter(name=mail.SEND_TASK).exists()
+        )
+
+    def test_message_survives_the_outbox(self):
+        """Alternatives, headers and attachments are sent as queued"""
+        message = django_mail.EmailMultiAlternatives(
+            'Тема', 'Текст', 'noreply@yatube.ru', ['leo@yatube.ru'],
+            cc=['kim@yatube.ru'], headers={'X-Tag': 'reset'},
+        )
+        message.attach_alternative('<p>Текст</p>', 'text/html')
+        message.attach('note.txt', 'Заметка', 'text/plain')
+        restored = mail.deserialize(mail.serialize(message))
+        self.assertEqual(restored.subject, 'Тема')
+        self.assertEqual(restored.recipients(),
+                         ['leo@yatube.ru', 'kim@yatube.ru'])
+        self.assertEqual(restored.extra_headers, {'X-Tag': 'reset'})
+        self.assertEqual(restored.alternatives,
+                         [('<p>Текст</p>', 'text/html')])
+        self.assertEqual(restored.attachments,
+                         [('note.txt', 'Заметка', 'text/plain')])
+
+    def test_drain_sends_over_one_connection(self):
+        """All batches go through a single SMTP session"""
+        queue_emails(5)
+        with SMTPServer() as server, override_settings(
+            OUTBOX_EMAIL_BACKEND=SMTP, EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=server.port, EMAIL_USE_TLS=False,
+        ):
+            sent, failed = mail.drain(batch_size=2, rate=0)
+        self.assertEqual((sent, failed), (5, 0))
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(
+            sorted(recipients[0] for _, recipients, _ in server.messages),
+            [f'user{number}@yatube.ru' for number in range(5)],
+        )
+        self.assertFalse(OutgoingEmail.objects.exists())
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_failed_email_is_retried_then_given_up(self):
+        """Failures are retried later until attempts run out"""
+        queue_emails(1)
+        with mock.patch.object(django_mail.backends.locmem.EmailBackend,
+                               'send_messages',
+                               side_effect=ConnectionResetError):
+            self.assertEqual(mail.drain(rate=0), (0, 1))
+            email = OutgoingEmail.objects.get()
+            self.assertEqual(email.status, OutgoingEmail.QUEUED)
+            self.assertGreater(email.available_at, timezone.now())
+            self.assertEqual(mail.drain(rate=0), (0, 0))
+            make_available()
+            self.assertEqual(mail.drain(rate=0), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.FAILED)
+        self.assertIn('ConnectionResetError', email.last_error)
+
+    def test_sender_is_queued_for_the_retry(self):
+        """A delayed job sends the emails when their retry is due"""
+        queue_emails(1)
+        Job.objects.all().delete()
+        with mock.patch.object(django_mail.backends.locmem.EmailBackend,
+                               'send_messages',
+                               side_effect=ConnectionResetError):
+            mail.drain(rate=0)
+        email = OutgoingEmail.objects.get()
+        job = Job.objects.get(name=mail.SEND_TASK, status=Job.QUEUED)
+        self.assertAlmostEqual(job.available_at, email.available_at,
+                               delta=timedelta(seconds=1))
+        job.delete()
+        make_available()
+        self.assertEqual(mail.drain(rate=0), (1, 0))
+        self.assertFalse(Job.objects.exists())
+
+    def test_failed_reconnect_fails_the_batch(self):
+        """The rest of the batch waits for a retry without a connection"""
+        queue_emails(3)
+        backend = django_mail.backends.locmem.EmailBackend
+        with mock.patch.object(backend, 'send_messages',
+                               side_effect=ConnectionResetError) as send, \
+                mock.patch.object(backend, 'open',
+                                  side_effect=[None, ConnectionRefusedError]):
+            self.assertEqual(mail.drain(rate=0), (0, 3))
+        self.assertEqual(send.call_count, 1)
+        errors = sorted(OutgoingEmail.objects.filter(
+            status=OutgoingEmail.QUEUED).values_list('last_error', flat=True))
+        self.assertEqual(len(errors), 3)
+        self.assertIn('ConnectionRefusedError', errors[0])
+        self.assertIn('ConnectionResetError', errors[2])
+
+    def test_refused_recipient_is_not_retried(self):
+        """An email refused by the server fails at once"""
+        queue_emails(2)
+        with SMTPServer() as server, override_settings(
+            OUTBOX_EMAIL_BACKEND=SMTP, EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=server.port, EMAIL_USE_TLS=False,
+        ):
+            server.refused.add('user0@yatube.ru')
+            self.assertEqual(mail.drain(rate=0), (1, 1))
+        self.assertEqual(server.connections, 1)
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.recipients, 'user0@yatube.ru')
+        self.assertEqual(email.status, OutgoingEmail.FAILED)
+
+    def test_rate_limit_spaces_sends(self):
+        """The throttle waits between emails to keep the rate"""
+        queue_emails(3)
+        clock = Clock()
+        with mock.patch.object(mail, 'monotonic', clock.monotonic), \
+                mock.patch.object(mail, 'sleep', clock.sleep):
+            self.assertEqual(mail.drain(rate=10), (3, 0))
+        self.assertEqual(len(clock.sleeps), 2)
+        for seconds in clock.sleeps:
+            self.assertAlmostEqual(seconds, 0.1)
+        self.assertEqual(len(django_mail.outbox), 3)
+
+    def test_command_drains_outbox(self):
+        queue_emails(2)
+        out = StringIO()
+        call_command('send_outbox', '--rate', '0', stdout=out)
+        self.assertIn('2 emails sent, 0 failed', out.getvalue())
+        self.assertEqual(len(django_mail.outbox), 2)
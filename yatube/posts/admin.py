@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Post, Group
+from .search import filter_posts
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -9,6 +10,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Searches posts by the full-text index instead of LIKE"""
+        if not search_term:
+            return queryset, False
+        return filter_posts(queryset, search_term), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
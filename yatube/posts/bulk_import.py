@@ -0,0 +1,342 @@
+"""Bulk import of posts, comments and follows
+
+Records are streamed from JSONL or CSV, so only one chunk of them is
+kept in memory. Authors and groups are resolved through lookup maps
+loaded once, rows are written by ``bulk_create`` in batches and every
+chunk is committed in its own transaction together with everything
+signals would have derived from its rows: counters, follow feeds and
+search indexes. A chunk is either imported whole or not at all, so an
+interrupted import is resumed from the last committed record.
+
+Records look like::
+
+    post:    {"author": "leo", "text": "...", "group": "slug",
+              "pub_date": "2021-10-08T09:06:00+03:00"}
+    comment: {"post": 1, "parent": 7, "author": "leo", "text": "...",
+              "pub_date": ...}
+    follow:  {"user": "leo", "author": "anna"}
+
+``id``, ``group``, ``parent`` and ``pub_date`` may be empty. Rows keep
+the ids of their records when those are free and get new ones
+otherwise; ids of imported records are remembered, so ``post`` and
+``parent`` are resolved to the rows written for them, even by an
+earlier import. A parent is a comment of the same post which is
+imported before or earlier in the same file.
+"""
+import csv
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import changes, counters, fuzzy, search, tags, threads, timeline
+from .cache import bump_feed_version
+from .models import Comment, Follow, Group, ImportedRecord, Post
+
+
+User = get_user_model()
+
+KINDS = ('post', 'comment', 'follow')
+FORMATS = ('jsonl', 'csv')
+
+
+class InvalidRecord(Exception):
+    """Raised when a record can not be imported"""
+
+
+def read_records(file, data_format):
+    """Yields records of the text file one by one"""
+    if data_format == 'csv':
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if line.strip():
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                raise InvalidRecord(f'invalid JSON: {error}')
+            if not isinstance(record, dict):
+                raise InvalidRecord('record is not a JSON object')
+            yield record
+
+
+class Lookups:
+    """Maps usernames and group slugs to primary keys"""
+    def __init__(self):
+        self.users = dict(
+            User.objects.values_list('username', 'pk').iterator()
+        )
+        self.groups = dict(
+            Group.objects.values_list('slug', 'pk').iterator()
+        )
+
+    def user(self, username):
+        try:
+            return self.users[username]
+        except KeyError:
+            raise InvalidRecord(f'unknown user {username!r}')
+
+    def group(self, slug):
+        if not slug:
+            return None
+        try:
+            return self.groups[slug]
+        except KeyError:
+            raise InvalidRecord(f'unknown group {slug!r}')
+
+
+def field(record, name):
+    value = record.get(name)
+    if value in (None, ''):
+        raise InvalidRecord(f'{name} is required')
+    return value
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise InvalidRecord(f'invalid date {value!r}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def parse_id(value, name):
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise InvalidRecord(f'invalid {name} {value!r}')
+
+
+def imported(obj, record):
+    """Keeps the id and the date of the record on its object
+
+    Every attempt to write a chunk starts over from them, as a failed
+    one leaves insert time and keys of its own on the objects.
+    """
+    obj.source_id = parse_id(record.get('id'), 'id')
+    obj.import_date = parse_date(record.get('pub_date'))
+    return obj
+
+
+def build_post(record, lookups):
+    return imported(Post(
+        author_id=lookups.user(field(record, 'author')),
+        group_id=lookups.group(record.get('group')),
+        text=field(record, 'text'),
+    ), record)
+
+
+def build_comment(record, lookups):
+    comment = imported(Comment(
+        author_id=lookups.user(field(record, 'author')),
+        text=field(record, 'text'),
+    ), record)
+    comment.source_post = parse_id(field(record, 'post'), 'post')
+    comment.source_parent = parse_id(record.get('parent'), 'parent')
+    return comment
+
+
+def build_follow(record, lookups):
+    follow = Follow(
+        user_id=lookups.user(field(record, 'user')),
+        author_id=lookups.user(field(record, 'author')),
+    )
+    if follow.user_id == follow.author_id:
+        raise InvalidRecord('user can not follow themselves')
+    return follow
+
+
+BUILDERS = {
+    'post': build_post,
+    'comment': build_comment,
+    'follow': build_follow,
+}
+
+
+def insert_dated(model, objects, batch_size):
+    """Inserts the rows with the dates of their records
+
+    ``auto_now_add`` stamps the rows on insert, so their dates are
+    written back by an update instead of switching the field off for
+    every request of the process.
+    """
+    model.objects.bulk_create(objects, batch_size)
+    for obj in objects:
+        obj.pub_date = obj.import_date
+    model.objects.bulk_update(objects, ['pub_date'], batch_size)
+
+
+def resolve_ids(kind, source_ids):
+    """Maps ids of records to primary keys of the rows written for them
+
+    Ids of records which were not imported are primary keys already.
+    """
+    source_ids = set(source_ids) - {None}
+    rows = dict(ImportedRecord.objects.filter(
+        kind=kind, source_id__in=source_ids
+    ).values_list('source_id', 'row_id'))
+    return {source_id: rows.get(source_id, source_id)
+            for source_id in source_ids}
+
+
+def check_new(kind, objects):
+    """Rejects records with ids seen in the chunk or an earlier import"""
+    source_ids = [obj.source_id for obj in objects
+                  if obj.source_id is not None]
+    if len(set(source_ids)) != len(source_ids):
+        raise InvalidRecord('ids are repeated')
+    seen = list(ImportedRecord.objects.filter(
+        kind=kind, source_id__in=source_ids
+    ).values_list('source_id', flat=True))
+    if seen:
+        raise InvalidRecord(f'ids {sorted(seen)} were imported already')
+
+
+def assign_pks(model, objects):
+    """Gives the objects the ids of their records or new primary keys
+
+    SQLite does not return primary keys of bulk inserts, so they are
+    assigned here to index the rows; a row inserted by a request
+    meanwhile makes the chunk fail with IntegrityError and be retried.
+    """
+    wanted = {obj.source_id for obj in objects} - {None}
+    taken = set(
+        model.objects.filter(pk__in=wanted).values_list('pk', flat=True)
+    )
+    last_pk = model.objects.aggregate(Max('pk'))['pk__max'] or 0
+    next_pk = max(last_pk, *wanted, 0) + 1
+    for obj in objects:
+        if obj.source_id in wanted and obj.source_id not in taken:
+            obj.pk = obj.source_id
+        else:
+            obj.pk = next_pk
+            next_pk += 1
+
+
+def remember_ids(kind, objects):
+    """Stores the primary keys given to records with ids"""
+    ImportedRecord.objects.bulk_create(
+        ImportedRecord(kind=kind, source_id=obj.source_id, row_id=obj.pk)
+        for obj in objects if obj.source_id is not None
+    )
+
+
+def write_posts(posts, batch_size):
+    check_new('post', posts)
+    assign_pks(Post, posts)
+    insert_dated(Post, posts, batch_size)
+    remember_ids('post', posts)
+    search.index_new_posts((post.pk, post.text) for post in posts)
+    fuzzy.add_post_words(post.text for post in posts)
+    tags.index_posts((post.pk, post.text, post.pub_date) for post in posts)
+    authors = {post.author_id for post in posts}
+    counters.reconcile_authors(list(authors))
+    return Follow.objects.filter(author__in=authors).values_list(
+        'user', flat=True).distinct()
+
+
+def place_comments(comments):
+    """Sets parents, paths and depths of the comments
+
+    A parent is looked up among the comments placed before it in the
+    chunk first, then among the rows.
+    """
+    parent_ids = resolve_ids(
+        'comment', (comment.source_parent for comment in comments)
+    )
+    parents = Comment.objects.only('post', 'parent', 'path', 'depth').in_bulk(
+        set(parent_ids.values())
+    )
+    placed = {}
+    for comment in comments:
+        parent = None
+        if comment.source_parent is not None:
+            parent = placed.get(comment.source_parent) or parents.get(
+                parent_ids[comment.source_parent]
+            )
+            if parent is None:
+                raise InvalidRecord(f'unknown parent {comment.source_parent}')
+        try:
+            threads.place(comment, parent, comment.import_date)
+        except ValueError as error:
+            raise InvalidRecord(str(error))
+        if comment.source_id is not None:
+            placed[comment.source_id] = comment
+
+
+def write_comments(comments, batch_size):
+    posts = resolve_ids('post', (comment.source_post for comment in comments))
+    for comment in comments:
+        comment.post_id = posts[comment.source_post]
+    post_ids = set(posts.values())
+    missing = post_ids - set(
+        Post.objects.filter(pk__in=post_ids).values_list('pk', flat=True)
+    )
+    if missing:
+        raise InvalidRecord(f'unknown posts {sorted(missing)}')
+    check_new('comment', comments)
+    # Replies in the chunk and bulk_update of the dates need the ids
+    assign_pks(Comment, comments)
+    place_comments(comments)
+    insert_dated(Comment, comments, batch_size)
+    remember_ids('comment', comments)
+    counters.reconcile_posts(list(post_ids))
+    counters.reconcile_replies(
+        list({comment.parent_id for comment in comments} - {None})
+    )
+    return []
+
+
+def write_follows(follows, batch_size):
+    Follow.objects.bulk_create(follows, batch_size, ignore_conflicts=True)
+    users = {follow.user_id for follow in follows}
+    counters.reconcile_authors(
+        list(users | {follow.author_id for follow in follows})
+    )
+    return users
+
+
+WRITERS = {
+    'post': write_posts,
+    'comment': write_comments,
+    'follow': write_follows,
+}
+
+
+def announce(kind, objects):
+    """Shows the committed rows in cached pages and to waiting readers"""
+    bump_feed_version()
+    if kind == 'post':
+        changes.CHANGES.append(
+            changes.Change(post.pk, post.author_id, post.group_id)
+            for post in objects
+        )
+
+
+def import_chunk(kind, objects, batch_size, attempts=3):
+    """Writes the objects and their derived rows in one transaction
+
+    The chunk is retried when its primary keys were taken meanwhile.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            with transaction.atomic():
+                readers = list(WRITERS[kind](objects, batch_size))
+                # Feeds are rebuilt rather than patched, so a resumed
+                # chunk never leaves them half updated
+                timeline.rebuild_inboxes(readers)
+                transaction.on_commit(lambda: announce(kind, objects))
+            return
+        except IntegrityError:
+            if attempt == attempts:
+                raise InvalidRecord(
+                    f'ids were taken by other writes {attempts} times'
+                )
@@ -0,0 +1,76 @@
+"""Generation counter for cached feed fragments and pages
+
+Cached fragments and pages are keyed by the current feed version, so
+they can live for a long time: any change of posts, comments, groups or
+follows bumps the version and the old entries are never read again.
+"""
+import hashlib
+from functools import wraps
+from time import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from .thumbnails import accepted_formats
+
+
+FEED_VERSION_KEY = 'posts:feed_version'
+
+
+def get_feed_version():
+    """Returns current feed version, starting a new one if it is lost"""
+    version = cache.get(FEED_VERSION_KEY)
+    if version is None:
+        # A timestamp keeps a restarted counter above every lost value
+        cache.add(FEED_VERSION_KEY, int(time() * 1000), None)
+        version = cache.get(FEED_VERSION_KEY)
+    return version
+
+
+def bump_feed_version():
+    """Invalidates all fragments built for the previous version"""
+    try:
+        return cache.incr(FEED_VERSION_KEY)
+    except ValueError:
+        get_feed_version()
+        return cache.incr(FEED_VERSION_KEY)
+
+
+def cache_anonymous_page(view):
+    """Caches whole responses of the view for anonymous readers
+
+    Pages are keyed by URL, feed version and image formats accepted by
+    the client and carry a strong ETag of their content, so conditional
+    requests get 304 before the view runs. No Last-Modified is sent: the
+    only date known without reading the rows is the one of the last
+    change of the whole site, which dates every page at once.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (request.method not in ('GET', 'HEAD')
+                or request.user.is_authenticated):
+            return view(request, *args, **kwargs)
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        formats = ','.join(accepted_formats(request))
+        key = f'posts:page:{get_feed_version()}:{formats}:{path}'
+        page = cache.get(key)
+        if page is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            page = {
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'etag': f'"{hashlib.sha1(response.content).hexdigest()}"',
+            }
+            cache.set(key, page, settings.FEED_CACHE_TIMEOUT)
+        response = get_conditional_response(
+            request, etag=page['etag']
+        ) or HttpResponse(page['content'],
+                          content_type=page['content_type'])
+        response['ETag'] = page['etag']
+        patch_vary_headers(response, ('Cookie', 'Accept'))
+        return response
+    return wrapper
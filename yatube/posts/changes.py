@@ -0,0 +1,126 @@
+"""In-memory log of new posts for long-polling readers
+
+Readers keep the id of the newest post they have seen as a cursor and
+wait for newer posts of their feed. The log keeps the last
+``CHANGE_LOG_SIZE`` new posts of the process with their author and
+group, so a waiter is answered from memory and holds no database
+connection while idle.
+
+Posts saved by this process are appended when their transaction
+commits. Posts of other processes are noticed by the change of the
+feed version in the shared cache, then one waiter reads them from the
+database for all. Cursors older than the log are answered by a query.
+
+A waiter still holds its worker thread, so polling is offered to
+logged in readers only and needs threaded or async workers.
+"""
+import threading
+from collections import deque, namedtuple
+from time import monotonic
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max
+
+from .cache import get_feed_version
+from .models import Post
+
+
+Change = namedtuple('Change', ('pk', 'author_id', 'group_id'))
+
+# Seconds between checks of the feed version by waiters
+POLL_INTERVAL = 1
+
+
+def release_connection():
+    """Closes the connection of the thread unless a transaction needs it"""
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+class ChangeLog:
+    def __init__(self, size):
+        self.entries = deque(maxlen=size)
+        self.condition = threading.Condition()
+        self.refreshing = threading.Lock()
+        # Cursors below the start are older than the log
+        self.start = None
+        self.last_pk = None
+        self.version = None
+
+    def append(self, changes):
+        """Adds changes newer than the log and wakes the waiters"""
+        with self.condition:
+            if self.last_pk is None:
+                # Not started yet, loading will read the changes
+                return
+            for change in changes:
+                if change.pk <= self.last_pk:
+                    continue
+                if len(self.entries) == self.entries.maxlen:
+                    self.start = self.entries[0].pk
+                self.entries.append(change)
+                self.last_pk = change.pk
+            self.condition.notify_all()
+
+    def load(self):
+        """Starts the log over at the newest post in the database"""
+        last_pk = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        with self.condition:
+            self.entries.clear()
+            self.start = self.last_pk = last_pk
+            self.condition.notify_all()
+
+    def refresh(self):
+        """Reads posts of other processes if the feed has changed"""
+        version = get_feed_version()
+        if version == self.version or not self.refreshing.acquire(False):
+            return
+        try:
+            if self.last_pk is None:
+                self.load()
+            rows = list(
+                Post.objects.filter(pk__gt=self.last_pk)
+                .order_by('pk')
+                .values_list('pk', 'author_id', 'group_id')
+                [:self.entries.maxlen + 1]
+            )
+            if len(rows) > self.entries.maxlen:
+                # More posts than the log holds, older cursors are
+                # answered by queries anyway
+                self.load()
+            else:
+                self.append(Change(*row) for row in rows)
+            self.version = version
+            release_connection()
+        finally:
+            self.refreshing.release()
+
+    def since(self, cursor):
+        """Returns changes after the cursor, None if the log is younger"""
+        with self.condition:
+            if self.start is None or cursor < self.start:
+                return None
+            return [change for change in self.entries if change.pk > cursor]
+
+    def wait(self, cursor, timeout, accept):
+        """Returns changes after the cursor accepted by the function
+
+        Waits up to timeout seconds for the first accepted change.
+        Returns None if the cursor is older than the log.
+        """
+        deadline = monotonic() + timeout
+        while True:
+            self.refresh()
+            with self.condition:
+                changes = self.since(cursor)
+                if changes is None:
+                    return None
+                changes = [change for change in changes if accept(change)]
+                remaining = deadline - monotonic()
+                if changes or remaining <= 0:
+                    return changes
+                self.condition.wait(min(remaining, POLL_INTERVAL))
+
+
+CHANGES = ChangeLog(settings.CHANGE_LOG_SIZE)
@@ -0,0 +1,127 @@
+"""Denormalized counters of posts, comments and follows
+
+Counters are changed by single ``F()`` updates from signals, so
+concurrent writers never lose increments. Author counters are created
+lazily from real counts on the first read and the reconcile_counters
+command recomputes all of them in batches.
+"""
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import AuthorStats, Comment, Follow, Post
+
+
+User = get_user_model()
+
+
+def count_author_stats(user_ids):
+    """Returns real counters of the users, keyed by user id"""
+    stats = {
+        user_id: AuthorStats(user_id=user_id) for user_id in user_ids
+    }
+    counters = (
+        (Post.objects.filter(author__in=user_ids), 'author', 'posts_count'),
+        (Follow.objects.filter(author__in=user_ids), 'author',
+         'followers_count'),
+        (Follow.objects.filter(user__in=user_ids), 'user', 'following_count'),
+    )
+    for queryset, key, field in counters:
+        rows = queryset.order_by().values(key).annotate(total=Count('pk'))
+        for row in rows.values_list(key, 'total'):
+            setattr(stats[row[0]], field, row[1])
+    return stats
+
+
+def get_author_stats(user):
+    """Returns counters of the user, computing them on first access"""
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        pass
+    stats = count_author_stats([user.pk])[user.pk]
+    try:
+        with transaction.atomic():
+            stats.save(force_insert=True)
+    except IntegrityError:
+        stats = AuthorStats.objects.get(user=user)
+    user.stats = stats
+    return stats
+
+
+def change_author_stats(user_id, delta, *fields):
+    """Adds delta to the author counters which are already created"""
+    stats = AuthorStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        for field in fields:
+            stats = stats.filter(**{f'{field}__gt': 0})
+    stats.update(**{field: F(field) + delta for field in fields})
+
+
+def change_comments_count(post_id, delta):
+    """Adds delta to the post comments counter"""
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gt=0)
+    posts.update(comments_count=F('comments_count') + delta)
+
+
+def change_replies_count(comment_id, delta):
+    """Adds delta to the counter of direct replies to the comment"""
+    comments = Comment.objects.filter(pk=comment_id)
+    if delta < 0:
+        comments = comments.filter(replies_count__gt=0)
+    comments.update(replies_count=F('replies_count') + delta)
+
+
+def reconcile_authors(user_ids):
+    """Rewrites counters of the users from real counts"""
+    stats = count_author_stats(user_ids)
+    existing = set(
+        AuthorStats.objects.filter(user__in=user_ids)
+        .values_list('user', flat=True)
+    )
+    AuthorStats.objects.bulk_update(
+        [stats[user_id] for user_id in existing],
+        ['posts_count', 'followers_count', 'following_count'],
+    )
+    AuthorStats.objects.bulk_create(
+        [stats[user_id] for user_id in user_ids if user_id not in existing]
+    )
+
+
+def reconcile_posts(post_ids):
+    """Rewrites comments counters of the posts from real counts"""
+    counts = dict(
+        Comment.objects.filter(post__in=post_ids).order_by()
+        .values('post').annotate(total=Count('pk'))
+        .values_list('post', 'total')
+    )
+    posts = Post.objects.filter(pk__in=post_ids).only('comments_count')
+    changed = []
+    for post in posts:
+        total = counts.get(post.pk, 0)
+        if post.comments_count != total:
+            post.comments_count = total
+            changed.append(post)
+    Post.objects.bulk_update(changed, ['comments_count'])
+    return len(changed)
+
+
+def reconcile_replies(comment_ids):
+    """Rewrites replies counters of the comments from real counts"""
+    counts = dict(
+        Comment.objects.filter(parent__in=comment_ids).order_by()
+        .values('parent').annotate(total=Count('pk'))
+        .values_list('parent', 'total')
+    )
+    comments = Comment.objects.filter(pk__in=comment_ids).only(
+        'replies_count')
+    changed = []
+    for comment in comments:
+        total = counts.get(comment.pk, 0)
+        if comment.replies_count != total:
+            comment.replies_count = total
+            changed.append(comment)
+    Comment.objects.bulk_update(changed, ['replies_count'])
+    return len(changed)
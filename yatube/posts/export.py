@@ -0,0 +1,130 @@
+"""Streaming export of posts, comments and follows
+
+Rows are read in keyset batches over the primary key, each batch
+through ``.iterator()``, and encoded line by line, so memory does not
+grow with the table. Records use the layout read by ``import_data``
+and keep the ids of their rows, so an export can be imported back:
+imported comments find their posts and parents by those ids.
+"""
+import csv
+import json
+import zlib
+
+from .models import Comment, Follow, Post
+
+
+FORMATS = ('jsonl', 'csv')
+CONTENT_TYPES = {
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+GZIP_CONTENT_TYPE = 'application/gzip'
+GZIP_CHUNK_SIZE = 64 * 1024
+
+# Exported fields of each kind with their lookups
+EXPORTS = {
+    'post': (Post, (
+        ('id', 'pk'),
+        ('author', 'author__username'),
+        ('group', 'group__slug'),
+        ('text', 'text'),
+        ('pub_date', 'pub_date'),
+    )),
+    'comment': (Comment, (
+        ('id', 'pk'),
+        ('post', 'post'),
+        ('parent', 'parent'),
+        ('author', 'author__username'),
+        ('text', 'text'),
+        ('pub_date', 'pub_date'),
+    )),
+    'follow': (Follow, (
+        ('id', 'pk'),
+        ('user', 'user__username'),
+        ('author', 'author__username'),
+    )),
+}
+KINDS = tuple(EXPORTS)
+
+
+def columns(kind):
+    return [name for name, _ in EXPORTS[kind][1]]
+
+
+def read_rows(kind, batch_size=1000):
+    """Yields exported values of all rows of the kind in pk order"""
+    model, fields = EXPORTS[kind]
+    lookups = [lookup for _, lookup in fields]
+    last_pk = 0
+    while True:
+        batch = (
+            model.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list(*lookups)[:batch_size]
+        )
+        count = 0
+        for row in batch.iterator(chunk_size=batch_size):
+            count += 1
+            yield row
+        if count < batch_size:
+            return
+        last_pk = row[0]
+
+
+def format_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+class Echo:
+    """Pseudo file returning what is written to it"""
+    def write(self, value):
+        return value
+
+
+def encode_rows(kind, rows, data_format):
+    """Yields the rows encoded as lines of the format"""
+    names = columns(kind)
+    if data_format == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(names)
+        for row in rows:
+            yield writer.writerow([format_value(value) for value in row])
+        return
+    for row in rows:
+        record = {
+            name: format_value(value) for name, value in zip(names, row)
+        }
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def compress(lines):
+    """Yields gzip stream of the lines in chunks of GZIP_CHUNK_SIZE"""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    buffer = []
+    size = 0
+    for line in lines:
+        data = compressor.compress(line.encode())
+        if data:
+            buffer.append(data)
+            size += len(data)
+        if size >= GZIP_CHUNK_SIZE:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    buffer.append(compressor.flush())
+    yield b''.join(buffer)
+
+
+def export(kind, data_format='jsonl', gzip=False, batch_size=1000):
+    """Returns iterator over the export of the kind
+
+    Plain exports yield text lines, compressed ones yield bytes.
+    """
+    lines = encode_rows(kind, read_rows(kind, batch_size), data_format)
+    return compress(lines) if gzip else lines
+
+
+def file_name(kind, data_format, gzip=False):
+    return f'{kind}s.{data_format}' + ('.gz' if gzip else '')
@@ -0,0 +1,123 @@
+"""RSS and Atom feeds of the site, groups and authors
+
+Feeds are wrapped in ``cache_anonymous_page``, so a rendered feed is
+kept until the feed version changes and a poll with ``If-None-Match``
+is answered with 304 from the cache.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+
+from .cache import cache_anonymous_page
+from .models import Group, Post
+
+
+User = get_user_model()
+
+TITLE_LENGTH = 50
+
+
+class PostsFeed(Feed):
+    """Latest posts of the site"""
+    title = 'Yatube: последние записи'
+    description = 'Последние записи на сайте'
+
+    def link(self, obj=None):
+        return reverse('posts:index')
+
+    def get_posts(self, obj):
+        return Post.objects.all()
+
+    def items(self, obj=None):
+        return (self.get_posts(obj).with_related()
+                .order_by('-pub_date', '-pk')[:settings.FEED_ITEMS])
+
+    def item_title(self, item):
+        title = item.text.splitlines()[0] if item.text else ''
+        if len(title) > TITLE_LENGTH:
+            title = title[:TITLE_LENGTH - 1] + '…'
+        return title
+
+    def item_description(self, item):
+        return item.text
+
+    def item_link(self, item):
+        return reverse('posts:post_detail', args=[item.pk])
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+    def item_author_link(self, item):
+        return reverse('posts:profile', args=[item.author.username])
+
+    def item_categories(self, item):
+        return [item.group.title] if item.group else []
+
+
+class GroupPostsFeed(PostsFeed):
+    """Latest posts of the group"""
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, obj):
+        return f'Yatube: {obj.title}'
+
+    def description(self, obj):
+        return obj.description
+
+    def link(self, obj):
+        return reverse('posts:group_posts', args=[obj.slug])
+
+    def get_posts(self, obj):
+        return obj.posts.all()
+
+
+class AuthorPostsFeed(PostsFeed):
+    """Latest posts of the author"""
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, obj):
+        return f'Yatube: {obj.get_full_name() or obj.username}'
+
+    def description(self, obj):
+        return f'Записи пользователя {obj.username}'
+
+    def link(self, obj):
+        return reverse('posts:profile', args=[obj.username])
+
+    def get_posts(self, obj):
+        return obj.posts.all()
+
+
+class AtomMixin:
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self._get_dynamic_attr('description', obj)
+
+
+class PostsAtomFeed(AtomMixin, PostsFeed):
+    pass
+
+
+class GroupPostsAtomFeed(AtomMixin, GroupPostsFeed):
+    pass
+
+
+class AuthorPostsAtomFeed(AtomMixin, AuthorPostsFeed):
+    pass
+
+
+posts_rss = cache_anonymous_page(PostsFeed())
+posts_atom = cache_anonymous_page(PostsAtomFeed())
+group_rss = cache_anonymous_page(GroupPostsFeed())
+group_atom = cache_anonymous_page(GroupPostsAtomFeed())
+author_rss = cache_anonymous_page(AuthorPostsFeed())
+author_atom = cache_anonymous_page(AuthorPostsAtomFeed())
@@ -1,4 +1,6 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from .images import ingest_image
 from .models import Post, Comment
 
 
@@ -8,6 +10,13 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        """Re-encodes new upload within the memory and size limits"""
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            image = ingest_image(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     """Defines form of the comment"""
@@ -0,0 +1,229 @@
+"""Typo-tolerant lookups over a trigram index
+
+Words of posts, words of group titles and usernames are split into
+trigrams, like ``'  кот '`` into ``'  к'``, ``' ко'``, ``'кот'`` and
+``'от '``. Each trigram has a posting list of terms, so a misspelled
+word is matched by reading the postings of its own few trigrams only:
+the cost depends on the query, not on the number of posts. Terms are
+ranked by the Jaccard similarity of their trigram sets.
+
+Post words are reference counted and updated by Post signals from the
+difference of the old and the new text, group titles and usernames are
+replaced when their objects are saved.
+"""
+import math
+import re
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db.models import F, Max
+
+from .models import FuzzyTerm, FuzzyTrigram, Group, Post
+
+
+User = get_user_model()
+
+SIMILARITY_THRESHOLD = 0.3
+MAX_WORD_LENGTH = 40
+WORD = re.compile(r'[^\W\d_]{3,}')
+
+
+def normalize(value):
+    return value.lower().replace('ё', 'е')
+
+
+def words(text):
+    """Returns distinct normalized words of the text worth indexing"""
+    return {
+        word for word in WORD.findall(normalize(text))
+        if len(word) <= MAX_WORD_LENGTH
+    }
+
+
+def trigrams(value):
+    """Returns trigrams of the value padded at word boundaries"""
+    padded = f'  {value} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similar_terms(value, kind, limit=10, threshold=SIMILARITY_THRESHOLD):
+    """Returns terms of the kind similar to the value, most similar first
+
+    Terms get ``similarity`` annotation.
+    """
+    grams = sorted(trigrams(normalize(value)))
+    # Jaccard similarity can not reach the threshold if the terms share
+    # too few trigrams or their trigram counts differ too much
+    least_shared = math.ceil(len(grams) * threshold)
+    shortest = least_shared
+    longest = int(len(grams) / threshold)
+    # Postings are counted first, so only the terms sharing trigrams
+    # with the value are read, however many terms there are
+    return list(FuzzyTerm.objects.raw(
+        'SELECT * FROM ('
+        '  SELECT term.*, CAST(shared AS REAL)'
+        '    / (%s + term.trigrams_count - shared) AS similarity'
+        '  FROM ('
+        '    SELECT term_id, COUNT(*) AS shared'
+        f'    FROM {FuzzyTrigram._meta.db_table}'
+        f'    WHERE trigram IN ({", ".join(["%s"] * len(grams))})'
+        '    GROUP BY term_id HAVING COUNT(*) >= %s'
+        '  ) AS postings'
+        f'  JOIN {FuzzyTerm._meta.db_table} AS term'
+        '    ON term.id = postings.term_id'
+        '  WHERE term.kind = %s AND term.trigrams_count BETWEEN %s AND %s'
+        ') WHERE similarity >= %s '
+        'ORDER BY similarity DESC, value LIMIT %s',
+        [len(grams)] + grams + [least_shared, kind, shortest, longest,
+                                threshold, limit],
+    ))
+
+
+def similar_words(word, limit=3):
+    """Returns words of posts spelled like the word, but not the word"""
+    word = normalize(word)
+    return [
+        term.value for term in similar_terms(word, FuzzyTerm.WORD, limit + 1)
+        if term.value != word
+    ][:limit]
+
+
+def similar_objects(query, kind, model, limit=5):
+    """Returns objects with titles or names similar to the query"""
+    values = words(query) if kind == FuzzyTerm.GROUP else {query.strip()}
+    scores = Counter()
+    for value in filter(None, values):
+        for term in similar_terms(value, kind, limit):
+            scores[term.object_id] = max(scores[term.object_id],
+                                         term.similarity)
+    objects = model.objects.in_bulk([pk for pk, _ in scores.most_common()])
+    return [
+        objects[pk] for pk, _ in scores.most_common(limit) if pk in objects
+    ]
+
+
+def add_terms(kind, object_id, values, refs=1):
+    """Adds references to the terms, indexing the new ones"""
+    if not values:
+        return
+    terms = FuzzyTerm.objects.filter(
+        kind=kind, object_id=object_id, value__in=values
+    )
+    missing = set(values) - set(terms.values_list('value', flat=True))
+    FuzzyTerm.objects.bulk_create(
+        (FuzzyTerm(kind=kind, object_id=object_id, value=value,
+                   trigrams_count=len(trigrams(value)))
+         for value in missing),
+        ignore_conflicts=True,
+    )
+    terms.update(refs=F('refs') + refs)
+    if missing:
+        created = terms.filter(value__in=missing).values_list('pk', 'value')
+        FuzzyTrigram.objects.bulk_create(
+            (FuzzyTrigram(term_id=pk, trigram=trigram)
+             for pk, value in created for trigram in trigrams(value)),
+            ignore_conflicts=True,
+        )
+
+
+def remove_terms(kind, object_id, values):
+    """Removes a reference from the terms, dropping the unused ones"""
+    if not values:
+        return
+    terms = FuzzyTerm.objects.filter(
+        kind=kind, object_id=object_id, value__in=values
+    )
+    terms.filter(refs__gt=0).update(refs=F('refs') - 1)
+    unused = list(terms.filter(refs=0).values_list('pk', flat=True))
+    if unused:
+        FuzzyTrigram.objects.filter(term__in=unused).delete()
+        FuzzyTerm.objects.filter(pk__in=unused, refs=0).delete()
+
+
+def update_post_words(old_text, new_text):
+    """Moves references from words of the old text to the new one"""
+    old, new = words(old_text), words(new_text)
+    add_terms(FuzzyTerm.WORD, 0, new - old)
+    remove_terms(FuzzyTerm.WORD, 0, old - new)
+
+
+def add_post_words(texts):
+    """Adds references to words of the new posts"""
+    counts = Counter()
+    for text in texts:
+        counts.update(words(text))
+    by_refs = {}
+    for value, refs in counts.items():
+        by_refs.setdefault(refs, set()).add(value)
+    for refs, values in by_refs.items():
+        add_terms(FuzzyTerm.WORD, 0, values, refs)
+
+
+def object_terms(kind, value):
+    if kind == FuzzyTerm.GROUP:
+        return words(value)
+    return {normalize(value)}
+
+
+def index_object(kind, object_id, value):
+    """Replaces terms of the group or user"""
+    unindex_object(kind, object_id)
+    add_terms(kind, object_id, object_terms(kind, value))
+
+
+def unindex_object(kind, object_id):
+    """Drops terms of the group or user"""
+    FuzzyTrigram.objects.filter(
+        term__kind=kind, term__object_id=object_id
+    ).delete()
+    FuzzyTerm.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def rebuild_index(batch_size=2000):
+    """Indexes all posts, groups and users again
+
+    Posts are read in keyset batches and only their word counts are
+    kept in memory. Returns number of indexed terms.
+    """
+    FuzzyTrigram.objects.all().delete()
+    FuzzyTerm.objects.all().delete()
+    counts = Counter()
+    last_pk = 0
+    while True:
+        batch = list(
+            Post.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', 'text')[:batch_size]
+        )
+        if not batch:
+            break
+        for _, text in batch:
+            counts.update(words(text))
+        last_pk = batch[-1][0]
+    terms = [(FuzzyTerm.WORD, 0, value, refs)
+             for value, refs in counts.items()]
+    for pk, title in Group.objects.values_list('pk', 'title').iterator():
+        terms += [(FuzzyTerm.GROUP, pk, value, 1)
+                  for value in object_terms(FuzzyTerm.GROUP, title)]
+    for pk, username in User.objects.values_list(
+            'pk', 'username').iterator():
+        terms += [(FuzzyTerm.USER, pk, value, 1)
+                  for value in object_terms(FuzzyTerm.USER, username)]
+    for start in range(0, len(terms), batch_size):
+        bulk_index(terms[start:start + batch_size])
+    return len(terms)
+
+
+def bulk_index(terms):
+    """Writes new terms given as (kind, object_id, value, refs)"""
+    next_pk = (FuzzyTerm.objects.aggregate(Max('pk'))['pk__max'] or 0) + 1
+    objects = [
+        FuzzyTerm(pk=pk, kind=kind, object_id=object_id, value=value,
+                  refs=refs, trigrams_count=len(trigrams(value)))
+        for pk, (kind, object_id, value, refs)
+        in enumerate(terms, start=next_pk)
+    ]
+    FuzzyTerm.objects.bulk_create(objects)
+    FuzzyTrigram.objects.bulk_create(
+        FuzzyTrigram(term_id=term.pk, trigram=trigram)
+        for term in objects for trigram in trigrams(term.value)
+    )
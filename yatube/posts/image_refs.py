@@ -0,0 +1,67 @@
+"""Reference counts of content-addressed post images
+
+Posts sharing an image share its file, so the file and its thumbnails
+are deleted only when the last post referencing it is deleted or gets
+another image. Counts are changed by single ``F()`` updates from
+signals, files are deleted once the transaction is committed. Only
+the names given by the content-addressed storage are counted, files
+stored before it or set by hand are never deleted.
+
+A file is deleted in the transaction which deletes its count, so a new
+reference waits for it and then restores the file from its upload.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import F
+from sorl.thumbnail import delete
+from sorl.thumbnail.images import ImageFile
+
+from .models import Post, StoredImage
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_storage():
+    return Post._meta.get_field('image').storage
+
+
+def is_counted(name):
+    """Tells if references to the image are counted"""
+    return get_storage().is_hashed_name(name)
+
+
+def retain_image(name):
+    """Adds a post reference to the image"""
+    if not is_counted(name):
+        return
+    StoredImage.objects.bulk_create(
+        [StoredImage(name=name)], ignore_conflicts=True
+    )
+    StoredImage.objects.filter(name=name).update(refs=F('refs') + 1)
+    # The file may have been deleted since the upload found it
+    transaction.on_commit(lambda: get_storage().restore(name))
+
+
+def release_image(name):
+    """Removes a post reference from the image"""
+    if not is_counted(name):
+        return
+    StoredImage.objects.filter(name=name, refs__gt=0).update(
+        refs=F('refs') - 1
+    )
+    transaction.on_commit(lambda: delete_unreferenced(name))
+
+
+def delete_unreferenced(name):
+    """Deletes the image file and thumbnails if no post refers to it"""
+    with transaction.atomic():
+        deleted, _ = StoredImage.objects.filter(name=name, refs=0).delete()
+        if not deleted:
+            return False
+        try:
+            delete(ImageFile(name, get_storage()))
+        except Exception:
+            logger.exception('Deleting image %s failed', name)
+    return True
@@ -0,0 +1,117 @@
+"""Memory-bounded ingestion of uploaded post images
+
+The image size is probed from the header before any pixel is decoded,
+so decompression bombs are rejected for the price of a few kilobytes.
+Accepted images are decoded in draft mode, which lets the JPEG decoder
+scale them down by DCT instead of allocating the full bitmap, and the
+bitmap to decode is bounded by IMAGE_MAX_DECODED_PIXELS. Images are
+then capped to IMAGE_MAX_SIDE and re-encoded without EXIF and other
+metadata, so thumbnails later decode small files only.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+
+# Formats kept on re-encoding, the others become JPEG
+SAVE_FORMATS = {
+    'JPEG': 'JPEG',
+    'MPO': 'JPEG',
+    'PNG': 'PNG',
+    'GIF': 'GIF',
+    'WEBP': 'WEBP',
+}
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+ORIENTATION = 0x0112
+
+
+def probe_image(file):
+    """Returns format and size of the image read from its header"""
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            return image.format, image.size
+    except (Image.DecompressionBombError, OSError, ValueError):
+        raise ValidationError(
+            'Загрузите правильное изображение.', code='invalid_image'
+        )
+
+
+def check_image_size(size, limit):
+    """Rejects images with more pixels than the limit"""
+    width, height = size
+    if width * height > limit:
+        raise ValidationError(
+            'Изображение слишком большое: %(width)s×%(height)s.',
+            code='image_too_large',
+            params={'width': width, 'height': height},
+        )
+
+
+def fit_size(size, max_side):
+    """Returns the size scaled down to fit max_side"""
+    width, height = size
+    ratio = min(1, max_side / max(width, height))
+    return max(1, round(width * ratio)), max(1, round(height * ratio))
+
+
+def ingest_image(upload):
+    """Returns the upload re-encoded within IMAGE_MAX_SIDE
+
+    Animated images within the limits are kept as they are, re-encoding
+    would drop all frames but the first one.
+    """
+    image_format, size = probe_image(upload)
+    check_image_size(size, settings.IMAGE_MAX_PIXELS)
+    max_side = settings.IMAGE_MAX_SIDE
+    upload.seek(0)
+    try:
+        with Image.open(upload) as image:
+            if (getattr(image, 'is_animated', False)
+                    and max(size) <= max_side):
+                upload.seek(0)
+                return upload
+            image.draft(image.mode, fit_size(size, max_side))
+            # Only JPEG is scaled by draft, others are decoded in full
+            check_image_size(image.size, settings.IMAGE_MAX_DECODED_PIXELS)
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+            if image.getexif().get(ORIENTATION, 1) != 1:
+                image = ImageOps.exif_transpose(image)
+            content, save_format = encode_image(image, image_format)
+    except (Image.DecompressionBombError, OSError, ValueError):
+        raise ValidationError(
+            'Загрузите правильное изображение.', code='invalid_image'
+        )
+    return SimpleUploadedFile(
+        image_name(upload.name, save_format), content,
+        content_type=Image.MIME[save_format],
+    )
+
+
+def encode_image(image, image_format):
+    """Returns image bytes without metadata and their format"""
+    save_format = SAVE_FORMATS.get(image_format, 'JPEG')
+    if save_format not in Image.SAVE:
+        save_format = 'JPEG'
+    options = {}
+    if image.info.get('icc_profile'):
+        options['icc_profile'] = image.info['icc_profile']
+    if save_format == 'JPEG':
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        options.update(quality=85, optimize=True)
+    output = BytesIO()
+    image.save(output, save_format, **options)
+    return output.getvalue(), save_format
+
+
+def image_name(name, save_format):
+    """Replaces extension of the name if it does not fit the format"""
+    root, extension = os.path.splitext(os.path.basename(name))
+    if Image.registered_extensions().get(extension.lower()) == save_format:
+        return f'{root}{extension}'
+    return f'{root}{EXTENSIONS[save_format]}'
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import tags
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Extracts hashtags and mentions of existing posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of posts indexed in one transaction',
+        )
+
+    def handle(self, *args, **options):
+        # Posts are read in keyset batches, so only one batch is kept
+        # in memory however many posts there are
+        batch_size = options['batch_size']
+        last_pk = 0
+        indexed = 0
+        while True:
+            rows = list(
+                Post.objects.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', 'text', 'pub_date')[:batch_size]
+            )
+            if not rows:
+                break
+            with transaction.atomic():
+                tags.index_posts(rows)
+            last_pk = rows[-1][0]
+            indexed += len(rows)
+            self.stdout.write(f'{indexed} posts indexed')
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {indexed} posts indexed'
+        ))
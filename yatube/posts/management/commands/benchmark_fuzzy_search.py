@@ -0,0 +1,101 @@
+import random
+from statistics import quantiles
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import fuzzy, search
+from posts.models import FuzzyTerm, Post
+
+
+User = get_user_model()
+
+# Consonant and vowel pairs make words with trigrams spread about as
+# widely as in Russian texts
+SYLLABLES = [consonant + vowel
+             for consonant in 'бвгджзклмнпрстфхцчшщ'
+             for vowel in 'аеиоуыэюя']
+
+
+class Command(BaseCommand):
+    help = ('Times typo-tolerant lookups over generated posts, '
+            'the posts are rolled back afterwards')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--words', type=int, default=50000,
+                            help='Size of the generated vocabulary')
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def vocabulary(self, size):
+        words = set()
+        while len(words) < size:
+            words.add(''.join(
+                self.random.choices(SYLLABLES, k=self.random.randint(2, 4))
+            ))
+        return sorted(words)
+
+    def misspell(self, word):
+        """Drops, doubles or swaps a letter of the word"""
+        i = self.random.randrange(1, len(word) - 1)
+        return self.random.choice((
+            word[:i] + word[i + 1:],
+            word[:i] + word[i] + word[i:],
+            word[:i - 1] + word[i] + word[i - 1] + word[i + 1:],
+        ))
+
+    def generate(self, words, posts, batch_size):
+        author = User.objects.create(username='benchmark_fuzzy_author')
+        started = perf_counter()
+        for start in range(0, posts, batch_size):
+            Post.objects.bulk_create(
+                Post(author=author, text=' '.join(
+                    self.random.choices(words, k=12)))
+                for _ in range(min(batch_size, posts - start))
+            )
+        search.rebuild_index()
+        terms = fuzzy.rebuild_index()
+        self.stdout.write(
+            f'{posts} posts, {terms} terms indexed '
+            f'in {perf_counter() - started:.1f}s'
+        )
+
+    def timings(self, queries, lookup):
+        times = []
+        for query in queries:
+            started = perf_counter()
+            lookup(query)
+            times.append((perf_counter() - started) * 1000)
+        return quantiles(times, n=20)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        words = self.vocabulary(options['words'])
+        with transaction.atomic():
+            self.generate(words, options['posts'], options['batch_size'])
+            sample = self.random.sample(words, options['queries'])
+            queries = [self.misspell(word) for word in sample]
+            found = sum(
+                word in fuzzy.similar_words(query)
+                for word, query in zip(sample, queries)
+            )
+            self.stdout.write(
+                f'Misspelled words corrected: {found}/{len(queries)}'
+            )
+            lookups = {
+                'similar_words': fuzzy.similar_words,
+                'similar_terms': lambda query: list(fuzzy.similar_terms(
+                    query, FuzzyTerm.WORD)),
+                'search_page': lambda query: list(search.SearchPaginator(
+                    query, 10, expand=fuzzy.similar_words).page(None)),
+            }
+            for name, lookup in lookups.items():
+                cuts = self.timings(queries, lookup)
+                self.stdout.write(
+                    f'{name}: p50 {cuts[9]:.1f}ms, p95 {cuts[18]:.1f}ms'
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,47 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from posts.models import Comment, Follow, Group, Post
+
+
+class Command(BaseCommand):
+    help = 'Shows query plans and timings of the main access paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Number of runs used to time each query',
+        )
+
+    def access_paths(self):
+        """Returns querysets built like the ones used by views"""
+        ids = Post.objects.aggregate(
+            author=Max('author'), group=Max('group'), post=Max('pk')
+        )
+        follow = Follow.objects.values('user', 'author').first() or {
+            'user': ids['author'], 'author': ids['author']
+        }
+        group = Group.objects.filter(pk=ids['group']).first()
+        feed = Post.objects.with_related().order_by('-pub_date', '-pk')
+        return {
+            'index': feed[:11],
+            'group_posts': feed.filter(group=group)[:11],
+            'profile': feed.filter(author=ids['author'])[:11],
+            'post_comments': Comment.objects.with_related().filter(
+                post=ids['post'])[:5],
+            'follow_lookup': Follow.objects.filter(
+                user=follow['user'], author=follow['author']),
+        }
+
+    def handle(self, *args, **options):
+        for name, queryset in self.access_paths().items():
+            started = perf_counter()
+            for _ in range(options['repeat']):
+                list(queryset.all())
+            elapsed = (perf_counter() - started) / options['repeat']
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{name}: {elapsed * 1000:.2f} ms'
+            ))
+            self.stdout.write(queryset.explain())
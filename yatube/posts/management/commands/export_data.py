@@ -0,0 +1,47 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts import export
+
+
+class Command(BaseCommand):
+    help = 'Exports posts, comments or follows as JSONL or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=export.KINDS)
+        parser.add_argument(
+            '--format', choices=export.FORMATS, default='jsonl',
+        )
+        parser.add_argument(
+            '--gzip', action='store_true', help='Compress the output',
+        )
+        parser.add_argument(
+            '--output', '-o', help='Output file, stdout by default',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows read by one query',
+        )
+
+    def handle(self, *args, **options):
+        chunks = export.export(
+            options['kind'], options['format'], options['gzip'],
+            options['batch_size'],
+        )
+        path = options['output']
+        if path:
+            if options['gzip']:
+                file = open(path, 'wb')
+            else:
+                file = open(path, 'w', encoding='utf-8', newline='')
+            with file:
+                for chunk in chunks:
+                    file.write(chunk)
+            return
+        if options['gzip']:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            return
+        for chunk in chunks:
+            self.stdout.write(chunk, ending='')
@@ -0,0 +1,39 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.models import Post
+from posts.thumbnails import make_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Generates missing thumbnails of post images on all cores'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Number of worker processes',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=50,
+            help='Number of posts sent to a worker at once',
+        )
+
+    def handle(self, *args, **options):
+        post_ids = list(
+            Post.objects.exclude(image='').order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        if options['workers'] > 1:
+            # Forked workers must open their own connections
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers']) as pool:
+                done = sum(pool.map(make_thumbnails, post_ids,
+                                    chunksize=options['chunk_size']))
+        else:
+            done = sum(map(make_thumbnails, post_ids))
+        self.stdout.write(self.style.SUCCESS(
+            f'Thumbnails of {done} images are ready'
+        ))
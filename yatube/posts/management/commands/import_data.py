@@ -0,0 +1,106 @@
+import json
+import os
+import sys
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import bulk_import
+
+
+class Command(BaseCommand):
+    help = 'Imports posts, comments or follows from JSONL or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=bulk_import.KINDS)
+        parser.add_argument('path', help='Input file, - for stdin')
+        parser.add_argument(
+            '--format', choices=bulk_import.FORMATS,
+            help='Input format, guessed by the file extension by default',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of rows inserted by one query',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help='Number of records imported in one transaction',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='File keeping the progress to resume an interrupted run',
+        )
+
+    def read_checkpoint(self, path, source):
+        if not path or not os.path.exists(path):
+            return 0
+        with open(path) as file:
+            checkpoint = json.load(file)
+        if checkpoint['source'] != source:
+            raise CommandError(
+                f'Checkpoint {path} belongs to {checkpoint["source"]}'
+            )
+        return checkpoint['records']
+
+    def write_checkpoint(self, path, source, records):
+        if not path:
+            return
+        temp_path = f'{path}.part'
+        with open(temp_path, 'w') as file:
+            json.dump({'source': source, 'records': records}, file)
+        os.replace(temp_path, path)
+
+    def handle(self, *args, **options):
+        kind, path = options['kind'], options['path']
+        data_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'jsonl'
+        )
+        source = f'{kind}:{path}'
+        checkpoint = options['checkpoint']
+        done = self.read_checkpoint(checkpoint, source)
+        if done:
+            self.stdout.write(f'Resuming after {done} records')
+        file = sys.stdin if path == '-' else open(path, newline='')
+        try:
+            imported = self.import_records(
+                kind, bulk_import.read_records(file, data_format), done,
+                options, checkpoint, source,
+            )
+        finally:
+            if file is not sys.stdin:
+                file.close()
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {imported} records imported'
+        ))
+
+    def import_records(self, kind, records, done, options, checkpoint,
+                       source):
+        build = bulk_import.BUILDERS[kind]
+        lookups = bulk_import.Lookups()
+        records = islice(records, done, None)
+        committed = done
+        while True:
+            objects = []
+            try:
+                for record in islice(records, options['chunk_size']):
+                    objects.append(build(record, lookups))
+            except bulk_import.InvalidRecord as error:
+                raise CommandError(
+                    f'Record {committed + len(objects) + 1}: {error}. '
+                    f'{committed} records are committed'
+                )
+            if not objects:
+                return committed - done
+            try:
+                bulk_import.import_chunk(kind, objects,
+                                         options['batch_size'])
+            except bulk_import.InvalidRecord as error:
+                raise CommandError(
+                    f'Records {committed + 1}-{committed + len(objects)}: '
+                    f'{error}. {committed} records are committed'
+                )
+            committed += len(objects)
+            self.write_checkpoint(checkpoint, source, committed)
+            self.stdout.write(f'{committed} records imported')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import fuzzy
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the trigram index of words, groups and usernames'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            indexed = fuzzy.rebuild_index(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {indexed} terms indexed'
+        ))
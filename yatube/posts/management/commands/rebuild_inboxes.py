@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from posts import timeline
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds materialized follow feeds from subscriptions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Rebuild feeds of these users only',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of users rebuilt in one transaction',
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(
+            Q(follower__isnull=False) | Q(feed_entries__isnull=False)
+        ).distinct()
+        if options['usernames']:
+            users = User.objects.filter(username__in=options['usernames'])
+        user_ids = list(users.order_by('pk').values_list('pk', flat=True))
+        batch_size = options['batch_size']
+        written = 0
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            with transaction.atomic():
+                written += timeline.rebuild_inboxes(batch)
+            self.stdout.write(
+                f'{start + len(batch)}/{len(user_ids)} users rebuilt'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {written} feed entries written'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text index of posts'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            indexed = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {indexed} posts indexed'
+        ))
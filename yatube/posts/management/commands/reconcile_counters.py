@@ -0,0 +1,54 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters
+from posts.models import Comment, Post
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Recomputes denormalized post, comment and follow counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of rows recomputed in one transaction',
+        )
+
+    def batches(self, queryset, batch_size):
+        """Yields primary keys of the queryset in keyset batches"""
+        last_pk = 0
+        while True:
+            batch = list(
+                queryset.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch:
+                return
+            yield batch
+            last_pk = batch[-1]
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        users = 0
+        for batch in self.batches(User.objects.all(), batch_size):
+            with transaction.atomic():
+                counters.reconcile_authors(batch)
+            users += len(batch)
+        self.stdout.write(f'{users} authors recomputed')
+        posts = changed = 0
+        for batch in self.batches(Post.objects.all(), batch_size):
+            with transaction.atomic():
+                changed += counters.reconcile_posts(batch)
+            posts += len(batch)
+        self.stdout.write(f'{posts} posts recomputed, {changed} fixed')
+        comments = changed = 0
+        for batch in self.batches(Comment.objects.all(), batch_size):
+            with transaction.atomic():
+                changed += counters.reconcile_replies(batch)
+            comments += len(batch)
+        self.stdout.write(f'{comments} comments recomputed, {changed} fixed')
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -0,0 +1,47 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:22
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def delete_duplicate_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    keep = (
+        Follow.objects.values('user', 'author')
+        .annotate(first_id=Min('id'))
+        .values_list('first_id', flat=True)
+    )
+    Follow.objects.exclude(id__in=list(keep)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_feedentry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-pub_date'], name='comment_post_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-pub_date', '-id'], name='post_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='post_author_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date', '-id'], name='post_group_date_idx'),
+        ),
+        migrations.RunPython(
+            delete_duplicate_follows, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
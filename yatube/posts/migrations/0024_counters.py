@@ -0,0 +1,47 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_comments(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    comments = (
+        Comment.objects.filter(post=OuterRef('pk')).order_by()
+        .values('post').annotate(total=Count('pk')).values('total')
+    )
+    Post.objects.update(comments_count=Coalesce(Subquery(comments), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0023_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Количество постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Количество подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Количество подписок')),
+            ],
+            options={
+                'verbose_name': 'Счетчики автора',
+                'verbose_name_plural': 'Счетчики авторов',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.RunPython(count_comments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:44
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0025_post_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredImage',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Файл')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='Количество ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['image'], name='post_image_idx'),
+        ),
+    ]
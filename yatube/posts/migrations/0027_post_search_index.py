@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE posts_post_fts USING fts5('
+        "text, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        'INSERT INTO posts_post_fts (rowid, text) '
+        'SELECT id, text FROM posts_post'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    schema_editor.execute('DROP TABLE posts_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0026_stored_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
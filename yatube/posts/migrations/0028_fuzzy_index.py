@@ -0,0 +1,49 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0027_post_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FuzzyTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('word', 'Слово постов'), ('group', 'Название группы'), ('user', 'Имя пользователя')], max_length=5, verbose_name='Вид')),
+                ('object_id', models.PositiveIntegerField(default=0, verbose_name='Объект')),
+                ('value', models.CharField(max_length=150, verbose_name='Значение')),
+                ('trigrams_count', models.PositiveSmallIntegerField(verbose_name='Количество триграмм')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='Количество ссылок')),
+            ],
+            options={
+                'verbose_name': 'Терм нечеткого поиска',
+                'verbose_name_plural': 'Термы нечеткого поиска',
+            },
+        ),
+        migrations.CreateModel(
+            name='FuzzyTrigram',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3, verbose_name='Триграмма')),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='posts.FuzzyTerm', verbose_name='Терм')),
+            ],
+            options={
+                'verbose_name': 'Триграмма',
+                'verbose_name_plural': 'Триграммы',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='fuzzyterm',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id', 'value'), name='unique_fuzzy_term'),
+        ),
+        migrations.AddConstraint(
+            model_name='fuzzytrigram',
+            constraint=models.UniqueConstraint(fields=('trigram', 'term'), name='unique_fuzzy_trigram'),
+        ),
+    ]
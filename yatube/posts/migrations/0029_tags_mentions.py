@@ -0,0 +1,69 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0028_fuzzy_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Название')),
+            ],
+            options={
+                'verbose_name': 'Хэштег',
+                'verbose_name_plural': 'Хэштеги',
+            },
+        ),
+        migrations.CreateModel(
+            name='PostTag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_entries', to='posts.Post', verbose_name='Пост')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='posts.Tag', verbose_name='Хэштег')),
+            ],
+            options={
+                'verbose_name': 'Хэштег поста',
+                'verbose_name_plural': 'Хэштеги постов',
+            },
+        ),
+        migrations.CreateModel(
+            name='Mention',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mention_entries', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Упоминание',
+                'verbose_name_plural': 'Упоминания',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='posttag',
+            index=models.Index(fields=['tag', '-pub_date', '-post'], name='post_tag_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='posttag',
+            constraint=models.UniqueConstraint(fields=('tag', 'post'), name='unique_post_tag'),
+        ),
+        migrations.AddIndex(
+            model_name='mention',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='mention_user_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='mention',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_mention'),
+        ),
+    ]
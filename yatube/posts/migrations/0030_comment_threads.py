@@ -0,0 +1,79 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:25
+
+from datetime import datetime, timedelta, timezone
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Frozen copy of posts.threads, the migration must not follow its changes
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+TIME_WIDTH = 11
+SALT_WIDTH = 4
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def encode(number, width):
+    digits = []
+    for _ in range(width):
+        number, digit = divmod(number, len(DIGITS))
+        digits.append(DIGITS[digit])
+    return ''.join(reversed(digits))
+
+
+def root_path(comment):
+    """Returns the path of the comment as a thread of its own"""
+    time = (comment.pub_date - EPOCH) // timedelta(microseconds=1)
+    return (encode(len(DIGITS) ** TIME_WIDTH - 1 - time, TIME_WIDTH)
+            + encode(comment.pk % len(DIGITS) ** SALT_WIDTH, SALT_WIDTH))
+
+
+def set_root_paths(apps, schema_editor):
+    """Makes every existing comment a thread of its own"""
+    Comment = apps.get_model('posts', 'Comment')
+    last_pk = 0
+    while True:
+        comments = list(
+            Comment.objects.filter(pk__gt=last_pk).order_by('pk')
+            .only('pk', 'pub_date')[:1000]
+        )
+        if not comments:
+            break
+        for comment in comments:
+            comment.path = root_path(comment)
+        Comment.objects.bulk_update(comments, ['path'])
+        last_pk = comments[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0029_tags_mentions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Уровень вложенности'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment', verbose_name='Ответ на'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=240, verbose_name='Путь в ветке'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='replies_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество ответов'),
+        ),
+        migrations.RunPython(set_root_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0030_comment_threads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedRecord',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20, verbose_name='Тип записи')),
+                ('source_id', models.BigIntegerField(verbose_name='Id в источнике')),
+                ('row_id', models.BigIntegerField(verbose_name='Id строки')),
+            ],
+            options={
+                'verbose_name': 'Импортированная запись',
+                'verbose_name_plural': 'Импортированные записи',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='importedrecord',
+            constraint=models.UniqueConstraint(fields=('kind', 'source_id'), name='unique_imported_record'),
+        ),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from core.models import CreateModel
+from core.storage import ContentAddressedStorage
+from . import threads
 
 
 User = get_user_model()
@@ -19,6 +22,26 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    """Posts queries shared by the feeds"""
+    def with_related(self):
+        """Fetches author and group rows shown on each post card"""
+        return self.select_related('author', 'group')
+
+
+class CommentQuerySet(models.QuerySet):
+    """Comments queries shared by the post pages"""
+    def with_related(self):
+        """Fetches author rows shown on each comment"""
+        return self.select_related('author')
+
+    def replies_to(self, comment):
+        """Returns all replies below the comment in thread order"""
+        start, end = threads.subtree_range(comment.path)
+        return self.filter(post_id=comment.post_id, path__gt=start,
+                           path__lt=end).order_by('path')
+
+
 class Post(CreateModel):
     """Describes table which contains posts"""
     text = models.TextField(verbose_name='Текст поста',
@@ -32,17 +55,56 @@ class Post(CreateModel):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
 
+    comments_count = models.PositiveIntegerField(
+        default=0, editable=False,
+        verbose_name='Количество комментариев'
+    )
+    thumbnails = models.TextField(
+        blank=True, default='', editable=False,
+        verbose_name='Манифест миниатюр'
+    )
+
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_date_idx'),
+            models.Index(fields=['image'], name='post_image_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.text[:15]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remembers loaded image to count references when it changes"""
+        instance = super().from_db(db, field_names, values)
+        if 'image' in field_names:
+            instance._loaded_image = values[field_names.index('image')]
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Leaves counters and thumbnails manifest to their own updates"""
+        if not self._state.adding and 'update_fields' not in kwargs:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in ('comments_count', 'thumbnails')
+            ]
+        super().save(*args, **kwargs)
+
 
 class Comment(CreateModel):
     """Describes comment to the post"""
@@ -60,11 +122,55 @@ class Comment(CreateModel):
         verbose_name='Текст комментария',
         help_text='Напишите комментарий'
     )
+    parent = models.ForeignKey(
+        'self', on_delete=models.CASCADE,
+        blank=True, null=True,
+        related_name='replies',
+        verbose_name='Ответ на'
+    )
+    # Paths of the ancestors and of the comment, see posts.threads
+    path = models.CharField(
+        max_length=threads.PATH_LENGTH, blank=True, editable=False,
+        verbose_name='Путь в ветке'
+    )
+    depth = models.PositiveSmallIntegerField(
+        default=0, editable=False,
+        verbose_name='Уровень вложенности'
+    )
+    replies_count = models.PositiveIntegerField(
+        default=0, editable=False,
+        verbose_name='Количество ответов'
+    )
+
+    objects = CommentQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(fields=['post', '-pub_date'],
+                         name='comment_post_date_idx'),
+            models.Index(fields=['post', 'path'],
+                         name='comment_post_path_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Dates a new comment and places it in its thread before the insert
+
+        Raises ValueError when the parent is a comment of another post.
+        """
+        if not self.path:
+            self.pub_date = timezone.now()
+            parent = self.parent if self.parent_id is not None else None
+            threads.place(self, parent, self.pub_date)
+        super().save(*args, **kwargs)
+
+    def _do_insert(self, manager, using, fields, update_pk, raw):
+        # A raw insert skips auto_now_add, which would stamp another date
+        # than the one the path is made of
+        raw = raw or self.pub_date is not None
+        return super()._do_insert(manager, using, fields, update_pk, raw)
 
     def __str__(self) -> str:
         return self.text[:10]
@@ -86,6 +192,228 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow'),
+        ]
 
     def __str__(self) -> str:
         return f'Пдописчик: {self.user}, автор подписки {self.author}'
+
+
+class AuthorStats(models.Model):
+    """Describes denormalized counters of the user"""
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0, verbose_name='Количество постов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name='Количество подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0, verbose_name='Количество подписок'
+    )
+
+    class Meta:
+        verbose_name = 'Счетчики автора'
+        verbose_name_plural = 'Счетчики авторов'
+
+    def __str__(self) -> str:
+        return f'Счетчики {self.user}'
+
+
+class FeedEntry(models.Model):
+    """Describes materialized entry of the follow feed"""
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_feed_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='feed_entry_user_date_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'Лента {self.user}: {self.post}'
+
+
+class ImportedRecord(models.Model):
+    """Describes row written for a bulk imported record with an id"""
+    kind = models.CharField(max_length=20, verbose_name='Тип записи')
+    source_id = models.BigIntegerField(verbose_name='Id в источнике')
+    row_id = models.BigIntegerField(verbose_name='Id строки')
+
+    class Meta:
+        verbose_name = 'Импортированная запись'
+        verbose_name_plural = 'Импортированные записи'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'source_id'],
+                                    name='unique_imported_record'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.kind} {self.source_id}: {self.row_id}'
+
+
+class StoredImage(models.Model):
+    """Describes references of posts to a content-addressed image"""
+    name = models.CharField(max_length=255, primary_key=True,
+                            verbose_name='Файл')
+    refs = models.PositiveIntegerField(default=0,
+                                       verbose_name='Количество ссылок')
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self) -> str:
+        return f'{self.name}: {self.refs}'
+
+
+class FuzzyTerm(models.Model):
+    """Describes a term of the trigram index"""
+    WORD = 'word'
+    GROUP = 'group'
+    USER = 'user'
+    KINDS = (
+        (WORD, 'Слово постов'),
+        (GROUP, 'Название группы'),
+        (USER, 'Имя пользователя'),
+    )
+    kind = models.CharField(max_length=5, choices=KINDS,
+                            verbose_name='Вид')
+    # Words of posts are shared by all posts and have no object
+    object_id = models.PositiveIntegerField(default=0,
+                                            verbose_name='Объект')
+    value = models.CharField(max_length=150, verbose_name='Значение')
+    trigrams_count = models.PositiveSmallIntegerField(
+        verbose_name='Количество триграмм'
+    )
+    refs = models.PositiveIntegerField(default=0,
+                                       verbose_name='Количество ссылок')
+
+    class Meta:
+        verbose_name = 'Терм нечеткого поиска'
+        verbose_name_plural = 'Термы нечеткого поиска'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id', 'value'],
+                                    name='unique_fuzzy_term'),
+        ]
+
+    def __str__(self) -> str:
+        return self.value
+
+
+class FuzzyTrigram(models.Model):
+    """Describes posting of a term in the trigram index"""
+    trigram = models.CharField(max_length=3, verbose_name='Триграмма')
+    term = models.ForeignKey(
+        FuzzyTerm, on_delete=models.CASCADE,
+        related_name='trigrams',
+        verbose_name='Терм'
+    )
+
+    class Meta:
+        verbose_name = 'Триграмма'
+        verbose_name_plural = 'Триграммы'
+        constraints = [
+            models.UniqueConstraint(fields=['trigram', 'term'],
+                                    name='unique_fuzzy_trigram'),
+        ]
+
+    def __str__(self) -> str:
+        return self.trigram
+
+
+class Tag(models.Model):
+    """Describes hashtag used in posts"""
+    name = models.CharField(max_length=100, unique=True,
+                            verbose_name='Название')
+
+    class Meta:
+        verbose_name = 'Хэштег'
+        verbose_name_plural = 'Хэштеги'
+
+    def __str__(self) -> str:
+        return f'#{self.name}'
+
+
+class PostTag(models.Model):
+    """Describes entry of the tag page"""
+    tag = models.ForeignKey(
+        Tag, on_delete=models.CASCADE,
+        related_name='entries',
+        verbose_name='Хэштег'
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE,
+        related_name='tag_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Хэштег поста'
+        verbose_name_plural = 'Хэштеги постов'
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'post'],
+                                    name='unique_post_tag'),
+        ]
+        indexes = [
+            models.Index(fields=['tag', '-pub_date', '-post'],
+                         name='post_tag_date_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.tag}: {self.post}'
+
+
+class Mention(models.Model):
+    """Describes mention of the user in a post"""
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='mentions',
+        verbose_name='Пользователь'
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE,
+        related_name='mention_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Упоминание'
+        verbose_name_plural = 'Упоминания'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_mention'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='mention_user_date_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'@{self.user}: {self.post}'
@@ -0,0 +1,129 @@
+import base64
+import json
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(Exception):
+    """Raised when a cursor token can not be decoded"""
+
+
+def encode_cursor(values, backwards=False):
+    """Packs seek key values into an opaque url-safe token"""
+    payload = [value.isoformat() if hasattr(value, 'isoformat') else value
+               for value in values]
+    payload.append('p' if backwards else 'n')
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, types=(parse_datetime, int)):
+    """Unpacks a token made by encode_cursor
+
+    Values of the seek key are converted by the callables of types.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        *values, direction = json.loads(raw.decode())
+        if len(values) != len(types):
+            raise ValueError(token)
+        key = tuple(convert(value) for convert, value in zip(types, values))
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise InvalidCursor(token)
+    if None in key or direction not in ('n', 'p'):
+        raise InvalidCursor(token)
+    return key, direction == 'p'
+
+
+class CursorPaginator(Paginator):
+    """Seeks on ``(pub_date, pk)`` instead of COUNT(*) and OFFSET
+
+    Pages are addressed by opaque cursors, so new rows at the top
+    of the feed never shift the pages a reader is walking through.
+    Built pages are plain ``Page`` objects with ``next_cursor`` and
+    ``previous_cursor`` attributes, their number and ``num_pages`` are
+    derived from the neighbours of the page instead of a row count.
+    """
+    keyset = True
+    key_types = (parse_datetime, int)
+
+    def __init__(self, object_list, per_page, keys=('pub_date', 'pk')):
+        date_key, pk_key = keys
+        object_list = object_list.order_by(f'-{date_key}', f'-{pk_key}')
+        super().__init__(object_list, per_page)
+        self.keys = keys
+
+    def get_page(self, cursor):
+        """Returns page for the cursor, the first one if it is invalid"""
+        key, backwards = None, False
+        if cursor:
+            try:
+                key, backwards = decode_cursor(cursor, self.key_types)
+            except InvalidCursor:
+                pass
+        return self.page(key, backwards)
+
+    def fetch(self, key, backwards, limit):
+        """Returns up to limit rows after the key in the page order
+
+        Backwards rows are returned in the reversed order.
+        """
+        date_key, pk_key = self.keys
+        queryset = self.object_list
+        if backwards:
+            queryset = queryset.filter(
+                Q(**{f'{date_key}__gt': key[0]})
+                | Q(**{date_key: key[0], f'{pk_key}__gt': key[1]})
+            ).order_by(date_key, pk_key)
+        elif key is not None:
+            queryset = queryset.filter(
+                Q(**{f'{date_key}__lt': key[0]})
+                | Q(**{date_key: key[0], f'{pk_key}__lt': key[1]})
+            )
+        return list(queryset[:limit])
+
+    def page(self, key=None, backwards=False):
+        rows = self.fetch(key, backwards, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            if not rows:
+                return self.page()
+            rows.reverse()
+        has_next = True if backwards else has_more
+        has_previous = has_more if backwards else key is not None
+        has_previous = has_previous and bool(rows)
+        page = Page(rows, 2 if has_previous else 1, self)
+        page.next_cursor = self._cursor(rows[-1]) if has_next else None
+        page.previous_cursor = (self._cursor(rows[0], backwards=True)
+                                if has_previous else None)
+        self.num_pages = page.number + has_next
+        return page
+
+    def _cursor(self, row, backwards=False):
+        return encode_cursor(
+            [getattr(row, key) for key in self.keys], backwards
+        )
+
+
+class PathPaginator(CursorPaginator):
+    """Seeks on the materialized ``path`` of comment threads
+
+    Rows come depth first in thread order, so every page is one range
+    scan of the path index.
+    """
+    key_types = (str,)
+
+    def __init__(self, object_list, per_page):
+        Paginator.__init__(self, object_list.order_by('path'), per_page)
+        self.keys = ('path',)
+
+    def fetch(self, key, backwards, limit):
+        queryset = self.object_list
+        if backwards:
+            queryset = queryset.filter(path__lt=key[0]).order_by('-path')
+        elif key is not None:
+            queryset = queryset.filter(path__gt=key[0])
+        return list(queryset[:limit])
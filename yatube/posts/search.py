@@ -0,0 +1,185 @@
+"""Full-text search over posts
+
+Post texts are mirrored into the ``posts_post_fts`` FTS5 table, which
+is kept in sync by Post signals, so searches read an inverted index
+instead of scanning posts with LIKE. Results are ranked by bm25, carry
+highlighted snippets and are paginated by cursors over ``(rank, pk)``.
+Ranks depend on the whole index, so a page opened by cursor may shift
+a little when posts are added in between.
+"""
+import re
+
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .paginator import CursorPaginator
+
+
+INDEX_TABLE = 'posts_post_fts'
+MAX_TERMS = 10
+SNIPPET_TOKENS = 24
+# Control characters can not be typed in a post, so they safely mark
+# the matches until the snippet is escaped
+MATCH_START, MATCH_END = '\x02', '\x03'
+
+TERM = re.compile(r'\w+')
+
+
+def match_expression(query, expand=None):
+    """Returns FTS5 query matching all words, the last one as a prefix
+
+    ``expand`` returns words to be matched instead of a word, like its
+    correct spellings.
+    """
+    terms = TERM.findall(query)[:MAX_TERMS]
+    groups = []
+    for position, term in enumerate(terms, start=1):
+        variants = [f'"{term}"']
+        if position == len(terms):
+            variants[0] += '*'
+        if expand is not None:
+            variants += [f'"{variant}"' for variant in expand(term)]
+        groups.append(
+            variants[0] if len(variants) == 1
+            else f'({" OR ".join(variants)})'
+        )
+    return ' '.join(groups)
+
+
+def index_post(post_id, text):
+    """Puts the post text into the index"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s', [post_id]
+        )
+        cursor.execute(
+            f'INSERT INTO {INDEX_TABLE} (rowid, text) VALUES (%s, %s)',
+            [post_id, text],
+        )
+
+
+def index_new_posts(rows):
+    """Puts texts of the new posts given as ``(pk, text)`` into the index"""
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {INDEX_TABLE} (rowid, text) VALUES (%s, %s)',
+            list(rows),
+        )
+
+
+def indexed_text(post_id):
+    """Returns the post text as it was indexed, empty if it was not"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT text FROM {INDEX_TABLE} WHERE rowid = %s', [post_id]
+        )
+        row = cursor.fetchone()
+    return row[0] if row else ''
+
+
+def unindex_post(post_id):
+    """Removes the post from the index"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s', [post_id]
+        )
+
+
+def rebuild_index():
+    """Indexes all posts again, returns number of indexed posts"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {INDEX_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {INDEX_TABLE} (rowid, text) '
+            f'SELECT id, text FROM {Post._meta.db_table}'
+        )
+        return cursor.rowcount
+
+
+def filter_posts(queryset, query):
+    """Narrows the queryset to posts matching the query"""
+    match = match_expression(query)
+    if not match:
+        return queryset.none()
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s',
+        [match],
+    ))
+
+
+def highlight(snippet):
+    """Escapes the snippet and wraps its matches in <mark>"""
+    return mark_safe(
+        escape(snippet)
+        .replace(MATCH_START, '<mark>')
+        .replace(MATCH_END, '</mark>')
+    )
+
+
+class SearchPaginator(CursorPaginator):
+    """Seeks on ``(rank, pk)`` of the index matches, best first
+
+    Built pages hold posts with ``search_rank`` and highlighted
+    ``snippet`` attributes.
+    """
+    key_types = (float, int)
+
+    def __init__(self, query, per_page, expand=None):
+        # Rows are ordered by the index, not by the queryset
+        Paginator.__init__(self, Post.objects.with_related(), per_page)
+        self.keys = ('search_rank', 'pk')
+        self.match = match_expression(query, expand)
+
+    def fetch(self, key, backwards, limit):
+        if not self.match:
+            return []
+        # Worse ranks are greater, equal ranks show newer posts first
+        if backwards:
+            seek = 'WHERE score < %s OR (score = %s AND id > %s) '
+            order = 'ORDER BY score DESC, id'
+        else:
+            seek = 'WHERE score > %s OR (score = %s AND id < %s) '
+            order = 'ORDER BY score, id DESC'
+        params = [self.match]
+        if key is not None:
+            params += [key[0], key[0], key[1]]
+        else:
+            seek = ''
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT id, score FROM ('
+                f'SELECT rowid AS id, rank AS score FROM {INDEX_TABLE} '
+                f'WHERE {INDEX_TABLE} MATCH %s'
+                f') {seek}{order} LIMIT %s',
+                params + [limit],
+            )
+            matches = cursor.fetchall()
+        if not matches:
+            return []
+        ids = [pk for pk, _ in matches]
+        snippets = self.snippets(ids)
+        posts = self.object_list.in_bulk(ids)
+        rows = []
+        for pk, score in matches:
+            post = posts.get(pk)
+            if post is not None:
+                post.search_rank = score
+                post.snippet = highlight(snippets.get(pk, post.text))
+                rows.append(post)
+        return rows
+
+    def snippets(self, ids):
+        """Returns snippets of the posts, made only for the page"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, snippet({INDEX_TABLE}, 0, %s, %s, %s, %s) '
+                f'FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s '
+                f'AND rowid IN ({", ".join(["%s"] * len(ids))})',
+                [MATCH_START, MATCH_END, '…', SNIPPET_TOKENS, self.match]
+                + ids,
+            )
+            return dict(cursor.fetchall())
@@ -0,0 +1,168 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import changes, counters, fuzzy, image_refs, search, tags, timeline
+from .cache import bump_feed_version
+from .models import Comment, Follow, FuzzyTerm, Group, Post
+
+
+User = get_user_model()
+
+# Fields of users shown on the feed pages
+AUTHOR_NAME_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    """Delivers new post to the follow feeds"""
+    if created:
+        timeline.fan_out_post(instance)
+        counters.change_author_stats(instance.author_id, 1, 'posts_count')
+
+
+@receiver(post_save, sender=Post)
+def log_new_post(sender, instance, created, **kwargs):
+    """Wakes readers waiting for new posts once the post is committed"""
+    if created:
+        change = changes.Change(instance.pk, instance.author_id,
+                                instance.group_id)
+        transaction.on_commit(lambda: changes.CHANGES.append([change]))
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_author_stats(instance.author_id, -1, 'posts_count')
+
+
+@receiver(post_save, sender=Post)
+def move_image_reference(sender, instance, created, update_fields,
+                         **kwargs):
+    """Moves reference of the post to its new image"""
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if not created and not hasattr(instance, '_loaded_image'):
+        # The image was deferred, so it was not saved either
+        return
+    old = getattr(instance, '_loaded_image', '')
+    new = instance.image.name or ''
+    if old != new:
+        if new:
+            image_refs.retain_image(new)
+        if old:
+            image_refs.release_image(old)
+    instance._loaded_image = new
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        image_refs.release_image(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, created, update_fields, **kwargs):
+    """Keeps the search indexes in sync with the post text"""
+    if update_fields is None or 'text' in update_fields:
+        old_text = '' if created else search.indexed_text(instance.pk)
+        search.index_post(instance.pk, instance.text)
+        fuzzy.update_post_words(old_text, instance.text)
+
+
+@receiver(post_save, sender=Post)
+def index_post_tags(sender, instance, update_fields, **kwargs):
+    """Keeps hashtags and mentions in sync with the post text"""
+    if update_fields is None or 'text' in update_fields:
+        tags.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
+    fuzzy.update_post_words(instance.text, '')
+
+
+@receiver(post_save, sender=Group)
+def index_saved_group(sender, instance, **kwargs):
+    fuzzy.index_object(FuzzyTerm.GROUP, instance.pk, instance.title)
+
+
+@receiver(post_delete, sender=Group)
+def unindex_deleted_group(sender, instance, **kwargs):
+    fuzzy.unindex_object(FuzzyTerm.GROUP, instance.pk)
+
+
+@receiver(post_save, sender=User)
+def index_saved_user(sender, instance, update_fields, **kwargs):
+    """Keeps the username in the fuzzy index"""
+    if update_fields is None or 'username' in update_fields:
+        fuzzy.index_object(FuzzyTerm.USER, instance.pk, instance.username)
+
+
+@receiver(post_delete, sender=User)
+def unindex_deleted_user(sender, instance, **kwargs):
+    fuzzy.unindex_object(FuzzyTerm.USER, instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comments_count(instance.post_id, 1)
+        if instance.parent_id is not None:
+            counters.change_replies_count(instance.parent_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_comments_count(instance.post_id, -1)
+    if instance.parent_id is not None:
+        counters.change_replies_count(instance.parent_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_follow_feed(sender, instance, created, **kwargs):
+    """Fills the follow feed with posts of the new author"""
+    if created:
+        timeline.backfill_inbox(instance.user_id, instance.author_id)
+        with transaction.atomic():
+            counters.change_author_stats(
+                instance.author_id, 1, 'followers_count')
+            counters.change_author_stats(
+                instance.user_id, 1, 'following_count')
+
+
+@receiver(post_delete, sender=Follow)
+def trim_follow_feed(sender, instance, **kwargs):
+    """Drops posts of the unfollowed author from the follow feed"""
+    timeline.drop_author(instance.user_id, instance.author_id)
+    with transaction.atomic():
+        counters.change_author_stats(
+            instance.author_id, -1, 'followers_count')
+        counters.change_author_stats(
+            instance.user_id, -1, 'following_count')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_feed_cache(sender, **kwargs):
+    """Moves cached feed fragments and pages to the new version
+
+    The version moves again once the change is committed, as a request
+    may have cached the old rows under the new version meanwhile.
+    """
+    bump_feed_version()
+    transaction.on_commit(bump_feed_version)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_names(sender, update_fields=None, **kwargs):
+    """Shows new names of the authors on cached pages"""
+    if update_fields is None or AUTHOR_NAME_FIELDS & set(update_fields):
+        invalidate_feed_cache(sender)
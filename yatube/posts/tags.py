@@ -0,0 +1,99 @@
+"""Hashtags and mentions of posts
+
+``#tags`` and ``@username`` mentions are parsed out of the post text
+when it is saved and kept in ``PostTag`` and ``Mention`` rows carrying
+the post date, so a tag page or the mentions of a user are read as
+one indexed range, like the follow feed, instead of a LIKE scan.
+"""
+import re
+
+from django.contrib.auth import get_user_model
+from django.db.models import F
+
+from .models import Mention, Post, PostTag, Tag
+
+
+User = get_user_model()
+
+TAG_KEYS = ('tag_date', 'tag_post')
+MENTION_KEYS = ('mention_date', 'mention_post')
+
+HASHTAG = re.compile(r'(?<![\w#&])#(\w{1,100})')
+# Usernames may contain dots, so the one ending a sentence is tried
+# both ways when mentions are resolved
+MENTION = re.compile(r'(?<![\w@])@([\w.@+-]{1,150})')
+
+
+def extract_tags(text):
+    """Returns names of the hashtags in the text"""
+    return {name.lower() for name in HASHTAG.findall(text)}
+
+
+def extract_mentions(text):
+    """Returns usernames which may be mentioned in the text"""
+    usernames = set()
+    for username in MENTION.findall(text):
+        usernames.add(username)
+        usernames.add(username.rstrip('.'))
+    usernames.discard('')
+    return usernames
+
+
+def index_posts(rows):
+    """Replaces tags and mentions of the posts
+
+    Rows are ``(pk, text, pub_date)`` tuples of the posts.
+    """
+    rows = list(rows)
+    post_tags = {pk: extract_tags(text) for pk, text, _ in rows}
+    post_mentions = {pk: extract_mentions(text) for pk, text, _ in rows}
+    names = set().union(*post_tags.values())
+    Tag.objects.bulk_create(
+        (Tag(name=name) for name in names), ignore_conflicts=True
+    )
+    tag_ids = dict(
+        Tag.objects.filter(name__in=names).values_list('name', 'pk')
+    )
+    user_ids = dict(
+        User.objects.filter(
+            username__in=set().union(*post_mentions.values())
+        ).values_list('username', 'pk')
+    )
+    post_ids = [pk for pk, _, _ in rows]
+    PostTag.objects.filter(post_id__in=post_ids).delete()
+    Mention.objects.filter(post_id__in=post_ids).delete()
+    PostTag.objects.bulk_create(
+        PostTag(tag_id=tag_ids[name], post_id=pk, pub_date=pub_date)
+        for pk, _, pub_date in rows for name in post_tags[pk]
+    )
+    Mention.objects.bulk_create(
+        Mention(user_id=user_id, post_id=pk, pub_date=pub_date)
+        for pk, _, pub_date in rows
+        for user_id in {user_ids[username]
+                        for username in post_mentions[pk]
+                        if username in user_ids}
+    )
+
+
+def index_post(post):
+    index_posts([(post.pk, post.text, post.pub_date)])
+
+
+def tagged_posts(tag):
+    """Returns posts with the tag annotated with TAG_KEYS"""
+    return Post.objects.with_related().filter(
+        tag_entries__tag=tag
+    ).annotate(
+        tag_date=F('tag_entries__pub_date'),
+        tag_post=F('tag_entries__post'),
+    )
+
+
+def mentioning_posts(user):
+    """Returns posts mentioning the user annotated with MENTION_KEYS"""
+    return Post.objects.with_related().filter(
+        mention_entries__user=user
+    ).annotate(
+        mention_date=F('mention_entries__pub_date'),
+        mention_post=F('mention_entries__post'),
+    )
@@ -0,0 +1,8 @@
+from jobs.queue import task
+
+from . import thumbnails
+
+
+@task('posts.make_thumbnails')
+def make_thumbnails(post_id):
+    thumbnails.make_thumbnails(post_id)
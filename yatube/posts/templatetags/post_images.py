@@ -0,0 +1,13 @@
+from django import template
+
+from .. import thumbnails
+
+
+register = template.Library()
+
+
+@register.inclusion_tag('includes/post_picture.html', takes_context=True)
+def post_picture(context, post):
+    """Renders variants of the post image the client accepts"""
+    formats = thumbnails.accepted_formats(context.get('request'))
+    return {'picture': thumbnails.post_picture(post, formats)}
@@ -0,0 +1,24 @@
+from django import template
+from django.urls import reverse
+from django.utils.html import conditional_escape, format_html
+from django.utils.safestring import mark_safe
+
+from ..tags import HASHTAG
+
+
+register = template.Library()
+
+
+@register.filter(needs_autoescape=True)
+def link_tags(text, autoescape=True):
+    """Turns hashtags of the escaped text into links to their pages"""
+    if autoescape:
+        text = conditional_escape(text)
+
+    def link(match):
+        return format_html(
+            '<a href="{}">{}</a>',
+            reverse('posts:tag_posts', args=[match.group(1).lower()]),
+            mark_safe(match.group(0)),
+        )
+    return mark_safe(HASHTAG.sub(link, text))
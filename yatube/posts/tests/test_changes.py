@@ -0,0 +1,162 @@
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from threading import Timer
+from time import monotonic
+from unittest import mock
+from .. import changes
+from ..changes import Change, ChangeLog
+from ..models import Follow, Group, Post
+
+
+User = get_user_model()
+
+
+class ChangeLogTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+
+    def setUp(self):
+        cache.clear()
+        self.log = ChangeLog(3)
+        self.last = Post.objects.create(text='Any', author=self.user)
+
+    def test_log_starts_at_newest_post(self):
+        self.assertEqual(self.log.wait(self.last.pk, 0, bool), [])
+        self.assertIsNone(self.log.wait(self.last.pk - 1, 0, bool))
+
+    def test_idle_wait_makes_no_queries(self):
+        """Once loaded the log is read from memory"""
+        self.log.wait(self.last.pk, 0, bool)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.log.wait(self.last.pk, 0.05, bool), [])
+
+    def test_posts_of_other_processes_are_read(self):
+        """A new feed version makes the log read new posts"""
+        self.log.wait(self.last.pk, 0, bool)
+        post = Post.objects.create(text='Any', author=self.user)
+        self.assertEqual(
+            self.log.wait(self.last.pk, 0, bool),
+            [Change(post.pk, self.user.pk, None)],
+        )
+
+    def test_old_changes_are_dropped(self):
+        self.log.wait(self.last.pk, 0, bool)
+        start = self.last.pk
+        self.log.append(Change(start + number, 1, None)
+                        for number in range(1, 5))
+        self.assertIsNone(self.log.since(start))
+        self.assertEqual([change.pk for change in self.log.since(start + 1)],
+                         [start + 2, start + 3, start + 4])
+
+    def test_append_wakes_waiter(self):
+        self.log.wait(self.last.pk, 0, bool)
+        change = Change(self.last.pk + 1, 1, None)
+        Timer(0.1, self.log.append, [[change]]).start()
+        started = monotonic()
+        self.assertEqual(self.log.wait(self.last.pk, 5, bool), [change])
+        self.assertLess(monotonic() - started, 1)
+
+    def test_wait_skips_changes_not_accepted(self):
+        self.log.wait(self.last.pk, 0, bool)
+        self.log.append([Change(self.last.pk + 1, 1, 7),
+                         Change(self.last.pk + 2, 1, 8)])
+        self.assertEqual(
+            self.log.wait(self.last.pk, 0,
+                          lambda change: change.group_id == 8),
+            [Change(self.last.pk + 2, 1, 8)],
+        )
+
+
+class NewPostsViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.other = User.objects.create_user(username='Other')
+        cls.group = Group.objects.create(title='Group', slug='test-slug')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.first = Post.objects.create(text='Any', author=cls.other)
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(changes, 'CHANGES', ChangeLog(100))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        # Start the log before the new posts
+        self.get('posts:index_new_posts')
+        self.posts = [
+            Post.objects.create(text='Any', author=self.user,
+                                group=self.group),
+            Post.objects.create(text='Any', author=self.other),
+        ]
+
+    def get(self, name, client=None, **kwargs):
+        return (client or self.reader_client).get(
+            reverse(name, kwargs=kwargs),
+            {'since': self.first.pk, 'wait': 0},
+        )
+
+    def test_feeds_count_their_new_posts(self):
+        first, second = self.posts
+        feeds = {
+            'posts:index_new_posts': {},
+            'posts:group_new_posts': {'slug': 'test-slug'},
+            'posts:follow_new_posts': {},
+        }
+        expected = {
+            'posts:index_new_posts': [second.pk, first.pk],
+            'posts:group_new_posts': [first.pk],
+            'posts:follow_new_posts': [first.pk],
+        }
+        for name, kwargs in feeds.items():
+            with self.subTest(name=name):
+                data = self.get(name, self.reader_client, **kwargs).json()
+                self.assertEqual(data['ids'], expected[name])
+                self.assertEqual(data['count'], len(expected[name]))
+                self.assertEqual(data['cursor'], expected[name][0])
+
+    def test_cursor_older_than_log_is_queried(self):
+        with mock.patch.object(changes, 'CHANGES', ChangeLog(100)):
+            data = self.get('posts:group_new_posts', slug='test-slug')
+        self.assertEqual(data.json()['ids'], [self.posts[0].pk])
+
+    def test_nothing_new(self):
+        response = self.reader_client.get(
+            reverse('posts:index_new_posts'),
+            {'since': self.posts[1].pk, 'wait': 0},
+        )
+        self.assertEqual(response.json(),
+                         {'count': 0, 'ids': [], 'cursor': self.posts[1].pk})
+
+    def test_bad_requests(self):
+        response = self.reader_client.get(reverse('posts:index_new_posts'),
+                                          {'since': 'x'})
+        self.assertEqual(response.status_code, 400)
+        response = self.get('posts:group_new_posts', slug='missing')
+        self.assertEqual(response.status_code, 404)
+
+    def test_guests_do_not_poll(self):
+        """Long polls hold a worker thread, so guests are not offered them"""
+        feeds = {
+            'posts:index_new_posts': {},
+            'posts:group_new_posts': {'slug': 'test-slug'},
+            'posts:follow_new_posts': {},
+        }
+        for name, kwargs in feeds.items():
+            with self.subTest(name=name):
+                response = self.get(name, Client(), **kwargs)
+                self.assertEqual(response.status_code, 401)
+        response = Client().get(reverse('posts:index'))
+        self.assertNotContains(response, 'new_posts.js')
+
+    def test_index_page_links_endpoint(self):
+        response = self.reader_client.get(reverse('posts:index'))
+        self.assertContains(response, f'data-since="{self.posts[1].pk}"')
+        self.assertContains(response, reverse('posts:index_new_posts'))
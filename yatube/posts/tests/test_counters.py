@@ -0,0 +1,85 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from io import StringIO
+from ..counters import get_author_stats
+from ..models import AuthorStats, Comment, Follow, Post
+
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.reader = User.objects.create_user(username='Reader')
+
+    def setUp(self):
+        self.user.refresh_from_db()
+        self.reader.refresh_from_db()
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_stats_are_counted_on_first_read(self):
+        """Missing counters are computed from real rows"""
+        Post.objects.bulk_create(
+            Post(text='Any', author=self.user) for _ in range(3)
+        )
+        self.assertEqual(get_author_stats(self.user).posts_count, 3)
+
+    def test_counters_follow_creates_and_deletes(self):
+        """Counters change with posts, comments and follows"""
+        get_author_stats(self.user)
+        get_author_stats(self.reader)
+        post = Post.objects.create(text='Any', author=self.user)
+        Comment.objects.create(post=post, author=self.reader, text='Any')
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        self.assertEqual(self.stats(self.user).posts_count, 1)
+        self.assertEqual(self.stats(self.user).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        follow.delete()
+        post.comments.all().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.user).posts_count, 0)
+        self.assertEqual(self.stats(self.user).followers_count, 0)
+
+    def test_post_save_keeps_comments_count(self):
+        """Saving stale post does not overwrite its counter"""
+        post = Post.objects.create(text='Any', author=self.user)
+        Comment.objects.create(post=post, author=self.reader, text='Any')
+        post.text = 'Changed'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_reconcile_command(self):
+        """Command fixes counters drifted by bulk writes"""
+        get_author_stats(self.user)
+        post = Post.objects.create(text='Any', author=self.user)
+        Post.objects.bulk_create([Post(text='Any', author=self.user)])
+        root = Comment.objects.create(post=post, author=self.user,
+                                      text='Any')
+        Comment.objects.bulk_create(
+            [Comment(post=post, parent=root, author=self.reader,
+                     text='Any')]
+        )
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.user)]
+        )
+        out = StringIO()
+        call_command('reconcile_counters', batch_size=1, stdout=out)
+        post.refresh_from_db()
+        root.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+        self.assertEqual(root.replies_count, 1)
+        self.assertIn('2 comments recomputed, 1 fixed', out.getvalue())
+        self.assertEqual(self.stats(self.user).posts_count, 2)
+        self.assertEqual(self.stats(self.user).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
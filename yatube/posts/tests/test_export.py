@@ -0,0 +1,127 @@
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from io import StringIO
+from ..export import read_rows
+from ..models import Comment, Follow, Group, Post
+import csv
+import gzip
+import json
+import os
+import tempfile
+
+
+User = get_user_model()
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.staff = User.objects.create_user(username='staff',
+                                             is_staff=True)
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Тест')
+        cls.posts = [
+            Post.objects.create(text=f'Пост, "{i}"', author=cls.author,
+                                group=cls.group if i % 2 else None)
+            for i in range(5)
+        ]
+        Comment.objects.create(post=cls.posts[0], author=cls.staff,
+                               text='Комментарий')
+        Follow.objects.create(user=cls.staff, author=cls.author)
+
+    def setUp(self):
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_rows_are_read_in_keyset_batches(self):
+        """Each batch is one query seeking past the last primary key"""
+        with self.assertNumQueries(3):
+            rows = list(read_rows('post', batch_size=2))
+        self.assertEqual([row[0] for row in rows],
+                         [post.pk for post in self.posts])
+
+    def test_jsonl_endpoint(self):
+        """Staff streams posts as JSON lines"""
+        response = self.staff_client.get(
+            reverse('posts:export_data', args=['post']))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'],
+                         'application/x-ndjson; charset=utf-8')
+        self.assertIn('posts.jsonl', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(records[1]['text'], 'Пост, "1"')
+        self.assertEqual(records[1]['group'], 'group')
+        self.assertEqual(records[0]['group'], '')
+        self.assertEqual(records[0]['author'], 'author')
+
+    def test_gzip_csv_endpoint(self):
+        """CSV export is compressed on request"""
+        response = self.staff_client.get(
+            reverse('posts:export_data', args=['comment']),
+            {'format': 'csv', 'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        content = gzip.decompress(b''.join(response.streaming_content))
+        rows = list(csv.DictReader(content.decode().splitlines()))
+        self.assertEqual(rows[0]['text'], 'Комментарий')
+        self.assertEqual(rows[0]['author'], 'staff')
+        self.assertEqual(rows[0]['post'], str(self.posts[0].pk))
+        self.assertEqual(rows[0]['parent'], '')
+
+    def test_endpoint_is_staff_only(self):
+        """Non-staff users are sent to the login page"""
+        response = self.author_client.get(
+            reverse('posts:export_data', args=['follow']))
+        self.assertEqual(response.status_code, 302)
+        response = self.staff_client.get(
+            reverse('posts:export_data', args=['user']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_export_command_round_trip(self):
+        """Exported posts are imported back"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'posts.jsonl.gz')
+            call_command('export_data', 'post', gzip=True, output=path)
+            with gzip.open(path, 'rt') as file:
+                content = file.read()
+            Post.objects.all().delete()
+            path = os.path.join(directory, 'posts.jsonl')
+            with open(path, 'w') as file:
+                file.write(content)
+            call_command('import_data', 'post', path, stdout=StringIO())
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', 'group', 'author')),
+            sorted((post.text, post.group_id, post.author_id)
+                   for post in self.posts))
+        out = StringIO()
+        call_command('export_data', 'follow', format='csv', stdout=out)
+        self.assertEqual(out.getvalue().splitlines()[1].split(',')[1:],
+                         ['staff', 'author'])
+
+    def test_threads_round_trip(self):
+        """Comments and replies are imported under copies of their posts"""
+        root = Comment.objects.get()
+        reply = Comment.objects.create(post=self.posts[0], parent=root,
+                                       author=self.author, text='Ответ')
+        with tempfile.TemporaryDirectory() as directory:
+            for kind in ('post', 'comment'):
+                path = os.path.join(directory, f'{kind}s.jsonl')
+                call_command('export_data', kind, output=path)
+                call_command('import_data', kind, path, stdout=StringIO())
+        post = Post.objects.exclude(
+            pk__in=[post.pk for post in self.posts]
+        ).get(text=self.posts[0].text)
+        root_copy = post.comments.get(text=root.text)
+        reply_copy = post.comments.get(text=reply.text)
+        self.assertIsNone(root_copy.parent)
+        self.assertEqual((reply_copy.parent, reply_copy.depth),
+                         (root_copy, 1))
+        self.assertEqual((root_copy.pub_date, reply_copy.pub_date),
+                         (root.pub_date, reply.pub_date))
+        self.assertEqual(Comment.objects.count(), 4)
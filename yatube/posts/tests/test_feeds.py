@@ -0,0 +1,68 @@
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from ..models import Group, Post
+
+
+User = get_user_model()
+
+
+class FeedsTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание группы')
+        cls.post = Post.objects.create(
+            text='Первая строка\nвторая', author=cls.author, group=cls.group)
+        Post.objects.create(text='Чужой пост', author=cls.other)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_site_feeds(self):
+        """Site feeds list latest posts in RSS and Atom"""
+        response = self.guest_client.get(reverse('posts:posts_rss'))
+        self.assertEqual(response['Content-Type'],
+                         'application/rss+xml; charset=utf-8')
+        self.assertContains(response, '<title>Первая строка</title>')
+        self.assertContains(response, 'Чужой пост')
+        self.assertContains(
+            response, reverse('posts:post_detail', args=[self.post.pk]))
+        response = self.guest_client.get(reverse('posts:posts_atom'))
+        self.assertEqual(response['Content-Type'],
+                         'application/atom+xml; charset=utf-8')
+        self.assertContains(response, '<name>Лев Толстой</name>')
+
+    def test_group_and_author_feeds(self):
+        """Group and author feeds have their own posts only"""
+        for name, args in (('group_rss', ['group']),
+                           ('group_atom', ['group']),
+                           ('author_rss', ['author']),
+                           ('author_atom', ['author'])):
+            with self.subTest(name=name):
+                response = self.guest_client.get(
+                    reverse(f'posts:{name}', args=args))
+                self.assertContains(response, 'Первая строка')
+                self.assertNotContains(response, 'Чужой пост')
+        response = self.guest_client.get(
+            reverse('posts:group_rss', args=['missing']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_conditional_get(self):
+        """Polls of unchanged feed get 304 until a post changes"""
+        url = reverse('posts:group_atom', args=['group'])
+        etag = self.guest_client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(text='Новый пост', author=self.author,
+                            group=self.group)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Новый пост')
@@ -70,8 +70,9 @@ class PostCreateEditTests(TestCase):
 
         self.assertEqual(Post.objects.count(), post_count + 1)
 
-        self.assertTrue(Post.objects.filter(
-            text='Test text', image='posts/image.gif').exists()
+        self.assertRegex(
+            Post.objects.get(text='Test text').image.name,
+            r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.gif$'
         )
 
     def test_edit_post(self):
@@ -0,0 +1,91 @@
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from io import StringIO
+from .. import fuzzy
+from ..models import FuzzyTerm, Group, Post
+from ..search import match_expression
+
+
+User = get_user_model()
+
+
+def indexed_words():
+    return dict(FuzzyTerm.objects.filter(kind=FuzzyTerm.WORD)
+                .values_list('value', 'refs'))
+
+
+class FuzzyIndexTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='leo_tolstoy')
+        cls.group = Group.objects.create(
+            title='Наши бегемоты', slug='hippo', description='Тест')
+        cls.post = Post.objects.create(
+            text='Жили-были бегемоты в Ёлкино', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_trigrams(self):
+        """Words are padded so their starts weigh more"""
+        self.assertEqual(fuzzy.trigrams('кот'),
+                         {'  к', ' ко', 'кот', 'от '})
+        self.assertEqual(fuzzy.words('Ёлки, 42 ёлки и кот_2'),
+                         {'елки', 'кот'})
+
+    def test_misspelled_word_is_corrected(self):
+        """Similar words are found and ranked by similarity"""
+        self.assertEqual(fuzzy.similar_words('бигемоты'), ['бегемоты'])
+        self.assertEqual(fuzzy.similar_words('бегемоты'), [])
+        self.assertEqual(fuzzy.similar_words('жираф'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Words are reference counted across posts"""
+        other = Post.objects.create(text='Бегемоты спят', author=self.user)
+        self.assertEqual(indexed_words()['бегемоты'], 2)
+        other.text = 'Жирафы спят'
+        other.save()
+        words = indexed_words()
+        self.assertEqual(words['бегемоты'], 1)
+        self.assertEqual(words['жирафы'], 1)
+        other.delete()
+        self.assertNotIn('спят', indexed_words())
+        self.assertFalse(FuzzyTerm.objects.filter(value='спят').exists())
+
+    def test_groups_and_users_are_found(self):
+        """Group titles and usernames are matched with typos"""
+        self.assertEqual(
+            fuzzy.similar_objects('бигемоты', FuzzyTerm.GROUP, Group),
+            [self.group])
+        self.assertEqual(
+            fuzzy.similar_objects('leo_tolstio', FuzzyTerm.USER, User),
+            [self.user])
+        self.user.username = 'lev'
+        self.user.save()
+        self.assertEqual(
+            fuzzy.similar_objects('leo_tolstio', FuzzyTerm.USER, User), [])
+
+    def test_search_expands_misspelled_words(self):
+        """Search page finds posts and groups by misspelled query"""
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'бигемоты'})
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+        self.assertEqual(response.context['groups'], [self.group])
+        self.assertEqual(
+            match_expression('кот бигемоты', fuzzy.similar_words),
+            '"кот" ("бигемоты"* OR "бегемоты")')
+
+    def test_rebuild_index(self):
+        """Rebuilt index has the same terms and counts"""
+        Post.objects.create(text='Бегемоты спят', author=self.user)
+        terms = set(FuzzyTerm.objects.values_list(
+            'kind', 'object_id', 'value', 'refs', 'trigrams_count'))
+        call_command('rebuild_fuzzy_index', stdout=StringIO())
+        self.assertEqual(terms, set(FuzzyTerm.objects.values_list(
+            'kind', 'object_id', 'value', 'refs', 'trigrams_count')))
+        self.assertEqual(fuzzy.similar_words('бигемоты'), ['бегемоты'])
@@ -0,0 +1,112 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.db import transaction
+from ..image_refs import delete_unreferenced
+from ..models import Post, StoredImage
+from ..thumbnails import make_thumbnails
+import shutil
+import tempfile
+from unittest import mock
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
+IMAGE = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x00\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageRefsTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name='image.gif'):
+        return Post.objects.create(
+            text='Any', author=self.user,
+            image=SimpleUploadedFile(name, IMAGE, content_type='image/gif')
+        )
+
+    def refs(self, name):
+        return StoredImage.objects.get(name=name).refs
+
+    def test_reposted_image_is_shared(self):
+        """Posts with the same image share one counted file"""
+        first = self.create_post('first.gif')
+        second = self.create_post('second.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.refs(first.image.name), 2)
+
+    def test_file_is_deleted_with_last_reference(self):
+        """File lives while any post refers to it"""
+        first = self.create_post()
+        second = self.create_post()
+        name = first.image.name
+        storage = first.image.storage
+        first.delete()
+        self.assertFalse(delete_unreferenced(name))
+        self.assertTrue(storage.exists(name))
+        second.delete()
+        self.assertTrue(delete_unreferenced(name))
+        self.assertFalse(storage.exists(name))
+
+    def test_reused_file_survives_concurrent_delete(self):
+        """An upload which found a file being deleted puts it back"""
+        post = self.create_post()
+        name = post.image.name
+        storage = post.image.storage
+        self.assertEqual(storage.save('posts/again.gif', ContentFile(IMAGE)),
+                         name)
+        # The last post goes before the new one counts its reference
+        post.delete()
+        self.assertTrue(delete_unreferenced(name))
+        self.assertFalse(storage.exists(name))
+        with mock.patch.object(transaction, 'on_commit',
+                               side_effect=lambda func: func()):
+            Post.objects.create(text='Any', author=self.user, image=name)
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(self.refs(name), 1)
+
+    def test_replaced_image_is_released(self):
+        """Saving post with another image moves its reference"""
+        post = Post.objects.get(pk=self.create_post().pk)
+        name = post.image.name
+        post.image = SimpleUploadedFile('new.gif', IMAGE + b'\x00',
+                                        content_type='image/gif')
+        post.save()
+        self.assertEqual(self.refs(name), 0)
+        self.assertEqual(self.refs(post.image.name), 1)
+
+    def test_other_edits_keep_reference(self):
+        """Saving post without image changes keeps the count"""
+        post = Post.objects.get(pk=self.create_post().pk)
+        post.text = 'Edited'
+        post.save()
+        Post.objects.only('text').get(pk=post.pk).save()
+        self.assertEqual(self.refs(post.image.name), 1)
+
+    def test_thumbnails_are_made_once(self):
+        """Post with a reposted image reuses the ready manifest"""
+        first = self.create_post()
+        make_thumbnails(first.pk)
+        second = self.create_post()
+        with self.assertNumQueries(3):
+            make_thumbnails(second.pk)
+        second.refresh_from_db()
+        first.refresh_from_db()
+        self.assertEqual(second.thumbnails, first.thumbnails)
@@ -0,0 +1,94 @@
+from django.test import TestCase, override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from io import BytesIO
+from PIL import Image
+from ..forms import PostForm
+from ..images import ORIENTATION, ingest_image
+import os
+import subprocess
+import sys
+import tempfile
+
+
+# Prints growth of the peak RSS in KB while the image is ingested
+MEASURE_SCRIPT = '''
+import os, resource, sys
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+django.setup()
+from django.core.files import File
+from posts.images import ingest_image
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+with open(sys.argv[1], 'rb') as file:
+    ingest_image(File(file, name='large.jpg'))
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before)
+'''
+
+
+def make_upload(size, image_format='JPEG', name='image.jpg', **options):
+    output = BytesIO()
+    image = Image.new('RGB', size, (120, 30, 200))
+    image.save(output, image_format, **options)
+    return SimpleUploadedFile(name, output.getvalue(),
+                              content_type=Image.MIME[image_format])
+
+
+class IngestImageTests(TestCase):
+    @override_settings(IMAGE_MAX_SIDE=64)
+    def test_large_image_is_downscaled(self):
+        """Image is re-encoded within the max side keeping proportions"""
+        result = ingest_image(make_upload((400, 200)))
+        with Image.open(result) as image:
+            self.assertEqual(image.size, (64, 32))
+            self.assertEqual(image.format, 'JPEG')
+
+    def test_exif_is_stripped(self):
+        """Metadata is dropped and orientation is applied to pixels"""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        exif[ORIENTATION] = 6
+        result = ingest_image(make_upload((40, 20), exif=exif.tobytes()))
+        with Image.open(result) as image:
+            self.assertEqual(dict(image.getexif()), {})
+            self.assertEqual(image.size, (20, 40))
+
+    def test_format_and_name_are_kept(self):
+        """Supported formats keep their format and file name"""
+        result = ingest_image(make_upload((10, 10), 'PNG', 'image.png'))
+        self.assertEqual(result.name, 'image.png')
+        self.assertEqual(result.content_type, 'image/png')
+
+    @override_settings(IMAGE_MAX_PIXELS=100)
+    def test_decompression_bomb_is_rejected(self):
+        """Form rejects image by its header size"""
+        form = PostForm(data={'text': 'Any'},
+                        files={'image': make_upload((20, 20))})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()['image'][0].code,
+                         'image_too_large')
+
+    @override_settings(IMAGE_MAX_DECODED_PIXELS=100)
+    def test_undraftable_image_is_rejected(self):
+        """Image which can not be decoded downscaled is rejected"""
+        form = PostForm(data={'text': 'Any'},
+                        files={'image': make_upload((20, 20), 'PNG',
+                                                    'image.png')})
+        self.assertFalse(form.is_valid())
+
+    def test_peak_memory_is_bounded(self):
+        """Large JPEG is ingested without decoding its full bitmap"""
+        width, height = 6000, 4000
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as file:
+            Image.new('RGB', (width, height)).save(file, 'JPEG')
+            file.flush()
+            result = subprocess.run(
+                [sys.executable, '-c', MEASURE_SCRIPT, file.name],
+                cwd=settings.BASE_DIR, check=True,
+                stdout=subprocess.PIPE,
+                env=dict(os.environ, PYTHONPATH=settings.BASE_DIR),
+            )
+        peak_kb = int(result.stdout)
+        # Pillow keeps RGB bitmaps in 4 bytes a pixel
+        full_decode_kb = width * height * 4 // 1024
+        self.assertLess(peak_kb, full_decode_kb * 0.75)
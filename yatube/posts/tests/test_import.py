@@ -0,0 +1,266 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.utils import timezone
+from io import StringIO
+from ..models import Comment, FeedEntry, Follow, Group, Post, PostTag
+from ..cache import get_feed_version
+from ..search import SearchPaginator
+from .. import bulk_import, changes, counters
+from unittest import mock
+import json
+import os
+import tempfile
+
+
+User = get_user_model()
+
+
+class ImportDataTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Тест')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as file:
+            file.write(content)
+        return path
+
+    def jsonl(self, name, records):
+        return self.write(
+            name, ''.join(json.dumps(record) + '\n' for record in records))
+
+    def run_import(self, *args, **options):
+        out = StringIO()
+        call_command('import_data', *args, stdout=out, **options)
+        return out.getvalue()
+
+    def test_posts_are_imported_with_derived_rows(self):
+        """Imported posts are counted, indexed and delivered"""
+        path = self.jsonl('posts.jsonl', [
+            {'author': 'author', 'text': f'Импорт #архив {i}',
+             'group': 'group' if i % 2 else '',
+             'pub_date': f'2020-01-0{i + 1}T10:00:00'}
+            for i in range(5)
+        ])
+        out = self.run_import('post', path, chunk_size=2, batch_size=1)
+        self.assertIn('4 records imported', out)
+        self.assertIn('Done: 5 records imported', out)
+        posts = Post.objects.order_by('pub_date')
+        self.assertEqual(posts.count(), 5)
+        self.assertEqual(posts[0].pub_date.year, 2020)
+        self.assertEqual(posts.filter(group=self.group).count(), 2)
+        self.assertEqual(
+            counters.get_author_stats(self.author).posts_count, 5)
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 5)
+        self.assertEqual(PostTag.objects.count(), 5)
+        self.assertEqual(
+            len(SearchPaginator('импорт', 10).get_page(None)), 5)
+
+    def test_csv_comments_and_follows(self):
+        """CSV records are imported and counters recomputed"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        path = self.write(
+            'comments.csv',
+            f'post,author,text,pub_date\n'
+            f'{post.pk},reader,Первый,2021-10-08T09:06:00\n'
+            f'{post.pk},author,"Второй, с запятой",2021-10-08T09:07:00\n')
+        self.run_import('comment', path)
+        self.assertEqual(
+            set(Comment.objects.values_list('text', flat=True)),
+            {'Первый', 'Второй, с запятой'})
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+        # Imported comments start threads shown on the post page
+        self.assertEqual(
+            [comment.text for comment in post.comments.order_by('path')],
+            ['Второй, с запятой', 'Первый'])
+        path = self.jsonl('follows.jsonl', [
+            {'user': 'author', 'author': 'reader'},
+            {'user': 'reader', 'author': 'author'},
+        ])
+        self.run_import('follow', path)
+        self.assertEqual(Follow.objects.count(), 2)
+        self.assertEqual(
+            counters.get_author_stats(self.reader).followers_count, 1)
+
+    def test_import_resumes_from_checkpoint(self):
+        """Failed chunk is rolled back and the run resumes after it"""
+        records = [{'author': 'author', 'text': f'Пост {i}'}
+                   for i in range(5)]
+        records[3]['author'] = 'nobody'
+        path = self.jsonl('posts.jsonl', records)
+        checkpoint = os.path.join(self.directory.name, 'checkpoint.json')
+        with self.assertRaisesMessage(
+                CommandError, "Record 4: unknown user 'nobody'. "
+                              "2 records are committed"):
+            self.run_import('post', path, chunk_size=2,
+                            checkpoint=checkpoint)
+        self.assertEqual(Post.objects.count(), 2)
+        records[3]['author'] = 'reader'
+        self.jsonl('posts.jsonl', records)
+        out = self.run_import('post', path, chunk_size=2,
+                              checkpoint=checkpoint)
+        self.assertIn('Resuming after 2 records', out)
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', flat=True)),
+            [f'Пост {i}' for i in range(5)])
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_unknown_post_rolls_back_chunk(self):
+        """Comments of missing posts are rejected with their chunk"""
+        path = self.jsonl('comments.jsonl', [
+            {'post': 1000, 'author': 'author', 'text': 'Куда?'},
+        ])
+        with self.assertRaisesMessage(CommandError, 'unknown posts [1000]'):
+            self.run_import('comment', path)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_replies_are_placed_under_parents(self):
+        post = Post.objects.create(text='Пост', author=self.author)
+        root = Comment.objects.create(post=post, author=self.author,
+                                      text='Корень')
+        other = Comment.objects.create(
+            post=Post.objects.create(text='Другой', author=self.author),
+            author=self.author, text='Чужой')
+        path = self.jsonl('comments.jsonl', [
+            {'post': post.pk, 'parent': root.pk, 'author': 'reader',
+             'text': 'Ответ'},
+            {'post': post.pk, 'parent': '', 'author': 'reader',
+             'text': 'Новая ветка'},
+        ])
+        self.run_import('comment', path)
+        reply = Comment.objects.get(text='Ответ')
+        self.assertEqual((reply.parent, reply.depth), (root, 1))
+        self.assertEqual(list(Comment.objects.replies_to(root)), [reply])
+        root.refresh_from_db()
+        self.assertEqual(root.replies_count, 1)
+        path = self.jsonl('comments.jsonl', [
+            {'post': post.pk, 'parent': other.pk, 'author': 'reader',
+             'text': 'Не туда'},
+        ])
+        with self.assertRaisesMessage(CommandError,
+                                      'is a comment of another post'):
+            self.run_import('comment', path)
+
+    def test_non_object_record_is_rejected(self):
+        path = self.write('posts.jsonl', '["author", "text"]\n')
+        with self.assertRaisesMessage(
+                CommandError, 'Record 1: record is not a JSON object'):
+            self.run_import('post', path)
+
+    def test_committed_chunk_is_announced(self):
+        """Cached pages move on and waiting readers hear of the posts"""
+        version = get_feed_version()
+        log = changes.ChangeLog(10)
+        log.load()
+        path = self.jsonl('posts.jsonl', [
+            {'author': 'author', 'text': 'Пост', 'group': 'group'},
+        ])
+        with mock.patch.object(changes, 'CHANGES', log), \
+                mock.patch.object(transaction, 'on_commit',
+                                  side_effect=lambda func: func()):
+            self.run_import('post', path)
+        post = Post.objects.get()
+        self.assertGreater(get_feed_version(), version)
+        self.assertEqual(log.since(post.pk - 1),
+                         [changes.Change(post.pk, self.author.pk,
+                                         self.group.pk)])
+
+    def test_dates_are_kept_without_touching_the_field(self):
+        """Posts of other threads still get the current date"""
+        path = self.jsonl('posts.jsonl', [
+            {'author': 'author', 'text': 'Пост',
+             'pub_date': '2020-01-01T10:00:00'},
+        ])
+        field = Post._meta.get_field('pub_date')
+        self.run_import('post', path)
+        self.assertTrue(field.auto_now_add)
+        self.assertEqual(Post.objects.get().pub_date.year, 2020)
+        post = Post.objects.create(text='Новый', author=self.author)
+        self.assertEqual(post.pub_date.year, timezone.now().year)
+
+    def test_chunk_is_retried_when_ids_are_taken(self):
+        """A row inserted meanwhile makes the chunk start over"""
+        assign_pks = bulk_import.assign_pks
+        calls = []
+
+        def racing_assign_pks(model, objects):
+            assign_pks(model, objects)
+            if not calls:
+                Post.objects.create(pk=objects[0].pk, text='Чужой',
+                                    author=self.reader)
+            calls.append(objects[0].pk)
+
+        path = self.jsonl('posts.jsonl', [
+            {'author': 'author', 'text': 'Пост',
+             'pub_date': '2001-01-01T10:00:00'},
+        ])
+        with mock.patch.object(bulk_import, 'assign_pks',
+                               racing_assign_pks):
+            self.run_import('post', path)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(Post.objects.get(text='Пост').pub_date.year, 2001)
+
+    def test_records_keep_free_ids(self):
+        """Comments and replies find posts and parents by their ids"""
+        posts = self.jsonl('posts.jsonl', [
+            {'id': 2, 'author': 'author', 'text': 'Пост'},
+        ])
+        comments = self.jsonl('comments.jsonl', [
+            {'id': 5, 'post': 2, 'author': 'reader', 'text': 'Корень'},
+            {'id': 6, 'post': 2, 'parent': 5, 'author': 'author',
+             'text': 'Ответ'},
+        ])
+        self.run_import('post', posts)
+        self.run_import('comment', comments)
+        post = Post.objects.get()
+        self.assertEqual(post.pk, 2)
+        root, reply = Comment.objects.order_by('pk')
+        self.assertEqual((root.pk, reply.pk), (5, 6))
+        self.assertEqual((root.post, reply.post), (post, post))
+        self.assertEqual((reply.parent, reply.depth), (root, 1))
+        root.refresh_from_db()
+        self.assertEqual(root.replies_count, 1)
+
+    def test_taken_ids_are_mapped_to_new_rows(self):
+        """Records whose ids belong to other rows are found by them too"""
+        taken = Post.objects.create(text='Чужой', author=self.reader)
+        Comment.objects.create(pk=1, post=taken, author=self.reader,
+                               text='Чужой')
+        posts = self.jsonl('posts.jsonl', [
+            {'id': taken.pk, 'author': 'author', 'text': 'Пост'},
+        ])
+        first = self.jsonl('comments.jsonl', [
+            {'id': 1, 'post': taken.pk, 'author': 'reader',
+             'text': 'Корень'},
+        ])
+        second = self.jsonl('replies.jsonl', [
+            {'id': 2, 'post': taken.pk, 'parent': 1, 'author': 'author',
+             'text': 'Ответ'},
+        ])
+        self.run_import('post', posts)
+        self.run_import('comment', first)
+        self.run_import('comment', second)
+        post = Post.objects.get(text='Пост')
+        self.assertNotEqual(post.pk, taken.pk)
+        root = Comment.objects.get(text='Корень')
+        reply = Comment.objects.get(text='Ответ')
+        self.assertEqual((root.post, reply.post), (post, post))
+        self.assertEqual(reply.parent, root)
+        with self.assertRaisesMessage(CommandError,
+                                      'ids [2] were imported already'):
+            self.run_import('comment', second)
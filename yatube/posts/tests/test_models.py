@@ -1,6 +1,7 @@
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from django.test import TestCase
-from ..models import Post, Group
+from ..models import Follow, Post, Group
 
 
 User = get_user_model()
@@ -51,3 +52,10 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(self.post._meta.get_field(field).verbose_name,
                                  expected_value)
+
+    def test_follow_is_unique(self):
+        """User can not follow the same author twice"""
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=self.user, author=author)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.user, author=author)
@@ -0,0 +1,70 @@
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from ..models import Post
+from ..paginator import CursorPaginator, encode_cursor, decode_cursor
+
+
+User = get_user_model()
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        Post.objects.bulk_create(
+            Post(text=f'Post {i}', author=cls.user) for i in range(25)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.posts = list(Post.objects.order_by('-pub_date', '-pk'))
+
+    def test_cursor_round_trip(self):
+        """Cursor token decodes into the same seek key"""
+        post = self.posts[0]
+        key, backwards = decode_cursor(
+            encode_cursor([post.pub_date, post.pk], backwards=True))
+        self.assertEqual(key, (post.pub_date, post.pk))
+        self.assertTrue(backwards)
+
+    def test_pages_walk_forward_and_back(self):
+        """Next and previous cursors cover the feed without gaps"""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.get_page(None)
+        second = paginator.get_page(first.next_cursor)
+        third = paginator.get_page(second.next_cursor)
+        self.assertFalse(first.has_previous())
+        self.assertEqual(list(first), self.posts[:10])
+        self.assertEqual(list(second), self.posts[10:20])
+        self.assertEqual(list(third), self.posts[20:])
+        self.assertFalse(third.has_next())
+        back = paginator.get_page(third.previous_cursor)
+        self.assertEqual(list(back), self.posts[10:20])
+
+    def test_page_is_single_query(self):
+        """Page is fetched without COUNT query"""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        with self.assertNumQueries(1):
+            page = paginator.get_page(None)
+            self.assertTrue(page.has_other_pages())
+
+    def test_new_post_does_not_shift_pages(self):
+        """Page opened by cursor stays the same after new post"""
+        response = self.guest_client.get(reverse('posts:index'))
+        cursor = response.context['page_obj'].next_cursor
+        Post.objects.create(text='New', author=self.user)
+        response = self.guest_client.get(
+            reverse('posts:index'), {'cursor': cursor})
+        self.assertEqual(list(response.context['page_obj']),
+                         self.posts[10:20])
+
+    def test_invalid_cursor_shows_first_page(self):
+        """Broken cursor falls back to the first page"""
+        response = self.guest_client.get(
+            reverse('posts:index'), {'cursor': 'broken'})
+        self.assertEqual(list(response.context['page_obj']),
+                         self.posts[:10])
@@ -0,0 +1,83 @@
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.contrib.admin.sites import site
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test.client import RequestFactory
+from django.urls import reverse
+from io import StringIO
+from ..models import Post
+from ..search import SearchPaginator, match_expression
+
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.best = Post.objects.create(
+            text='Котики котики котики', author=cls.user)
+        cls.other = Post.objects.create(
+            text='Про котиков и про <b>собак</b> немного', author=cls.user)
+        Post.objects.create(text='Совсем другое', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_match_expression_quotes_terms(self):
+        """User input can not break the index query syntax"""
+        self.assertEqual(match_expression('кот "OR" NEAR('),
+                         '"кот" "OR" "NEAR"*')
+        self.assertEqual(match_expression('  ?!  '), '')
+
+    def test_results_are_ranked_and_highlighted(self):
+        """Better match comes first with escaped highlighted snippet"""
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'котик'})
+        posts = list(response.context['page_obj'])
+        self.assertEqual(posts, [self.best, self.other])
+        self.assertIn('<mark>Котики</mark>', posts[0].snippet)
+        self.assertIn('&lt;b&gt;собак', posts[1].snippet)
+
+    def test_index_follows_edits_and_deletes(self):
+        """Saved and deleted posts are found accordingly"""
+        paginator = SearchPaginator('бегемот', 10)
+        post = Post.objects.create(text='Про бегемота', author=self.user)
+        self.assertEqual(list(paginator.get_page(None)), [post])
+        post.text = 'Про жирафа'
+        post.save()
+        self.assertEqual(list(paginator.get_page(None)), [])
+        post.text = 'Снова бегемот'
+        post.save()
+        post.delete()
+        self.assertEqual(list(paginator.get_page(None)), [])
+
+    def test_cursor_pagination(self):
+        """Cursors walk the results in rank order both ways"""
+        Post.objects.bulk_create(
+            Post(text=f'слон {"слон " * i}', author=self.user)
+            for i in range(5)
+        )
+        call_command('rebuild_search_index', stdout=StringIO())
+        paginator = SearchPaginator('слон', 2)
+        pages = [paginator.get_page(None)]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        found = [post for page in pages for post in page]
+        self.assertEqual(len(found), 5)
+        ranks = [post.search_rank for post in found]
+        self.assertEqual(ranks, sorted(ranks))
+        back = paginator.get_page(pages[-1].previous_cursor)
+        self.assertEqual(list(back), list(pages[-2]))
+
+    def test_admin_search_uses_index(self):
+        """Admin search finds posts by the index"""
+        admin = site._registry[Post]
+        request = RequestFactory().get('/')
+        queryset, _ = admin.get_search_results(
+            request, Post.objects.all(), 'собак')
+        self.assertEqual(list(queryset), [self.other])
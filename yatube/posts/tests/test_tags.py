@@ -0,0 +1,93 @@
+from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from io import StringIO
+from ..models import Mention, Post, PostTag
+from ..tags import extract_mentions, extract_tags
+
+
+User = get_user_model()
+
+
+class TagsTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.friend = User.objects.create_user(username='friend.one')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.friend_client = Client()
+        self.friend_client.force_login(self.friend)
+
+    def test_extract(self):
+        """Tags are lowercased, a dot ending a mention is optional"""
+        self.assertEqual(extract_tags('#Кот и #кот, a#b &#39; #x_1'),
+                         {'кот', 'x_1'})
+        self.assertEqual(extract_mentions('Привет, @friend.one. a@b'),
+                         {'friend.one', 'friend.one.'})
+
+    def test_tags_follow_edits(self):
+        """Tag and mention rows are replaced when the text changes"""
+        post = Post.objects.create(
+            text='#котики для @friend.one.', author=self.user)
+        self.assertEqual(
+            list(PostTag.objects.values_list('tag__name', flat=True)),
+            ['котики'])
+        self.assertEqual(
+            list(Mention.objects.values_list('user', flat=True)),
+            [self.friend.pk])
+        post.text = '#собаки'
+        post.save()
+        self.assertEqual(
+            list(PostTag.objects.values_list('tag__name', flat=True)),
+            ['собаки'])
+        self.assertFalse(Mention.objects.exists())
+
+    def test_tag_page(self):
+        """Tag page pages through the tagged posts newest first"""
+        posts = [
+            Post.objects.create(text=f'#Тест {i}', author=self.user)
+            for i in range(12)
+        ]
+        Post.objects.create(text='Без тега', author=self.user)
+        response = self.guest_client.get(
+            reverse('posts:tag_posts', args=['тест']))
+        page_obj = response.context['page_obj']
+        self.assertEqual(list(page_obj), posts[::-1][:10])
+        self.assertContains(
+            response, f'<a href="{reverse("posts:tag_posts", args=["тест"])}'
+                      '">#Тест</a>')
+        response = self.guest_client.get(
+            reverse('posts:tag_posts', args=['тест']),
+            {'cursor': page_obj.next_cursor})
+        self.assertEqual(list(response.context['page_obj']), posts[1::-1])
+        response = self.guest_client.get(
+            reverse('posts:tag_posts', args=['нет']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_mentions_page(self):
+        """User sees only posts mentioning them"""
+        post = Post.objects.create(text='@friend.one смотри',
+                                   author=self.user)
+        Post.objects.create(text='@TestUser смотри', author=self.friend)
+        response = self.friend_client.get(reverse('posts:mentions'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+        response = self.guest_client.get(reverse('posts:mentions'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_backfill(self):
+        """Command indexes posts written without tag rows"""
+        Post.objects.bulk_create([
+            Post(text=f'#старый пост {i} @TestUser', author=self.friend)
+            for i in range(5)
+        ])
+        out = StringIO()
+        call_command('backfill_tags', batch_size=2, stdout=out)
+        self.assertIn('Done: 5 posts indexed', out.getvalue())
+        self.assertEqual(PostTag.objects.count(), 5)
+        self.assertEqual(Mention.objects.filter(user=self.user).count(), 5)
@@ -0,0 +1,183 @@
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
+from unittest import mock
+from .. import threads
+from ..forms import CommentForm
+from ..models import Comment, Post
+
+
+User = get_user_model()
+
+
+@override_settings(COMMENT_THREAD_DEPTH=2)
+class ThreadsTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.post = Post.objects.create(text='Any', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def comment(self, text, parent=None, post=None):
+        return Comment.objects.create(post=post or self.post,
+                                      author=self.user, text=text,
+                                      parent=parent)
+
+    def reply(self, parent, text):
+        return self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': text, 'parent': parent.pk},
+        )
+
+    def test_segments_sort_like_numbers(self):
+        self.assertEqual(threads.encode(35, 3), '00z')
+        self.assertLess(threads.encode(35, 3), threads.encode(36, 3))
+        with self.assertRaises(ValueError):
+            threads.encode(36 ** 3, 3)
+        moment = timezone.now()
+        path = threads.comment_path(moment)
+        self.assertEqual(len(path), threads.SEGMENT_WIDTH)
+        self.assertGreater(path, threads.comment_path(
+            moment + timedelta(microseconds=1)))
+        self.assertLess(
+            threads.comment_path(moment, path),
+            threads.comment_path(moment + timedelta(microseconds=1), path),
+        )
+
+    def test_path_is_written_by_the_insert(self):
+        root = self.comment('root')
+        with CaptureQueriesContext(connection) as queries:
+            reply = self.comment('reply', root)
+        writes = ('INSERT INTO "posts_comment"', 'UPDATE "posts_comment"')
+        statements = [query['sql'] for query in queries.captured_queries
+                      if query['sql'].startswith(writes)]
+        self.assertEqual(len(statements), 2)
+        self.assertNotIn('"path"', statements[1])
+        self.assertEqual(Comment.objects.get(pk=reply.pk).path, reply.path)
+
+    def test_form_is_the_text_only(self):
+        self.assertEqual(list(CommentForm().fields), ['text'])
+
+    def test_paths_order_threads(self):
+        """Newest threads first, replies oldest first under the parent"""
+        old = self.comment('old')
+        new = self.comment('new')
+        first = self.comment('first', old)
+        nested = self.comment('nested', first)
+        second = self.comment('second', old)
+        self.assertEqual(
+            list(Comment.objects.order_by('path')),
+            [new, old, first, nested, second],
+        )
+        self.assertEqual(nested.depth, 2)
+        self.assertTrue(nested.path.startswith(first.path))
+
+    def test_subtree_is_one_range_query(self):
+        root = self.comment('root')
+        child = self.comment('child', root)
+        grandchild = self.comment('grandchild', child)
+        self.comment('other')
+        with self.assertNumQueries(1):
+            self.assertEqual(list(Comment.objects.replies_to(root)),
+                             [child, grandchild])
+
+    def test_reply_is_counted_and_shown_in_thread(self):
+        root = self.comment('root')
+        response = self.reply(root, 'Ответ')
+        self.assertRedirects(
+            response,
+            reverse('posts:comment_thread', kwargs={
+                'post_id': self.post.pk, 'comment_id': root.pk}),
+        )
+        reply = Comment.objects.get(text='Ответ')
+        self.assertEqual(reply.parent, root)
+        root.refresh_from_db()
+        self.assertEqual(root.replies_count, 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+        reply.delete()
+        root.refresh_from_db()
+        self.assertEqual(root.replies_count, 0)
+
+    def test_reply_to_other_post_is_rejected(self):
+        other = self.comment('other',
+                             post=Post.objects.create(text='Any',
+                                                      author=self.user))
+        response = self.reply(other, 'Ответ')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Comment.objects.filter(text='Ответ').exists())
+
+    def test_deepest_reply_goes_next_to_parent(self):
+        root = self.comment('root')
+        child = self.comment('child', root)
+        with mock.patch.object(threads, 'MAX_DEPTH', 2):
+            self.reply(child, 'Ответ')
+        self.assertEqual(Comment.objects.get(text='Ответ').parent, root)
+
+    def test_model_places_comments(self):
+        """Paths are made of the dates, the model checks the parents"""
+        root = self.comment('root')
+        child = self.comment('child', root)
+        salt = int(child.path[-threads.SALT_WIDTH:], 36)
+        self.assertEqual(
+            child.path,
+            threads.comment_path(child.pub_date, root.path, salt),
+        )
+        with mock.patch.object(threads, 'MAX_DEPTH', 2):
+            reply = self.comment('reply', child)
+        self.assertEqual((reply.parent, reply.depth), (root, 1))
+        other = Post.objects.create(text='Any', author=self.user)
+        with self.assertRaisesMessage(ValueError, 'of another post'):
+            self.comment('other', child, post=other)
+
+    def test_deep_replies_are_loaded_on_thread_page(self):
+        """Levels below the configured depth wait for their thread page"""
+        chain = [self.comment('level 0')]
+        for level in range(1, 5):
+            chain.append(self.comment(f'level {level}', chain[-1]))
+        response = Client().get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        page = response.context['page_obj']
+        self.assertEqual([comment.text for comment in page],
+                         ['level 0', 'level 1', 'level 2'])
+        self.assertEqual([comment.indent for comment in page], [0, 1, 2])
+        self.assertTrue(page[2].more_replies)
+        thread_url = reverse('posts:comment_thread', kwargs={
+            'post_id': self.post.pk, 'comment_id': chain[2].pk})
+        self.assertContains(response, f'{thread_url}"')
+        response = Client().get(thread_url)
+        page = response.context['page_obj']
+        self.assertEqual([comment.text for comment in page],
+                         ['level 3', 'level 4'])
+        self.assertEqual([comment.indent for comment in page], [0, 1])
+
+    def test_thread_pages_follow_path_cursor(self):
+        for number in range(7):
+            self.comment(f'comment {number}')
+        address = reverse('posts:post_detail',
+                          kwargs={'post_id': self.post.pk})
+        first = Client().get(address).context['page_obj']
+        self.assertEqual(len(first), 5)
+        self.assertEqual(first[0].text, 'comment 6')
+        second = Client().get(
+            address, {'cursor': first.next_cursor}
+        ).context['page_obj']
+        self.assertEqual([comment.text for comment in second],
+                         ['comment 1', 'comment 0'])
+
+    def test_thread_of_missing_comment(self):
+        root = self.comment('root')
+        response = Client().get(reverse('posts:comment_thread', kwargs={
+            'post_id': self.post.pk + 1, 'comment_id': root.pk}))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,179 @@
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.conf import settings
+from django.core.cache import cache
+from django.template import Context, Template
+from django.urls import reverse
+from io import StringIO
+from unittest import mock
+from sorl.thumbnail.base import ThumbnailBackend
+from ..models import Post
+from ..thumbnails import make_thumbnails, schedule_thumbnails
+from jobs import queue
+import json
+import shutil
+import tempfile
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
+IMAGE = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x00\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def thumbnail_is_cached(image):
+    """Renders post template tag and checks it made nothing"""
+    template = Template(
+        '{% load thumbnail %}'
+        '{% thumbnail image "960x339" crop="center" upsacle=True as im %}'
+        '{{ im.url }}{% endthumbnail %}'
+    )
+    with mock.patch.object(ThumbnailBackend, '_create_thumbnail') as create:
+        template.render(Context({'image': image}))
+    return not create.called
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def create_post(self, name='image.gif'):
+        return Post.objects.create(
+            text='Any', author=self.user,
+            image=SimpleUploadedFile(name, IMAGE + name.encode(),
+                                     content_type='image/gif')
+        )
+
+    def test_make_thumbnails(self):
+        """Thumbnail is stored where the template tag looks for it"""
+        post = self.create_post('fresh.gif')
+        self.assertFalse(thumbnail_is_cached(post.image))
+        self.assertTrue(make_thumbnails(post.pk))
+        self.assertTrue(thumbnail_is_cached(post.image))
+
+    def test_make_thumbnails_writes_manifest(self):
+        """Generated variants are recorded in the post manifest"""
+        post = self.create_post()
+        make_thumbnails(post.pk)
+        post.refresh_from_db()
+        manifest = json.loads(post.thumbnails)
+        self.assertEqual(manifest['source'], post.image.name)
+        variants = manifest['formats']['JPEG']
+        self.assertTrue(variants[0][0].startswith(settings.MEDIA_URL))
+        self.assertEqual([variant[1:] for variant in variants],
+                         [[480, 170], [960, 339]])
+
+    def render_picture(self, post, accept=''):
+        request = RequestFactory().get('/', HTTP_ACCEPT=accept)
+        return Template(
+            '{% load post_images %}{% post_picture post %}'
+        ).render(Context({'post': post, 'request': request}))
+
+    def test_tag_renders_from_manifest(self):
+        """Post with manifest is rendered without any lookups"""
+        post = self.create_post()
+        make_thumbnails(post.pk)
+        post.refresh_from_db()
+        with mock.patch('posts.thumbnails.get_thumbnail') as lookup:
+            with self.assertNumQueries(0):
+                html = self.render_picture(post)
+        lookup.assert_not_called()
+        self.assertIn('480w', html)
+        self.assertIn('width="960" height="339"', html)
+
+    def test_tag_offers_accepted_formats(self):
+        """Modern sources are offered only to clients accepting them"""
+        post = self.create_post()
+        post.thumbnails = json.dumps({
+            'source': post.image.name,
+            'formats': {
+                'WEBP': [['/media/a.webp', 480, 170],
+                         ['/media/b.webp', 960, 339]],
+                'JPEG': [['/media/a.jpg', 480, 170],
+                         ['/media/b.jpg', 960, 339]],
+            },
+        })
+        with mock.patch('posts.thumbnails.image_formats',
+                        return_value=('WEBP', 'JPEG')):
+            modern = self.render_picture(post, 'image/webp,*/*')
+            legacy = self.render_picture(post, '*/*')
+        self.assertIn('type="image/webp" '
+                      'srcset="/media/a.webp 480w, /media/b.webp 960w"',
+                      modern)
+        self.assertNotIn('image/webp', legacy)
+        self.assertIn('src="/media/b.jpg"', legacy)
+
+    def test_tag_falls_back_without_manifest(self):
+        """Post without actual manifest is rendered through sorl"""
+        post = self.create_post()
+        make_thumbnails(post.pk)
+        post.refresh_from_db()
+        post.image = self.create_post('other.gif').image
+        with mock.patch('posts.thumbnails.get_thumbnail') as lookup:
+            lookup.return_value.url = '/media/cache/other.gif'
+            lookup.return_value.size = (960, 339)
+            html = self.render_picture(post)
+        lookup.assert_called_once()
+        self.assertIn('src="/media/cache/other.gif"', html)
+
+    def test_edit_keeps_manifest(self):
+        """Saving the post form does not overwrite the manifest"""
+        post = self.create_post()
+        stale = Post.objects.get(pk=post.pk)
+        make_thumbnails(post.pk)
+        stale.text = 'Edited'
+        stale.save()
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Edited')
+        self.assertTrue(post.thumbnails)
+
+    def test_upload_schedules_thumbnails(self):
+        """Creating post with image queues its thumbnails"""
+        with mock.patch('posts.views.schedule_thumbnails') as schedule:
+            self.authorized_client.post(reverse('posts:post_create'), {
+                'text': 'Any',
+                'image': SimpleUploadedFile(
+                    'upload.gif', IMAGE, content_type='image/gif'),
+            })
+        schedule.assert_called_once_with(Post.objects.get(text='Any'))
+
+    def test_schedule_queues_job_once(self):
+        """Thumbnails are made once by the queued background job"""
+        post = self.create_post()
+        schedule_thumbnails(post)
+        schedule_thumbnails(post)
+        claimed = queue.claim(10)
+        self.assertEqual(len(claimed), 1)
+        self.assertTrue(queue.run_claimed(*claimed[0]))
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnails)
+
+    def test_command_generates_missing(self):
+        """Command makes thumbnails of existing images"""
+        post = self.create_post('library.gif')
+        Post.objects.create(text='No image', author=self.user)
+        out = StringIO()
+        call_command('generate_thumbnails', workers=1, stdout=out)
+        self.assertIn('Thumbnails of 1 images', out.getvalue())
+        self.assertTrue(thumbnail_is_cached(post.image))
@@ -0,0 +1,98 @@
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from io import StringIO
+from .. import timeline
+from ..models import FeedEntry, Follow, Post
+
+
+User = get_user_model()
+
+
+class FollowTimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Author')
+        cls.other = User.objects.create_user(username='Other')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_new_post_goes_to_followers(self):
+        """New post is written into the follower inbox only"""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='Any', author=self.author)
+        Post.objects.create(text='Any', author=self.other)
+        self.assertEqual(
+            list(self.user.feed_entries.values_list('post', flat=True)),
+            [post.pk]
+        )
+
+    def test_follow_backfills_and_unfollow_drops(self):
+        """Follow copies author posts, unfollow removes them"""
+        Post.objects.create(text='Any', author=self.author)
+        self.authorized_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}))
+        self.assertEqual(self.user.feed_entries.count(), 1)
+        self.authorized_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        self.assertEqual(self.user.feed_entries.count(), 0)
+
+    @override_settings(FEED_INBOX_LIMIT=3)
+    def test_inbox_is_capped(self):
+        """Inbox keeps only the newest posts"""
+        Follow.objects.create(user=self.user, author=self.author)
+        posts = [Post.objects.create(text=str(i), author=self.author)
+                 for i in range(5)]
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']),
+                         posts[:1:-1])
+
+    @override_settings(FEED_INBOX_LIMIT=2)
+    def test_fan_out_trims_all_inboxes_at_once(self):
+        """Query count of a new post does not depend on followers"""
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.create(text='0', author=self.author)
+        with CaptureQueriesContext(connection) as one_follower:
+            Post.objects.create(text='1', author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        with self.assertNumQueries(len(one_follower)):
+            newest = Post.objects.create(text='2', author=self.author)
+        for user in (self.user, self.other):
+            self.assertEqual(user.feed_entries.count(), 2)
+            self.assertEqual(user.feed_entries.first().post, newest)
+
+    @override_settings(FEED_INBOX_LIMIT=2)
+    def test_rebuild_keeps_newest_posts(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        Post.objects.bulk_create(
+            Post(text=str(i), author=self.author) for i in range(3)
+        )
+        self.assertEqual(
+            timeline.rebuild_inboxes([self.user.pk, self.other.pk]), 4)
+        self.assertEqual(
+            set(self.user.feed_entries.values_list('post__text', flat=True)),
+            {post.text for post in Post.objects.all()[:2]},
+        )
+
+    def test_rebuild_command(self):
+        """Command restores inbox of posts created without signals"""
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.bulk_create(
+            Post(text=str(i), author=self.author) for i in range(3)
+        )
+        FeedEntry.objects.create(
+            user=self.other,
+            post=Post.objects.create(text='Any', author=self.author),
+            pub_date=Post.objects.first().pub_date,
+        )
+        call_command('rebuild_inboxes', stdout=StringIO())
+        self.assertEqual(self.user.feed_entries.count(), 4)
+        self.assertFalse(self.other.feed_entries.exists())
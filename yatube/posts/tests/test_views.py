@@ -1,13 +1,20 @@
 from django.test import TestCase, Client, override_settings
 from django.contrib.auth import get_user_model
-from ..models import Group, Post, Follow
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from ..models import Comment, Group, Post, Follow
+from ..cache import bump_feed_version, get_feed_version
+from ..counters import get_author_stats
+from notifications.digests import get_unread_count
 from django.urls import reverse
 from django import forms
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
 import shutil
 import tempfile
-from time import sleep
+from http import HTTPStatus
+from unittest import mock
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -57,6 +64,7 @@ class PagesTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -247,15 +255,35 @@ class PagesTests(TestCase):
                 self.assertIn(post.group.title, value)
 
     def test_index_page_cache(self):
-        """Index page cache test"""
+        """Index page cache lives until the feed changes"""
         first_response = self.guest_client.get(reverse('posts:index'))
-        Post.objects.filter(pk=1).delete()
+        Post.objects.filter(pk=self.post_id).update(text='Changed')
         second_response = self.guest_client.get(reverse('posts:index'))
         self.assertEqual(first_response.content, second_response.content)
-        sleep(21)
+        Post.objects.filter(pk=self.post_id).delete()
         third_response = self.guest_client.get(reverse('posts:index'))
         self.assertNotEqual(third_response.content, second_response.content)
 
+    def test_index_page_cache_is_page_aware(self):
+        """Cached first page is not served for the next one"""
+        first_page = self.guest_client.get(reverse('posts:index'))
+        cursor = first_page.context['page_obj'].next_cursor
+        second_page = self.guest_client.get(
+            reverse('posts:index'), {'cursor': cursor})
+        self.assertNotEqual(first_page.content, second_page.content)
+        self.assertContains(
+            second_page, reverse('posts:post_detail',
+                                 kwargs={'post_id': Post.objects.last().pk}))
+
+    def test_cached_fragment_reads_no_posts(self):
+        """Logged in readers get the cached feed without its queries"""
+        self.authorized_client.get(reverse('posts:index'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'подробная информация', count=10)
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'posts_post' in query['sql']])
+
     def test_follow_auth(self):
         """Authorized user can follow and unfollow other users"""
         response = self.authorized_client.get(
@@ -327,3 +355,151 @@ class PagesTests(TestCase):
         self.assertFalse(
             response_not_follower.context['page_obj'].object_list
         )
+
+
+class QueryCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.group = Group.objects.create(
+            title='Group',
+            slug='test-slug',
+            description='Any',
+        )
+        cls.reader = User.objects.create_user(username='Reader')
+        get_author_stats(cls.user)
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.post = Post.objects.create(
+            text='Any', author=cls.user, group=cls.group)
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Any')
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def grow(self, size):
+        """Brings posts, comments and follows of the pages to the size"""
+        for i in range(Post.objects.count(), size):
+            author = User.objects.create_user(username=f'Author{i}')
+            Post.objects.create(text='Any', author=self.user,
+                                group=self.group)
+            Comment.objects.create(post=self.post, author=author,
+                                   text='Any')
+            Follow.objects.create(user=self.reader, author=author)
+
+    def assertNumQueriesAtSizes(self, client, pages_queries):
+        for size in (1, 30):
+            self.grow(size)
+            cache.clear()
+            # Unread counter of the header is cached once per user
+            get_unread_count(self.reader)
+            for address, queries in pages_queries.items():
+                with self.subTest(address=address, size=size):
+                    with self.assertNumQueries(queries):
+                        client.get(address)
+
+    def test_feed_query_count_does_not_depend_on_rows(self):
+        """Each page makes fixed number of queries"""
+        self.assertNumQueriesAtSizes(self.guest_client, {
+            reverse('posts:index'): 1,
+            reverse('posts:group_posts', kwargs={'slug': 'test-slug'}): 2,
+            reverse('posts:profile', kwargs={'username': 'TestUser'}): 3,
+            reverse('posts:post_detail',
+                    kwargs={'post_id': self.post.pk}): 2,
+        })
+
+    def test_follow_query_count(self):
+        """Follow page makes fixed number of queries"""
+        self.assertNumQueriesAtSizes(self.reader_client, {
+            reverse('posts:follow_index'): 3,
+        })
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.post = Post.objects.create(text='Any', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.url = reverse('posts:index')
+
+    def test_feed_version_moves_again_on_commit(self):
+        """Pages cached from the old rows during the change are dropped"""
+        with mock.patch.object(transaction, 'on_commit') as on_commit:
+            Post.objects.create(text='Новый', author=self.user)
+        on_commit.assert_any_call(bump_feed_version)
+
+    def test_guest_page_is_cached(self):
+        """Second guest request is served without rendering"""
+        first = self.guest_client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.guest_client.get(self.url)
+        self.assertIsNone(second.context)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_page_varies_on_accepted_formats(self):
+        """Clients accepting other image formats get own page copy"""
+        with mock.patch('posts.thumbnails.image_formats',
+                        return_value=('WEBP', 'JPEG')):
+            self.guest_client.get(self.url)
+            response = self.guest_client.get(
+                self.url, HTTP_ACCEPT='image/webp,*/*')
+        self.assertIsNotNone(response.context)
+        self.assertIn('Accept', response['Vary'])
+
+    def test_conditional_get(self):
+        """Matching ETag gets 304, dates of the site are not validators"""
+        first = self.guest_client.get(self.url)
+        self.assertNotIn('Last-Modified', first)
+        response = self.guest_client.get(
+            self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Post.objects.create(text='Second', author=self.user)
+        response = self.guest_client.get(
+            self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'Second')
+
+    def test_renamed_author_invalidates_page(self):
+        """Pages show new names of authors and groups"""
+        group = Group.objects.create(title='Группа', slug='group',
+                                     description='Тест')
+        Post.objects.filter(pk=self.post.pk).update(group=group)
+        self.user.first_name = 'Лев'
+        self.user.save()
+        self.assertContains(self.guest_client.get(self.url), 'Лев')
+        self.user.first_name = 'Антон'
+        self.user.save()
+        self.assertContains(self.guest_client.get(self.url), 'Антон')
+        url = reverse('posts:group_posts', args=['group'])
+        self.guest_client.get(url)
+        group.title = 'Новое название'
+        group.save()
+        self.assertContains(self.guest_client.get(url), 'Новое название')
+        version = get_feed_version()
+        self.client.force_login(self.user)
+        self.assertEqual(get_feed_version(), version)
+
+    def test_changes_invalidate_page(self):
+        """New post gives new page and ETag"""
+        first = self.guest_client.get(self.url)
+        Post.objects.create(text='New', author=self.user)
+        response = self.guest_client.get(
+            self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_authorized_page_is_not_cached(self):
+        """Logged in users always get rendered page"""
+        self.authorized_client.get(self.url)
+        response = self.authorized_client.get(self.url)
+        self.assertIsNotNone(response.context)
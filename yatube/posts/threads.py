@@ -0,0 +1,70 @@
+"""Materialized paths of comment threads
+
+The path of a comment is the path of its parent followed by a fixed
+width base 36 segment made of its creation time in microseconds and a
+random salt, so the path is known before the row is inserted, sorting
+by path walks the threads depth first and a subtree is one range of
+the path index. Times of top level comments are inverted to show the
+newest threads first, replies go oldest first under their parent.
+"""
+import secrets
+from datetime import datetime, timedelta, timezone
+
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+TIME_WIDTH = 11
+# Tells apart comments written in the same microsecond
+SALT_WIDTH = 4
+SEGMENT_WIDTH = TIME_WIDTH + SALT_WIDTH
+MAX_TIME = len(DIGITS) ** TIME_WIDTH - 1
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Replies to comments this deep are attached to the parent instead
+MAX_DEPTH = 16
+PATH_LENGTH = SEGMENT_WIDTH * MAX_DEPTH
+# Sorts after every digit, so prefix + END is the end of the subtree
+END = '~'
+
+
+def encode(number, width):
+    """Returns the number in base 36 padded to the width"""
+    if not 0 <= number < len(DIGITS) ** width:
+        raise ValueError(f'{number} does not fit {width} digits')
+    digits = []
+    for _ in range(width):
+        number, digit = divmod(number, len(DIGITS))
+        digits.append(DIGITS[digit])
+    return ''.join(reversed(digits))
+
+
+def comment_path(moment, parent_path='', salt=None):
+    """Returns the path of the comment written at the moment"""
+    time = (moment - EPOCH) // timedelta(microseconds=1)
+    if not parent_path:
+        time = MAX_TIME - time
+    if salt is None:
+        salt = secrets.randbelow(len(DIGITS) ** SALT_WIDTH)
+    return parent_path + encode(time, TIME_WIDTH) + encode(salt, SALT_WIDTH)
+
+
+def subtree_range(path):
+    """Returns bounds of the paths below the path"""
+    return path, path + END
+
+
+def place(comment, parent, moment):
+    """Sets parent, depth and path of the comment written at the moment
+
+    Replies to the deepest comments are put next to them.
+    """
+    if parent is None:
+        comment.parent_id, comment.depth = None, 0
+        comment.path = comment_path(moment)
+        return
+    if parent.post_id != comment.post_id:
+        raise ValueError(f'parent {parent.pk} is a comment of another post')
+    parent_id, parent_path, depth = parent.pk, parent.path, parent.depth + 1
+    if depth >= MAX_DEPTH:
+        parent_id = parent.parent_id
+        parent_path = parent_path[:-SEGMENT_WIDTH]
+        depth -= 1
+    comment.parent_id, comment.depth = parent_id, depth
+    comment.path = comment_path(moment, parent_path)
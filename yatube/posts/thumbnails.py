@@ -0,0 +1,175 @@
+"""Eager generation of post thumbnails
+
+Thumbnails are made when a post image is saved instead of on the first
+page render, by a background job off the request path. Every image
+gets a few widths in JPEG and in the modern formats Pillow can write.
+Their urls and sizes are written into the post manifest, so the
+templates render them without the key-value store and storage lookups
+of sorl, offering only the formats the client accepts.
+"""
+import json
+import logging
+from collections import namedtuple
+from functools import lru_cache
+
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS
+
+from jobs.queue import enqueue
+
+
+logger = logging.getLogger(__name__)
+
+# Options are a part of the thumbnail name, the fallback of posts
+# without manifest finds the thumbnails made by the old templates
+THUMBNAIL_GEOMETRY = '960x339'
+THUMBNAIL_OPTIONS = {'crop': 'center', 'upsacle': True}
+
+# Widths of the variants, the widest one is THUMBNAIL_GEOMETRY
+THUMBNAIL_WIDTHS = (480, 960)
+FALLBACK_FORMAT = 'JPEG'
+# Modern formats by preference
+MODERN_FORMATS = ('AVIF', 'WEBP')
+MIME_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+}
+
+Thumbnail = namedtuple('Thumbnail', ('url', 'width', 'height'))
+Source = namedtuple('Source', ('type', 'srcset'))
+Picture = namedtuple('Picture', ('img', 'srcset', 'sources'))
+
+
+@lru_cache(maxsize=None)
+def image_formats():
+    """Returns formats of the variants, the fallback one is the last"""
+    Image.init()
+    modern = tuple(
+        image_format for image_format in MODERN_FORMATS
+        if image_format in Image.SAVE and image_format in EXTENSIONS
+    )
+    return modern + (FALLBACK_FORMAT,)
+
+
+def variant_geometry(width):
+    """Returns geometry of the variant keeping the crop proportions"""
+    base_width, base_height = map(int, THUMBNAIL_GEOMETRY.split('x'))
+    return f'{width}x{round(width * base_height / base_width)}'
+
+
+def accepted_formats(request):
+    """Returns formats of the variants the client accepts
+
+    Modern formats are offered only when listed in the Accept header,
+    a wildcard does not prove the browser can decode them.
+    """
+    accept = request.META.get('HTTP_ACCEPT', '') if request else ''
+    return tuple(
+        image_format for image_format in image_formats()
+        if image_format == FALLBACK_FORMAT
+        or MIME_TYPES[image_format] in accept
+    )
+
+
+def make_thumbnails(post_id):
+    """Generates thumbnails of the post image
+
+    Returns False if the post has no image.
+    """
+    from .models import Post
+    post = Post.objects.filter(pk=post_id).only('image').first()
+    if post is None or not post.image:
+        return False
+    # A deduplicated image shares its thumbnails with the other posts
+    manifest = (
+        Post.objects.filter(image=post.image.name).exclude(thumbnails='')
+        .values_list('thumbnails', flat=True).first()
+    )
+    if manifest is not None:
+        Post.objects.filter(pk=post_id, image=post.image.name).update(
+            thumbnails=manifest
+        )
+        return True
+    formats = {
+        image_format: [
+            list(_as_thumbnail(get_thumbnail(
+                post.image, variant_geometry(width),
+                format=image_format, **THUMBNAIL_OPTIONS
+            )))
+            for width in THUMBNAIL_WIDTHS
+        ]
+        for image_format in image_formats()
+    }
+    manifest = {'source': post.image.name, 'formats': formats}
+    # The image may have been replaced while the thumbnail was made
+    Post.objects.filter(pk=post_id, image=post.image.name).update(
+        thumbnails=json.dumps(manifest, separators=(',', ':'))
+    )
+    return True
+
+
+def read_manifest(post):
+    """Returns variants of the post manifest made for its current image
+
+    Variants are keyed by format and sorted by width.
+    """
+    if not post.thumbnails:
+        return {}
+    try:
+        manifest = json.loads(post.thumbnails)
+    except ValueError:
+        return {}
+    if manifest.get('source') != post.image.name:
+        return {}
+    return manifest.get('formats', {})
+
+
+def post_picture(post, formats=(FALLBACK_FORMAT,)):
+    """Returns variants of the post image in the formats
+
+    Returns None if there is no image. Only a post without manifest
+    falls back to sorl lookups of the single JPEG thumbnail.
+    """
+    if not post.image:
+        return None
+    variants = read_manifest(post)
+    if FALLBACK_FORMAT not in variants:
+        return _fallback_picture(post)
+    sources = [
+        Source(MIME_TYPES[image_format], _srcset(variants[image_format]))
+        for image_format in formats
+        if image_format != FALLBACK_FORMAT and image_format in variants
+    ]
+    fallback = variants[FALLBACK_FORMAT]
+    return Picture(Thumbnail(*fallback[-1]), _srcset(fallback), sources)
+
+
+def _fallback_picture(post):
+    try:
+        thumbnail = get_thumbnail(
+            post.image, THUMBNAIL_GEOMETRY, **THUMBNAIL_OPTIONS
+        )
+    except Exception:
+        logger.exception('Thumbnail of post %s failed', post.pk)
+        return None
+    return Picture(_as_thumbnail(thumbnail), '', [])
+
+
+def _srcset(variants):
+    return ', '.join(
+        f'{url} {width}w' for url, width, height in variants if width
+    )
+
+
+def _as_thumbnail(image_file):
+    # Size of a thumbnail of a broken image is unknown
+    width, height = image_file.size or (None, None)
+    return Thumbnail(image_file.url, width, height)
+
+
+def schedule_thumbnails(post):
+    """Queues thumbnails of the post for a background worker"""
+    enqueue('posts.make_thumbnails', [post.pk],
+            dedupe_key=f'thumbnails:{post.pk}')
@@ -0,0 +1,142 @@
+"""Fan-out on write for the follow feed
+
+Every follower owns an inbox of ``FeedEntry`` rows which is filled
+when a followed author publishes a post, so the follow page reads
+one indexed range of the inbox instead of joining all followed
+authors with all posts.
+
+Inboxes of many users are trimmed and rebuilt by single statements
+ranking the entries of each user with ``ROW_NUMBER()``.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+
+from .models import FeedEntry, Follow, Post
+
+
+FEED_KEYS = ('feed_date', 'feed_post')
+# Users whose inboxes are rebuilt by one statement
+REBUILD_BATCH_SIZE = 500
+
+
+def inbox_limit():
+    return settings.FEED_INBOX_LIMIT
+
+
+def inbox_posts(user):
+    """Returns posts of the user inbox annotated with FEED_KEYS"""
+    return Post.objects.with_related().filter(
+        feed_entries__user=user
+    ).annotate(
+        feed_date=F('feed_entries__pub_date'),
+        feed_post=F('feed_entries__post'),
+    )
+
+
+def trim_inbox(user_id):
+    """Deletes entries older than the inbox limit"""
+    limit = inbox_limit()
+    cutoff = (
+        FeedEntry.objects.filter(user_id=user_id)
+        .order_by('-pub_date', '-post_id')
+        .values_list('pub_date', 'post_id')[limit:limit + 1]
+    )
+    for pub_date, post_id in cutoff:
+        FeedEntry.objects.filter(
+            Q(pub_date__lt=pub_date)
+            | Q(pub_date=pub_date, post_id__lte=post_id),
+            user_id=user_id,
+        ).delete()
+
+
+def trim_follower_inboxes(author_id):
+    """Deletes entries older than the inbox limit of the author followers"""
+    entries = FeedEntry._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {entries} WHERE id IN ('
+            ' SELECT id FROM ('
+            '  SELECT id, ROW_NUMBER() OVER ('
+            '   PARTITION BY user_id ORDER BY pub_date DESC, post_id DESC'
+            f'  ) AS position FROM {entries}'
+            '  WHERE user_id IN ('
+            f'   SELECT user_id FROM {Follow._meta.db_table}'
+            '   WHERE author_id = %s'
+            '  )'
+            ' ) AS ranked WHERE position > %s'
+            ')',
+            [author_id, inbox_limit()],
+        )
+
+
+def fan_out_post(post):
+    """Puts the new post into inboxes of the author followers"""
+    followers = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+    )
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers),
+        ignore_conflicts=True,
+    )
+    trim_follower_inboxes(post.author_id)
+
+
+def backfill_inbox(user_id, author_id):
+    """Copies the latest author posts into the follower inbox"""
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .order_by('-pub_date', '-pk')
+        .values_list('pk', 'pub_date')[:inbox_limit()]
+    )
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts),
+        ignore_conflicts=True,
+    )
+    trim_inbox(user_id)
+
+
+def drop_author(user_id, author_id):
+    """Removes the author posts from the follower inbox"""
+    FeedEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild_inboxes(user_ids):
+    """Recreates inboxes of the users from their follows
+
+    Returns number of written entries.
+    """
+    user_ids = list(user_ids)
+    written = 0
+    for start in range(0, len(user_ids), REBUILD_BATCH_SIZE):
+        written += rebuild_batch(user_ids[start:start + REBUILD_BATCH_SIZE])
+    return written
+
+
+def rebuild_batch(user_ids):
+    """Refills the inboxes with the newest posts of followed authors"""
+    FeedEntry.objects.filter(user_id__in=user_ids).delete()
+    entries = FeedEntry._meta.db_table
+    placeholders = ', '.join(['%s'] * len(user_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {entries} (user_id, post_id, pub_date)'
+            ' SELECT user_id, post_id, pub_date FROM ('
+            '  SELECT follow.user_id, post.id AS post_id, post.pub_date,'
+            '   ROW_NUMBER() OVER ('
+            '    PARTITION BY follow.user_id'
+            '    ORDER BY post.pub_date DESC, post.id DESC'
+            '   ) AS position'
+            f'  FROM {Follow._meta.db_table} AS follow'
+            f'  JOIN {Post._meta.db_table} AS post'
+            '   ON post.author_id = follow.author_id'
+            f'  WHERE follow.user_id IN ({placeholders})'
+            ' ) AS ranked WHERE position <= %s',
+            user_ids + [inbox_limit()],
+        )
+        return cursor.rowcount
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import feeds, views
 
 
 app_name = 'posts'
@@ -7,16 +7,37 @@ app_name = 'posts'
 urlpatterns = [
     path('group/<slug:slug>/', views.group_posts, name='group_posts'),
     path('', views.index, name='index'),
+    path('new_posts/', views.index_new_posts, name='index_new_posts'),
+    path('group/<slug:slug>/new_posts/', views.group_new_posts,
+         name='group_new_posts'),
+    path('follow/new_posts/', views.follow_new_posts,
+         name='follow_new_posts'),
+    path('search/', views.search, name='search'),
+    path('feeds/rss/', feeds.posts_rss, name='posts_rss'),
+    path('feeds/atom/', feeds.posts_atom, name='posts_atom'),
+    path('group/<slug:slug>/rss/', feeds.group_rss, name='group_rss'),
+    path('group/<slug:slug>/atom/', feeds.group_atom, name='group_atom'),
+    path('profile/<username>/rss/', feeds.author_rss, name='author_rss'),
+    path('profile/<username>/atom/', feeds.author_atom,
+         name='author_atom'),
+    path('tags/<str:name>/', views.tag_posts, name='tag_posts'),
     path('profile/<username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
+    path(
+        'posts/<int:post_id>/comments/<int:comment_id>/',
+        views.comment_thread,
+        name='comment_thread'
+    ),
     path(
         'posts/<int:post_id>/comment/',
         views.add_comment,
         name='add_comment'
     ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('mentions/', views.mentions, name='mentions'),
+    path('export/<str:kind>/', views.export_data, name='export_data'),
     path(
         'profile/<username>/follow/',
         views.profile_follow,
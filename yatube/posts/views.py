@@ -1,51 +1,127 @@
+from django.conf import settings
 from django.shortcuts import get_object_or_404, render, redirect
-from .models import Post, Group, Follow
-from django.core.paginator import Paginator
+from .models import Comment, Post, Group, Follow, FuzzyTerm, Tag
+from .paginator import CursorPaginator, PathPaginator
+from . import changes, counters, export, fuzzy, tags, timeline
+from .cache import cache_anonymous_page, get_feed_version
 from django.contrib.auth import get_user_model
 from .forms import CommentForm, PostForm
+from .search import SearchPaginator
+from .thumbnails import accepted_formats, schedule_thumbnails
+from django.utils.http import urlencode
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.cache import never_cache
 
 
 User = get_user_model()
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 5
+NEW_POSTS_LIMIT = 100
 
 
+def get_feed_page(request, posts_list, keys=('pub_date', 'pk')):
+    """Returns keyset page of the feed for the cursor from request"""
+    paginator = CursorPaginator(posts_list, POSTS_PER_PAGE, keys)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+def get_thread_page(request, comments_list, depth=0):
+    """Returns page of comment threads starting at the depth
+
+    Replies deeper than COMMENT_THREAD_DEPTH levels below it are left
+    to their own thread pages.
+    """
+    limit = settings.COMMENT_THREAD_DEPTH
+    comments_list = comments_list.filter(depth__lte=depth + limit)
+    paginator = PathPaginator(comments_list, COMMENTS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    for comment in page_obj:
+        comment.indent = comment.depth - depth
+        comment.more_replies = (comment.indent == limit
+                                and comment.replies_count)
+    return page_obj
+
+
+@cache_anonymous_page
 def group_posts(request, slug):
     """Shows posts upon request by group"""
     group = get_object_or_404(Group, slug=slug)
     template = 'posts/group_list.html'
-    posts_list = group.posts.all()
-    paginator = Paginator(posts_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts_list = group.posts.with_related()
+    page_obj = get_feed_page(request, posts_list)
     context = {'group': group,
                'page_obj': page_obj, }
     return render(request, template, context)
 
 
+@cache_anonymous_page
 def index(request):
     """Shows 10 posts by publication date order"""
     template = 'posts/index.html'
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    context = {'page_obj': page_obj}
+    post_list = Post.objects.with_related()
+    # Rows are only read when the cached fragment of the page is missing
+    page_obj = SimpleLazyObject(lambda: get_feed_page(request, post_list))
+    context = {
+        'page_obj': page_obj,
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+        'feed_version': get_feed_version(),
+        'page_key': request.GET.get('cursor', ''),
+        'variant': 'user' if request.user.is_authenticated else 'guest',
+        'image_formats': ','.join(accepted_formats(request)),
+    }
     return render(request, template, context)
 
 
+@cache_anonymous_page
+def tag_posts(request, name):
+    """Shows posts with the hashtag"""
+    tag = get_object_or_404(Tag, name=name.lower())
+    page_obj = get_feed_page(
+        request, tags.tagged_posts(tag), keys=tags.TAG_KEYS
+    )
+    context = {'tag': tag, 'page_obj': page_obj}
+    return render(request, 'posts/tag.html', context)
+
+
+@cache_anonymous_page
+def search(request):
+    """Shows posts matching the query, best matches first"""
+    query = request.GET.get('q', '').strip()
+    cursor = request.GET.get('cursor')
+    paginator = SearchPaginator(query, POSTS_PER_PAGE,
+                                expand=fuzzy.similar_words)
+    page_obj = paginator.get_page(cursor)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    if query and not cursor:
+        context['groups'] = fuzzy.similar_objects(
+            query, FuzzyTerm.GROUP, Group)
+        context['authors'] = fuzzy.similar_objects(
+            query, FuzzyTerm.USER, User)
+    return render(request, 'posts/search.html', context)
+
+
+@cache_anonymous_page
 def profile(request, username):
     """Shows current author posts"""
-    author = get_object_or_404(User, username=username)
-    posts_list = author.posts.all()
-    count_posts = posts_list.count()
-    paginator = Paginator(posts_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    stats = counters.get_author_stats(author)
+    posts_list = author.posts.with_related()
+    page_obj = get_feed_page(request, posts_list)
     following = author.following.exists()
     user = request.user
     context = {
         'author': author,
-        'count_posts': count_posts,
+        'count_posts': stats.posts_count,
+        'stats': stats,
         'page_obj': page_obj,
         'following': following,
         'user': user,
@@ -53,17 +129,17 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+@cache_anonymous_page
 def post_detail(request, post_id):
     """Shows post details"""
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.with_related().select_related('author__stats'),
+        pk=post_id
+    )
     chars_10 = post.text[:10]
     pub_date = post.pub_date
-    posts_list = post.author.posts.all()
-    count_posts = posts_list.count()
-    comments_list = post.comments.all()
-    paginator = Paginator(comments_list, 5)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    count_posts = counters.get_author_stats(post.author).posts_count
+    page_obj = get_thread_page(request, post.comments.with_related())
     form = CommentForm()
     context = {
         'chars_10': chars_10,
@@ -84,6 +160,8 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         form.save()
+        if post.image:
+            schedule_thumbnails(post)
         return redirect('posts:profile', request.user)
     return render(request, 'posts/create_post.html', {'form': form})
 
@@ -96,13 +174,45 @@ def post_edit(request, post_id):
     if request.method == 'GET' and request.user != post.author:
         return redirect('posts:post_detail', post_id)
     if request.method == 'POST' and form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data and post.image:
+            schedule_thumbnails(post)
         return redirect('posts:post_detail', post_id)
     return render(request,
                   'posts/create_post.html',
                   {'form': form, 'post': post, "is_edit": 'is_edit'})
 
 
+@cache_anonymous_page
+def comment_thread(request, post_id, comment_id):
+    """Shows replies to the comment with the form to answer it"""
+    comment = get_object_or_404(
+        Comment.objects.with_related().select_related('post'),
+        pk=comment_id, post_id=post_id
+    )
+    page_obj = get_thread_page(
+        request, Comment.objects.replies_to(comment).with_related(),
+        comment.depth + 1
+    )
+    context = {
+        'post': comment.post,
+        'comment': comment,
+        'page_obj': page_obj,
+        'form': CommentForm(),
+    }
+    return render(request, 'posts/comment_thread.html', context)
+
+
+def get_reply_parent(request, post):
+    """Returns the comment of the post answered by the form, if any"""
+    parent_id = request.POST.get('parent', '')
+    if not parent_id:
+        return None
+    if not parent_id.isdigit():
+        raise Http404('Unknown comment')
+    return get_object_or_404(post.comments, pk=parent_id)
+
+
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
@@ -111,24 +221,39 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        comment.parent = get_reply_parent(request, post)
         comment.save()
+        if comment.parent_id is not None:
+            return redirect('posts:comment_thread', post_id=post_id,
+                            comment_id=comment.parent_id)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    user = request.user
-    authors = user.follower.values_list('author', flat=True)
-    authors_posts_list = Post.objects.filter(author__in=authors)
-    paginator = Paginator(authors_posts_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    authors_posts_list = timeline.inbox_posts(request.user)
+    page_obj = get_feed_page(
+        request, authors_posts_list, keys=timeline.FEED_KEYS
+    )
     context = {
         'page_obj': page_obj
     }
     return render(request, 'posts/follow.html', context)
 
 
+@login_required
+def mentions(request):
+    """Shows posts mentioning the user"""
+    page_obj = get_feed_page(
+        request, tags.mentioning_posts(request.user),
+        keys=tags.MENTION_KEYS
+    )
+    context = {
+        'page_obj': page_obj
+    }
+    return render(request, 'posts/mentions.html', context)
+
+
 @login_required
 def profile_follow(request, username):
     user = request.user
@@ -147,3 +272,89 @@ def profile_unfollow(request, username):
         author__username=username
     ).delete()
     return redirect('posts:profile', username)
+
+
+@staff_member_required
+def export_data(request, kind):
+    """Streams all rows of the kind as a file"""
+    data_format = request.GET.get('format', 'jsonl')
+    if kind not in export.KINDS or data_format not in export.FORMATS:
+        raise Http404
+    gzip = request.GET.get('gzip') == '1'
+    response = StreamingHttpResponse(
+        export.export(kind, data_format, gzip),
+        content_type=(export.GZIP_CONTENT_TYPE if gzip
+                      else export.CONTENT_TYPES[data_format]),
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{export.file_name(kind, data_format, gzip)}"'
+    )
+    return response
+
+
+def wait_for_posts(request, posts_list, accept):
+    """Answers with ids of posts of the feed newer than the cursor
+
+    Waits up to ``wait`` seconds for the first one in the change log,
+    with the database connection closed. The wait holds the worker
+    thread, so only logged in readers may poll and the site has to be
+    served by threaded or async workers.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication required'},
+                            status=401)
+    try:
+        since = int(request.GET['since'])
+        timeout = float(request.GET.get('wait',
+                                        settings.NEW_POSTS_WAIT_TIMEOUT))
+    except (KeyError, ValueError):
+        return JsonResponse({'detail': 'since must be a post id'},
+                            status=400)
+    timeout = max(0, min(timeout, settings.NEW_POSTS_WAIT_TIMEOUT))
+    log = changes.CHANGES
+    changes.release_connection()
+    found = log.wait(since, timeout, accept)
+    if found is None:
+        # The cursor is older than the log
+        ids = list(
+            posts_list.filter(pk__gt=since).order_by('-pk')
+            .values_list('pk', flat=True)[:NEW_POSTS_LIMIT]
+        )
+        changes.release_connection()
+        if not ids:
+            found = log.wait(max(since, log.start or since), timeout,
+                             accept) or []
+    if found is not None:
+        ids = [change.pk for change in reversed(found)][:NEW_POSTS_LIMIT]
+    return JsonResponse({
+        'count': len(ids),
+        'ids': ids,
+        'cursor': ids[0] if ids else since,
+    })
+
+
+@never_cache
+def index_new_posts(request):
+    return wait_for_posts(request, Post.objects.all(), lambda change: True)
+
+
+@never_cache
+def group_new_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return wait_for_posts(
+        request, group.posts.all(),
+        lambda change: change.group_id == group.pk,
+    )
+
+
+@never_cache
+def follow_new_posts(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication required'},
+                            status=401)
+    authors = set(Follow.objects.filter(user=request.user)
+                  .values_list('author_id', flat=True))
+    return wait_for_posts(
+        request, Post.objects.filter(author__in=authors),
+        lambda change: change.author_id in authors,
+    )
@@ -0,0 +1,60 @@
+// Waits for posts newer than the first one on the page and shows
+// their number above the feed. Polls back off while nothing is new or
+// the server fails, and stop while the tab is hidden.
+(function () {
+  const banner = document.getElementById('new-posts');
+  if (!banner) {
+    return;
+  }
+  const MIN_DELAY = 1000;
+  const MAX_DELAY = 5 * 60 * 1000;
+  const counter = document.getElementById('new-posts-count');
+  let since = banner.dataset.since;
+  let total = 0;
+  let delay = MIN_DELAY;
+  let timer = null;
+  let polling = false;
+
+  function schedule() {
+    if (!document.hidden && !timer && !polling) {
+      timer = setTimeout(poll, delay);
+    }
+  }
+
+  function poll() {
+    timer = null;
+    polling = true;
+    fetch(`${banner.dataset.url}?since=${since}`, {credentials: 'same-origin'})
+      .then((response) => response.ok ? response.json() : Promise.reject(response))
+      .then((data) => {
+        since = data.cursor;
+        if (data.count) {
+          total += data.count;
+          counter.textContent = total;
+          banner.classList.remove('d-none');
+          delay = MIN_DELAY;
+        } else {
+          delay = Math.min(delay * 2, MAX_DELAY);
+        }
+      })
+      .catch(() => {
+        delay = Math.min(Math.max(delay, 30000) * 2, MAX_DELAY);
+      })
+      .finally(() => {
+        polling = false;
+        schedule();
+      });
+  }
+
+  document.addEventListener('visibilitychange', () => {
+    if (document.hidden) {
+      clearTimeout(timer);
+      timer = null;
+    } else {
+      delay = MIN_DELAY;
+      schedule();
+    }
+  });
+
+  schedule();
+})();
@@ -42,6 +42,10 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
+    'api.apps.ApiConfig',
+    'jobs.apps.JobsConfig',
+    'outbox.apps.OutboxConfig',
+    'notifications.apps.NotificationsConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -77,6 +81,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'notifications.context_processors.unread_notifications',
             ],
         },
     },
@@ -138,8 +143,21 @@ STATIC_URL = '/static/'
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'users:logout'
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Emails are queued into the outbox and sent by a background job
+# through OUTBOX_EMAIL_BACKEND, in batches over one connection
+EMAIL_BACKEND = 'outbox.backends.OutboxBackend'
+OUTBOX_EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+OUTBOX_BATCH_SIZE = 100
+# Max emails sent a second
+OUTBOX_RATE_LIMIT = 10
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_VISIBILITY_TIMEOUT = 5 * 60
+# Base of the links in emails sent off the request
+SITE_URL = 'http://127.0.0.1:8000'
+
+# Seconds events are collected into digests after the first one
+NOTIFICATIONS_DIGEST_DELAY = 60
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
@@ -148,10 +166,58 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TwoTierCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 2,
+            'STALE_TIMEOUT': 60,
+        },
+    },
+    # Stand-in for a shared cache server, visible to all workers. Its
+    # add and incr are not atomic, so leases of TwoTierCache keep one
+    # computation per process only; use memcached or Redis in production.
+    # It lives in the project, so other checkouts never read its entries
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    },
 }
 
+# Cached feed fragments are invalidated by the feed version
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Uploaded images: pixels in the header, pixels actually decoded after
+# the JPEG draft scaling and the longest side of the stored image
+IMAGE_MAX_PIXELS = 100 * 1000 * 1000
+IMAGE_MAX_DECODED_PIXELS = 16 * 1000 * 1000
+IMAGE_MAX_SIDE = 2048
+
+# Background jobs: seconds before a job of a lost worker is run again,
+# attempts of a failing job and its retry delays growing twice a time
+JOBS_VISIBILITY_TIMEOUT = 5 * 60
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_DELAY = 10
+JOBS_MAX_RETRY_DELAY = 60 * 60
+
+# Number of latest posts in RSS and Atom feeds
+FEED_ITEMS = 20
+
+# Levels of replies shown under a comment, deeper ones are loaded
+# on the page of their thread
+COMMENT_THREAD_DEPTH = 3
+
+# New posts kept in memory for long-polling readers
+CHANGE_LOG_SIZE = 1000
+# Max seconds a reader waits for new posts. Every logged in reader with
+# a feed open holds a worker thread that long, so serve the site with
+# threaded or async workers (e.g. gunicorn --worker-class gthread), not
+# sync workers alone
+NEW_POSTS_WAIT_TIMEOUT = 25
+
+# Max number of posts kept in the follow feed of a user
+FEED_INBOX_LIMIT = 1000
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]